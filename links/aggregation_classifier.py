@@ -8,16 +8,27 @@ Aggregation classifier.
 import os
 
 # pylint: disable=relative-beyond-top-level
-from .utils import PROMPTS_DIR, _build_custom_chain, gpt_3_5
+from .semantic_cache import semantic_cached
+from .utils import PROMPTS_DIR, _build_custom_chain, get_gpt_35
 
 AGGREGATION_CLASSIFICATION_PATH = os.path.join(
     PROMPTS_DIR, "should_aggregate_classification.txt"
 )
 
 
-def should_aggregate(query):
-    chain = _build_custom_chain(
-        gpt_3_5, template_path=AGGREGATION_CLASSIFICATION_PATH
+def _build_aggregation_chain():
+    return _build_custom_chain(
+        get_gpt_35(), template_path=AGGREGATION_CLASSIFICATION_PATH
     )
-    response = chain.invoke({"query": query})
+
+
+@semantic_cached("should_aggregate")
+def should_aggregate(query):
+    response = _build_aggregation_chain().invoke({"query": query})
+    return "yes" in response.lower()
+
+
+@semantic_cached("should_aggregate")
+async def ashould_aggregate(query):
+    response = await _build_aggregation_chain().ainvoke({"query": query})
     return "yes" in response.lower()
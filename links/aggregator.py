@@ -18,7 +18,7 @@ from langchain_core.runnables import RunnableLambda
 from .utils import (
     PROMPTS_DIR,
     _build_custom_chain,
-    gpt_4o,
+    get_gpt4o,
     get_prompt_from,
     _format_filter_expression,
     stream_runnable,
@@ -31,11 +31,18 @@ AGGREGATION_DELEGATION_PATH = os.path.join(
 )
 
 
-def delegate_aggregation(step):
-    chain = _build_custom_chain(
-        gpt_4o, template_path=AGGREGATION_DELEGATION_PATH
+def _build_delegation_chain():
+    return _build_custom_chain(
+        get_gpt4o(), template_path=AGGREGATION_DELEGATION_PATH
     )
-    return chain.invoke({"question": step})
+
+
+def delegate_aggregation(step):
+    return _build_delegation_chain().invoke({"question": step})
+
+
+async def adelegate_aggregation(step):
+    return await _build_delegation_chain().ainvoke({"question": step})
 
 
 ### AGGREGATION EXPRESSION ###
@@ -237,7 +244,7 @@ def construct_aggregation(assignee, query, view_repr, view, *args, **kwargs):
             view=view_repr,
             fields=fields_message,
         )
-        chain = _build_custom_chain(gpt_4o, prompt=prompt)
+        chain = _build_custom_chain(get_gpt4o(), prompt=prompt)
         expression = chain.invoke({"query": query})
 
         aggregation = aggregation_constructor(expression=expression)
@@ -287,7 +294,7 @@ def stream_aggregation_analysis(query, view, aggregation, result):
         prompt = _build_aggregation_analysis_prompt(
             query, view, aggregation, result
         )
-        for chunk in gpt_4o.stream(prompt):
+        for chunk in get_gpt4o().stream(prompt):
             yield chunk
 
     aggregation_analysis_runnable_streaming = RunnableLambda(
@@ -301,13 +308,21 @@ def stream_aggregation_analysis(query, view, aggregation, result):
         yield content.content
 
 
+async def astream_aggregation_analysis(query, view, aggregation, result):
+    prompt = _build_aggregation_analysis_prompt(
+        query, view, aggregation, result
+    )
+    async for content in get_gpt4o().astream(prompt):
+        yield content.content
+
+
 def run_aggregation_analysis(query, view, aggregation, result):
     def aggregation_analysis_func(info):
         query = info["query"]
         prompt = _build_aggregation_analysis_prompt(
             query, view, aggregation, result
         )
-        response = gpt_4o.invoke(prompt).content
+        response = get_gpt4o().invoke(prompt).content
         return {"input": query, "output": response}
 
     aggregation_analysis_runnable = RunnableLambda(aggregation_analysis_func)
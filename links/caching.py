@@ -0,0 +1,308 @@
+"""
+Caching utilities.
+
+| Copyright 2017-2024, Voxel51, Inc.
+| `voxel51.com <https://voxel51.com/>`_
+|
+"""
+
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import sqlite3
+import struct
+import threading
+import time
+
+
+def normalize_text(text):
+    """Normalizes whitespace in the given text so that trivially different
+    prompts map to the same cache key.
+    """
+    return " ".join(text.split())
+
+
+def _normalize(obj):
+    if isinstance(obj, str):
+        return normalize_text(obj)
+    if isinstance(obj, dict):
+        return {str(k): _normalize(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_normalize(v) for v in obj]
+    return obj
+
+
+def make_cache_key(*parts):
+    """Returns a stable hash of the given parts.
+
+    Parts may be arbitrary JSON-serializable objects; strings are whitespace
+    normalized before hashing and unknown objects are converted via ``str()``.
+
+    Args:
+        *parts: the objects to hash
+
+    Returns:
+        a hex digest string
+    """
+    data = json.dumps(_normalize(parts), sort_keys=True, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+class LRUCache(object):
+    """Thread-safe in-memory least recently used cache.
+
+    Args:
+        max_size (1024): the maximum number of entries to store
+        ttl (None): an optional number of seconds after which entries expire
+    """
+
+    def __init__(self, max_size=1024, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key, None)
+            if item is None:
+                return default
+
+            value, created_at = item
+            if self.ttl is not None and time.time() - created_at > self.ttl:
+                del self._data[key]
+                return default
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.time())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SQLiteCache(object):
+    """Thread-safe on-disk cache backed by a SQLite database.
+
+    Values are stored as raw bytes, so callers are responsible for serializing
+    them. When the cache grows beyond ``max_size`` entries, the least recently
+    accessed entries are evicted.
+
+    Args:
+        path: the path to the database file
+        max_size (10000): the maximum number of entries to store
+        ttl (None): an optional number of seconds after which entries expire
+    """
+
+    def __init__(self, path, max_size=10000, ttl=None):
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, "
+                "value BLOB, "
+                "created_at REAL, "
+                "accessed_at REAL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS cache_accessed_at "
+                "ON cache (accessed_at)"
+            )
+
+    def __len__(self):
+        with self._lock:
+            cursor = self._conn.execute("SELECT COUNT(*) FROM cache")
+            return cursor.fetchone()[0]
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def get(self, key, default=None):
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return default
+
+            value, created_at = row
+            if self.ttl is not None and now - created_at > self.ttl:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                return default
+
+            self._conn.execute(
+                "UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            return bytes(value)
+
+    def set(self, key, value):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)",
+                (key, sqlite3.Binary(value), now, now),
+            )
+            self._evict(now)
+
+    def delete(self, key):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cache")
+
+    def _evict(self, now):
+        if self.ttl is not None:
+            self._conn.execute(
+                "DELETE FROM cache WHERE created_at < ?", (now - self.ttl,)
+            )
+
+        count = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        if count > self.max_size:
+            self._conn.execute(
+                "DELETE FROM cache WHERE key IN ("
+                "SELECT key FROM cache ORDER BY accessed_at ASC LIMIT ?)",
+                (count - self.max_size,),
+            )
+
+
+class TieredCache(object):
+    """Cache that consults an in-memory tier before an on-disk tier.
+
+    Values read from the disk tier are promoted to the memory tier.
+
+    Args:
+        memory (None): an optional :class:`LRUCache`
+        disk (None): an optional :class:`SQLiteCache`
+        serialize (None): a function that converts values to bytes for the
+            disk tier. By default, values are JSON-serialized
+        deserialize (None): the inverse of ``serialize``
+    """
+
+    def __init__(
+        self, memory=None, disk=None, serialize=None, deserialize=None
+    ):
+        self.memory = memory
+        self.disk = disk
+        self.serialize = serialize or _json_serialize
+        self.deserialize = deserialize or _json_deserialize
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, use_memory=True, use_disk=True):
+        """Returns the cached value for the given key, or None.
+
+        Args:
+            key: the cache key
+            use_memory (True): whether to consult the memory tier
+            use_disk (True): whether to consult the disk tier
+        """
+        if use_memory and self.memory is not None:
+            value = self.memory.get(key)
+            if value is not None:
+                self.hits += 1
+                return value
+
+        if use_disk and self.disk is not None:
+            data = self.disk.get(key)
+            if data is not None:
+                value = self.deserialize(data)
+                if use_memory and self.memory is not None:
+                    self.memory.set(key, value)
+
+                self.hits += 1
+                return value
+
+        self.misses += 1
+        return None
+
+    def set(self, key, value, use_memory=True, use_disk=True):
+        """Stores the given value.
+
+        Args:
+            key: the cache key
+            value: the value
+            use_memory (True): whether to write to the memory tier
+            use_disk (True): whether to write to the disk tier
+        """
+        if use_memory and self.memory is not None:
+            self.memory.set(key, value)
+
+        if use_disk and self.disk is not None:
+            self.disk.set(key, self.serialize(value))
+
+    def clear(self):
+        if self.memory is not None:
+            self.memory.clear()
+
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+def _json_serialize(value):
+    return json.dumps(value).encode("utf-8")
+
+
+def _json_deserialize(data):
+    return json.loads(data.decode("utf-8"))
+
+
+def serialize_vector(vector):
+    """Serializes a vector of floats compactly as little-endian float16 bytes.
+
+    Args:
+        vector: a list of floats
+
+    Returns:
+        bytes
+    """
+    return struct.pack(f"<{len(vector)}e", *vector)
+
+
+def deserialize_vector(data):
+    """Deserializes a vector created by :func:`serialize_vector`.
+
+    Args:
+        data: bytes
+
+    Returns:
+        a list of floats
+    """
+    return list(struct.unpack(f"<{len(data) // 2}e", data))
@@ -17,12 +17,14 @@ import fiftyone.operators as foo
 import fiftyone.plugins as fop
 
 # pylint: disable=relative-beyond-top-level
+from .dataset_snapshot import invalidate_dataset_snapshots
+from .semantic_cache import semantic_cached
 from .utils import (
     PROMPTS_DIR,
     _build_custom_chain,
     _build_chat_chain,
-    gpt_3_5,
-    gpt_4o,
+    get_gpt_35,
+    get_gpt4o,
     get_prompt_from,
 )
 
@@ -54,41 +56,90 @@ def get_compute_approval_threshold():
     return threshold
 
 
-def should_run_computation(query):
+def _is_show_query(query):
     lower_query = query.lower()
-    if "show" in lower_query and "compute" not in lower_query:
+    return "show" in lower_query and "compute" not in lower_query
+
+
+def should_run_computation(query):
+    if _is_show_query(query):
+        return False
+
+    return _classify_computation(query)
+
+
+async def ashould_run_computation(query):
+    if _is_show_query(query):
         return False
 
+    return await _aclassify_computation(query)
+
+
+def _build_should_compute_chain(query):
     prompt = get_prompt_from(SHOULD_COMPUTE_CLASSIFICATION_PATH).format(
         query=query
     )
-    intent_chain = _build_custom_chain(gpt_3_5, prompt=prompt)
+    return _build_custom_chain(get_gpt_35(), prompt=prompt)
 
-    topic = intent_chain.invoke({"query": query}).lower()
+
+# Only the LLM decision is cached, so the keyword rule above always applies
+@semantic_cached("should_run_computation")
+def _classify_computation(query):
+    chain = _build_should_compute_chain(query)
+    topic = chain.invoke({"query": query}).lower()
     return "compute" in topic
 
 
-def delegate_computation(query):
+@semantic_cached("should_run_computation")
+async def _aclassify_computation(query):
+    chain = _build_should_compute_chain(query)
+    topic = (await chain.ainvoke({"query": query})).lower()
+    return "compute" in topic
+
+
+_computation_topics = (
+    "brightness",
+    "entropy",
+    "uniqueness",
+    "similarity",
+    "dimensionality reduction",
+    "clustering",
+    "duplicates",
+)
+
+
+def _build_delegation_chain(query):
     prompt = get_prompt_from(DELEGATE_COMPUTATION_PATH).format(query=query)
-    intent_chain = _build_custom_chain(gpt_4o, prompt=prompt)
-    allowed_topics = (
-        "brightness",
-        "entropy",
-        "uniqueness",
-        "similarity",
-        "dimensionality reduction",
-        "clustering",
-        "duplicates",
-    )
+    return _build_custom_chain(get_gpt4o(), prompt=prompt)
+
+
+def delegate_computation(query):
+    topic = _build_delegation_chain(query).invoke({"query": query})
+    return _parse_computation_topic(topic)
+
 
-    topic = intent_chain.invoke({"query": query}).lower()
-    for allowed_topic in allowed_topics:
+async def adelegate_computation(query):
+    topic = await _build_delegation_chain(query).ainvoke({"query": query})
+    return _parse_computation_topic(topic)
+
+
+def _parse_computation_topic(topic):
+    topic = topic.lower()
+    for allowed_topic in _computation_topics:
         if allowed_topic in topic:
             return allowed_topic
     return "other"
 
 
 def run_computation(dataset, assignee, query):
+    try:
+        return _run_computation(dataset, assignee, query)
+    finally:
+        ## Computations add fields and brain runs to the dataset
+        invalidate_dataset_snapshots(dataset)
+
+
+def _run_computation(dataset, assignee, query):
     if assignee == "brightness":
         return compute_brightness(dataset)
     elif assignee == "entropy":
@@ -152,7 +203,9 @@ def compute_dimensionality_reduction(dataset, query, *args, **kwargs):
     prompt = get_prompt_from(prompt_path).format(query=query)
     output_type = DimensionalityReduction
 
-    chain = _build_chat_chain(gpt_4o, prompt=prompt, output_type=output_type)
+    chain = _build_chat_chain(
+        get_gpt4o(), prompt=prompt, output_type=output_type
+    )
     dim_red = chain.invoke({"messages": [("user", query)]})
 
     method = dim_red.method if dim_red.method else "umap"
@@ -241,7 +294,9 @@ def compute_clustering(dataset, query, *args, **kwargs):
     prompt = get_prompt_from(prompt_path).format(query=query)
     output_type = Clustering
 
-    chain = _build_chat_chain(gpt_4o, prompt=prompt, output_type=output_type)
+    chain = _build_chat_chain(
+        get_gpt4o(), prompt=prompt, output_type=output_type
+    )
     clustering = chain.invoke({"messages": [("user", query)]})
 
     allowed_methods = ["kmeans", "birch", "agglomerative"]
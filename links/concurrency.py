@@ -0,0 +1,564 @@
+"""
+Concurrency utilities.
+
+| Copyright 2017-2024, Voxel51, Inc.
+| `voxel51.com <https://voxel51.com/>`_
+|
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import os
+import queue
+import threading
+
+
+_executor = None
+_stream_executor = None
+_tool_executor = None
+_tool_max_workers = None
+_blocking_executor = None
+_event_loop = None
+_executor_lock = threading.Lock()
+
+_STREAM_DONE = object()
+_active_streams = set()
+_active_streams_lock = threading.Lock()
+
+_abandoned_tool_calls = set()
+_abandoned_tool_calls_lock = threading.Lock()
+
+
+def get_max_workers():
+    max_workers = os.environ.get("VOXELGPT_MAX_WORKERS", 16)
+    if isinstance(max_workers, str):
+        try:
+            max_workers = int(max_workers)
+        except:
+            max_workers = 16
+    return max(1, max_workers)
+
+
+def get_executor():
+    """Returns the process-wide thread pool used to run links concurrently.
+
+    The number of workers can be configured via the ``VOXELGPT_MAX_WORKERS``
+    environment variable.
+    """
+    global _executor
+
+    if _executor is not None:
+        return _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=get_max_workers(),
+                thread_name_prefix="voxelgpt",
+            )
+
+    return _executor
+
+
+def get_stream_max_workers():
+    max_workers = os.environ.get("VOXELGPT_STREAM_WORKERS", 16)
+    if isinstance(max_workers, str):
+        try:
+            max_workers = int(max_workers)
+        except:
+            max_workers = 16
+    return max(1, max_workers)
+
+
+def get_stream_queue_size():
+    queue_size = os.environ.get("VOXELGPT_STREAM_QUEUE_SIZE", 64)
+    if isinstance(queue_size, str):
+        try:
+            queue_size = int(queue_size)
+        except:
+            queue_size = 64
+    return max(1, queue_size)
+
+
+def get_stream_executor():
+    """Returns the process-wide thread pool used to produce streaming
+    responses.
+
+    Streams are kept separate from :func:`get_executor` since they occupy a
+    worker for the duration of a response. The number of workers can be
+    configured via the ``VOXELGPT_STREAM_WORKERS`` environment variable.
+    """
+    global _stream_executor
+
+    if _stream_executor is not None:
+        return _stream_executor
+
+    with _executor_lock:
+        if _stream_executor is None:
+            _stream_executor = ThreadPoolExecutor(
+                max_workers=get_stream_max_workers(),
+                thread_name_prefix="voxelgpt-stream",
+            )
+
+    return _stream_executor
+
+
+def get_tool_max_workers():
+    max_workers = os.environ.get("VOXELGPT_TOOL_WORKERS", 8)
+    if isinstance(max_workers, str):
+        try:
+            max_workers = int(max_workers)
+        except:
+            max_workers = 8
+    return max(1, max_workers)
+
+
+def get_tool_timeout():
+    timeout = os.environ.get("VOXELGPT_TOOL_TIMEOUT", 60)
+    if isinstance(timeout, str):
+        try:
+            timeout = float(timeout)
+        except:
+            timeout = 60
+    return timeout if timeout > 0 else None
+
+
+def get_tool_executor():
+    """Returns the process-wide thread pool used to run the tool calls of
+    agents concurrently.
+
+    The number of workers can be configured via the ``VOXELGPT_TOOL_WORKERS``
+    environment variable.
+    """
+    global _tool_executor
+    global _tool_max_workers
+
+    if _tool_executor is not None:
+        return _tool_executor
+
+    with _executor_lock:
+        if _tool_executor is None:
+            ## The pool's size is fixed once it has been created
+            _tool_max_workers = get_tool_max_workers()
+            _tool_executor = ThreadPoolExecutor(
+                max_workers=_tool_max_workers,
+                thread_name_prefix="voxelgpt-tool",
+            )
+
+    return _tool_executor
+
+
+def abandon_tool_call(future):
+    """Abandons the result of the given tool call.
+
+    Tool calls that have not started are cancelled. Since running tool calls
+    cannot be interrupted, they keep occupying a worker of
+    :func:`get_tool_executor` until they finish, so they are tracked until
+    then. See :func:`tool_workers_available`.
+
+    Args:
+        future: the :class:`concurrent.futures.Future` of the tool call
+    """
+    if future.cancel():
+        return
+
+    with _abandoned_tool_calls_lock:
+        _abandoned_tool_calls.add(future)
+
+    future.add_done_callback(_release_tool_call)
+
+
+def _release_tool_call(future):
+    with _abandoned_tool_calls_lock:
+        _abandoned_tool_calls.discard(future)
+
+
+def get_num_abandoned_tool_calls():
+    """Returns the number of abandoned tool calls that are still running.
+
+    Returns:
+        the number of tool calls
+    """
+    with _abandoned_tool_calls_lock:
+        return len(_abandoned_tool_calls)
+
+
+def tool_workers_available():
+    """Returns whether any workers of :func:`get_tool_executor` are not
+    occupied by abandoned tool calls.
+
+    If every worker is occupied by a hung tool call, new tool calls would be
+    queued indefinitely.
+
+    Returns:
+        True/False
+    """
+    get_tool_executor()
+    return get_num_abandoned_tool_calls() < _tool_max_workers
+
+
+def get_blocking_max_workers():
+    max_workers = os.environ.get("VOXELGPT_BLOCKING_WORKERS", 32)
+    if isinstance(max_workers, str):
+        try:
+            max_workers = int(max_workers)
+        except:
+            max_workers = 32
+    return max(1, max_workers)
+
+
+def get_blocking_executor():
+    """Returns the process-wide thread pool used by :func:`run_sync` to run
+    blocking calls from async code.
+
+    The number of workers can be configured via the
+    ``VOXELGPT_BLOCKING_WORKERS`` environment variable.
+    """
+    global _blocking_executor
+
+    if _blocking_executor is not None:
+        return _blocking_executor
+
+    with _executor_lock:
+        if _blocking_executor is None:
+            _blocking_executor = ThreadPoolExecutor(
+                max_workers=get_blocking_max_workers(),
+                thread_name_prefix="voxelgpt-blocking",
+            )
+
+    return _blocking_executor
+
+
+def get_stream_stats():
+    """Returns a dict of metrics about the streams that are in progress.
+
+    The dict contains the number of active streams, the total number of
+    chunks waiting to be consumed, and the configured limits.
+    """
+    with _active_streams_lock:
+        queues = list(_active_streams)
+
+    return {
+        "active_streams": len(queues),
+        "queue_depth": sum(q.qsize() for q in queues),
+        "max_workers": get_stream_max_workers(),
+        "max_queue_size": get_stream_queue_size(),
+    }
+
+
+def _put_chunk(q, chunk, stop_event):
+    while not stop_event.is_set():
+        try:
+            q.put(chunk, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+
+    return False
+
+
+def _produce_stream(func, args, kwargs, q, stop_event):
+    stream = None
+    try:
+        if stop_event.is_set():
+            return
+
+        stream = func(*args, **kwargs)
+        for chunk in stream:
+            if not _put_chunk(q, chunk, stop_event):
+                return
+    except Exception as e:
+        _put_chunk(q, e, stop_event)
+        return
+    finally:
+        if stream is not None and hasattr(stream, "close"):
+            stream.close()
+
+    _put_chunk(q, _STREAM_DONE, stop_event)
+
+
+def stream_in_background(func, *args, **kwargs):
+    """Iterates over ``func(*args, **kwargs)`` on the stream executor and
+    emits its items.
+
+    Items are passed through a bounded queue, so producers pause when the
+    consumer falls behind. If the consumer closes the generator early, the
+    producer is cancelled. Exceptions raised by the producer are emitted as
+    items, after which the stream ends.
+
+    The queue size can be configured via the ``VOXELGPT_STREAM_QUEUE_SIZE``
+    environment variable.
+
+    Args:
+        func: a function that returns an iterable
+        *args: positional arguments for ``func``
+        **kwargs: keyword arguments for ``func``
+
+    Returns:
+        a generator that emits the streamed items
+    """
+    q = queue.Queue(maxsize=get_stream_queue_size())
+    stop_event = threading.Event()
+
+    with _active_streams_lock:
+        _active_streams.add(q)
+
+    future = get_stream_executor().submit(
+        _produce_stream, func, args, kwargs, q, stop_event
+    )
+
+    try:
+        while True:
+            chunk = q.get()
+            if chunk is _STREAM_DONE:
+                break
+
+            yield chunk
+
+            if isinstance(chunk, Exception):
+                break
+    finally:
+        stop_event.set()
+        future.cancel()
+        with _active_streams_lock:
+            _active_streams.discard(q)
+
+
+class TaskGroup(object):
+    """A group of named tasks that run concurrently on the shared executor.
+
+    Since LLM requests cannot be interrupted once they have started,
+    cancelling a task prevents it from starting if it is still queued, and
+    otherwise abandons its result.
+
+    Example::
+
+        tasks = TaskGroup()
+        tasks.submit("create_view", should_create_view, query)
+        tasks.submit("aggregate", should_aggregate, query)
+
+        if should_run_computation(query):
+            tasks.cancel()
+        else:
+            create_view_flag = tasks.result("create_view")
+            aggregate_flag = tasks.result("aggregate")
+
+    Args:
+        executor (None): an optional executor to use. By default,
+            :func:`get_executor` is used
+    """
+
+    def __init__(self, executor=None):
+        self.executor = executor
+        self._futures = {}
+
+    def __contains__(self, name):
+        return name in self._futures
+
+    def submit(self, name, func, *args, **kwargs):
+        """Schedules ``func(*args, **kwargs)`` to run as the task ``name``.
+
+        Args:
+            name: the task name
+            func: the function to run
+            *args: positional arguments for ``func``
+            **kwargs: keyword arguments for ``func``
+
+        Returns:
+            a :class:`concurrent.futures.Future`
+        """
+        executor = self.executor or get_executor()
+        future = executor.submit(func, *args, **kwargs)
+        self._futures[name] = future
+        return future
+
+    def submit_async(self, name, coro):
+        """Schedules the coroutine ``coro`` to run on the current event loop
+        as the task ``name``.
+
+        Unlike tasks submitted via :meth:`submit`, cancelling an async task
+        interrupts it.
+
+        Args:
+            name: the task name
+            coro: a coroutine
+
+        Returns:
+            an :class:`asyncio.Task`
+        """
+        task = asyncio.ensure_future(coro)
+        task.add_done_callback(_retrieve_exception)
+        self._futures[name] = task
+        return task
+
+    def result(self, name, timeout=None):
+        """Waits for the task ``name`` and returns its result.
+
+        Any exception raised by the task is re-raised here.
+
+        Args:
+            name: the task name
+            timeout (None): an optional number of seconds to wait
+
+        Returns:
+            the task's result
+        """
+        return self._futures.pop(name).result(timeout=timeout)
+
+    async def aresult(self, name):
+        """Awaits the task ``name`` without blocking the event loop and
+        returns its result.
+
+        Any exception raised by the task is re-raised here.
+
+        Args:
+            name: the task name
+
+        Returns:
+            the task's result
+        """
+        future = self._futures.pop(name)
+        if isinstance(future, asyncio.Future):
+            return await future
+
+        return await asyncio.wrap_future(future)
+
+    def cancel(self, name=None):
+        """Cancels the task ``name``, or all outstanding tasks if no name is
+        provided.
+
+        Args:
+            name (None): an optional task name
+        """
+        if name is not None:
+            names = [name] if name in self._futures else []
+        else:
+            names = list(self._futures.keys())
+
+        for _name in names:
+            self._futures.pop(_name).cancel()
+
+
+def _retrieve_exception(task):
+    ## Abandoned tasks may fail, which shouldn't be logged as unhandled
+    if not task.cancelled():
+        task.exception()
+
+
+def map_concurrently(func, items, max_workers=None):
+    """Applies ``func`` to each item concurrently on a bounded pool.
+
+    Results are returned in the same order as ``items``, and any exception
+    raised for an item is captured rather than propagated, so that one
+    failure does not affect the other items.
+
+    A dedicated pool is used so that this function may safely be called from
+    tasks that are themselves running on the shared executor.
+
+    Args:
+        func: a function that accepts a single item
+        items: an iterable of items
+        max_workers (None): the maximum number of items to process at once.
+            By default, :func:`get_max_workers` is used
+
+    Returns:
+        a list of ``(result, exception)`` tuples, one per item, where exactly
+        one of ``result`` and ``exception`` is meaningful
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    if max_workers is None:
+        max_workers = get_max_workers()
+
+    def _run(item):
+        try:
+            return func(item), None
+        except Exception as e:
+            return None, e
+
+    num_workers = max(1, min(max_workers, len(items)))
+    if num_workers == 1:
+        return [_run(item) for item in items]
+
+    with ThreadPoolExecutor(
+        max_workers=num_workers, thread_name_prefix="voxelgpt-map"
+    ) as executor:
+        return list(executor.map(_run, items))
+
+
+async def run_sync(func, *args, **kwargs):
+    """Awaits the blocking call ``func(*args, **kwargs)`` without blocking the
+    event loop.
+
+    The call runs on :func:`get_blocking_executor` rather than on
+    :func:`get_executor`, since the call may itself wait on tasks that are
+    queued on the shared executor.
+
+    Args:
+        func: the function to run
+        *args: positional arguments for ``func``
+        **kwargs: keyword arguments for ``func``
+
+    Returns:
+        the function's result
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_blocking_executor(), functools.partial(func, *args, **kwargs)
+    )
+
+
+def get_event_loop():
+    """Returns the process-wide event loop on which
+    :func:`iterate_async_generator` drives async generators.
+
+    The loop runs forever in a background thread. Reusing one loop lets async
+    LLM clients keep their connection pools between requests, since those
+    pools are bound to the loop that created them.
+    """
+    global _event_loop
+
+    if _event_loop is not None:
+        return _event_loop
+
+    with _executor_lock:
+        if _event_loop is None:
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(
+                target=loop.run_forever, name="voxelgpt-loop", daemon=True
+            )
+            thread.start()
+            _event_loop = loop
+
+    return _event_loop
+
+
+def iterate_async_generator(agen):
+    """Synchronously iterates over the given async generator.
+
+    The generator is driven by :func:`get_event_loop`, so this function may
+    be called from any thread, including threads that are running their own
+    event loop.
+
+    Args:
+        agen: an async generator
+
+    Returns:
+        a generator that emits the items of ``agen``
+    """
+    loop = get_event_loop()
+
+    def _run(coro):
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+    try:
+        while True:
+            try:
+                yield _run(agen.__anext__())
+            except StopAsyncIteration:
+                break
+    finally:
+        _run(agen.aclose())
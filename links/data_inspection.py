@@ -6,7 +6,10 @@ Data Inspection Agent
 |
 """
 
+import contextvars
+import functools
 import os
+import threading
 from typing import List, Dict, Any
 
 from langchain_core.runnables import RunnableLambda
@@ -16,7 +19,10 @@ import fiftyone as fo
 from fiftyone import ViewField as F
 
 # pylint: disable=relative-beyond-top-level
-from .utils import PROMPTS_DIR, _build_agent_executor_chain, gpt_4o
+from .caching import LRUCache, make_cache_key
+from .dataset_profile import get_dataset_profile
+from .dataset_snapshot import _get_snapshot_key, get_dataset_snapshot
+from .utils import PROMPTS_DIR, _build_agent_executor_chain, get_gpt4o
 
 
 DATA_INSPECTION_PATH = os.path.join(
@@ -24,82 +30,159 @@ DATA_INSPECTION_PATH = os.path.join(
 )
 
 
-def _create_data_agent_executor(sample_collection):
+_data_agent_executors = LRUCache(max_size=8)
+
+# Tool results memoized during the current request
+_tool_results = contextvars.ContextVar("tool_results", default=None)
+
+_tool_cache = None
+_tool_cache_lock = threading.Lock()
+
+
+def get_tool_cache_ttl():
+    ttl = os.environ.get("VOXELGPT_TOOL_CACHE_TTL", 0)
+    if isinstance(ttl, str):
+        try:
+            ttl = float(ttl)
+        except:
+            ttl = 0
+    return ttl
+
+
+def _get_tool_cache():
+    global _tool_cache
+
+    ttl = get_tool_cache_ttl()
+    if not ttl:
+        return None
+
+    if _tool_cache is not None:
+        return _tool_cache
+
+    with _tool_cache_lock:
+        if _tool_cache is None:
+            _tool_cache = LRUCache(max_size=1024, ttl=ttl)
+
+    return _tool_cache
+
+
+def _create_data_agent_executor(sample_collection, model):
     tools = make_data_inspection_tools(sample_collection)
-    return _build_agent_executor_chain(gpt_4o, tools, DATA_INSPECTION_PATH)
+    return _build_agent_executor_chain(model, tools, DATA_INSPECTION_PATH)
+
+
+def _get_data_agent_executor(sample_collection):
+    ## The executor and its tools are reused until the collection changes
+    model = get_gpt4o()
+    key = (id(model), _get_snapshot_key(sample_collection))
+    executor = _data_agent_executors.get(key)
+    if executor is None:
+        executor = _create_data_agent_executor(sample_collection, model)
+        _data_agent_executors.set(key, executor)
+
+    return executor
 
 
 def run_basic_data_inspection_query(query, sample_collection):
+    executor = _get_data_agent_executor(sample_collection)
+
     def data_inspection_func(info):
         query = info["query"]
-        response = _create_data_agent_executor(sample_collection).invoke(
-            {"input": query}
-        )
+        response = executor.invoke({"input": query})
         return response
 
-    data_inspection_runnable = RunnableLambda(data_inspection_func)
-    return data_inspection_runnable.invoke({"query": query})["output"]
+    token = _tool_results.set({})
+    try:
+        data_inspection_runnable = RunnableLambda(data_inspection_func)
+        return data_inspection_runnable.invoke({"query": query})["output"]
+    finally:
+        _tool_results.reset(token)
+
+
+def _make_tool_memoizer(sample_collection):
+    collection_key = _get_snapshot_key(sample_collection)
+
+    def memoize(func):
+        """Memoizes the results of a tool within the current request and,
+        if ``VOXELGPT_TOOL_CACHE_TTL`` is set, across requests.
+        """
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = make_cache_key(collection_key, func.__name__, args, kwargs)
+
+            results = _tool_results.get()
+            if results is not None and key in results:
+                return results[key]
+
+            cache = _get_tool_cache()
+            value = cache.get(key) if cache is not None else None
+            if value is None:
+                value = func(*args, **kwargs)
+                if cache is not None:
+                    cache.set(key, value)
+
+            if results is not None:
+                results[key] = value
+
+            return value
+
+        return wrapper
+
+    return memoize
+
+
+def _list_fields_with_doc_type(sample_collection, doc_type):
+    snapshot = get_dataset_snapshot(sample_collection)
+    return snapshot.list_fields_with_doc_type(doc_type)
 
 
 def _list_detection_fields(sample_collection):
-    return list(
-        sample_collection.get_field_schema(
-            embedded_doc_type=fo.Detections
-        ).keys()
-    )
+    return _list_fields_with_doc_type(sample_collection, fo.Detections)
 
 
 def _list_classification_fields(sample_collection):
-    return list(
-        sample_collection.get_field_schema(
-            embedded_doc_type=fo.Classification
-        ).keys()
-    )
+    return _list_fields_with_doc_type(sample_collection, fo.Classification)
 
 
 def _list_polylines_fields(sample_collection):
-    return list(
-        sample_collection.get_field_schema(
-            embedded_doc_type=fo.Polylines
-        ).keys()
-    )
+    return _list_fields_with_doc_type(sample_collection, fo.Polylines)
 
 
 def _has_geolocation(sample_collection):
-    geo_fields = list(
-        sample_collection.get_field_schema(
-            embedded_doc_type=fo.GeoLocation
-        ).keys()
-    )
+    geo_fields = _list_fields_with_doc_type(sample_collection, fo.GeoLocation)
     return len(geo_fields) > 0
 
 
 def make_data_inspection_tools(sample_collection):
+    memoize = _make_tool_memoizer(sample_collection)
+
     @tool
+    @memoize
     def list_sample_fields() -> Dict[str, str]:
         """Lists the fields in my dataset."""
         return _list_fields(sample_collection)
 
     @tool
+    @memoize
     def list_geolocation_fields() -> List[str]:
         """Lists the geolocation fields in my dataset."""
-        return list(
-            sample_collection.get_field_schema(
-                embedded_doc_type=fo.GeoLocation
-            ).keys()
-        )
+        return _list_fields_with_doc_type(sample_collection, fo.GeoLocation)
 
     @tool
+    @memoize
     def list_detection_fields() -> List[str]:
         """Lists the detection fields in my dataset."""
         return _list_detection_fields(sample_collection)
 
     @tool
+    @memoize
     def list_classification_fields() -> List[str]:
         """Lists the classification fields in my dataset."""
         return _list_classification_fields(sample_collection)
 
     @tool
+    @memoize
     def list_detection_classes(detection_field: str) -> List[str]:
         """Lists the classes in the specified detection field in my dataset."""
         return sample_collection.distinct(
@@ -107,16 +190,19 @@ def make_data_inspection_tools(sample_collection):
         )
 
     @tool
+    @memoize
     def list_classification_classes(classification_field: str) -> List[str]:
         """Lists the classes in the specified classification field in my dataset."""
         return sample_collection.distinct(F(f"{classification_field}.label"))
 
     @tool
+    @memoize
     def list_polylines_fields() -> List[str]:
         """Lists the polyline fields in my dataset."""
         return _list_polylines_fields(sample_collection)
 
     @tool
+    @memoize
     def list_polylines_classes(polyline_field: str) -> List[str]:
         """Lists the classes in the specified polyline field in my dataset."""
         return sample_collection.distinct(
@@ -124,58 +210,55 @@ def make_data_inspection_tools(sample_collection):
         )
 
     @tool
+    @memoize
     def list_segmentation_fields() -> List[str]:
         """Lists the segmentation fields in my dataset."""
-        return list(
-            sample_collection.get_field_schema(
-                embedded_doc_type=fo.Segmentation
-            ).keys()
-        )
+        return _list_fields_with_doc_type(sample_collection, fo.Segmentation)
 
     @tool
+    @memoize
     def list_keypoints_fields() -> List[str]:
         """Lists the keypoints fields in my dataset."""
-        return list(
-            sample_collection.get_field_schema(
-                embedded_doc_type=fo.Keypoints
-            ).keys()
-        )
+        return _list_fields_with_doc_type(sample_collection, fo.Keypoints)
 
     @tool
+    @memoize
     def list_heatmap_fields() -> List[str]:
         """Lists the heatmap fields in my dataset."""
-        return list(
-            sample_collection.get_field_schema(
-                embedded_doc_type=fo.Heatmap
-            ).keys()
-        )
+        return _list_fields_with_doc_type(sample_collection, fo.Heatmap)
 
     @tool
+    @memoize
     def get_dataset_name() -> str:
         """Returns the name of the dataset."""
         return sample_collection.name
 
     @tool
+    @memoize
     def get_dataset_length() -> int:
         """Returns the number of samples in the dataset."""
         return sample_collection.count()
 
     @tool
+    @memoize
     def get_dataset_info() -> Dict[str, Any]:
         """Returns the dataset info."""
         return sample_collection.info
 
     @tool
+    @memoize
     def get_dataset_tags() -> List[str]:
         """Returns the tags of the dataset."""
         return sample_collection.tags
 
     @tool
+    @memoize
     def get_dataset_description() -> str:
         """Returns the description of the dataset."""
         return sample_collection.description
 
     @tool
+    @memoize
     def has_metadata() -> bool:
         """Returns whether the dataset has metadata."""
         return (
@@ -184,12 +267,14 @@ def make_data_inspection_tools(sample_collection):
         )
 
     @tool
+    @memoize
     def has_geolocation() -> bool:
         """Returns whether the dataset has geolocation data."""
         return _has_geolocation(sample_collection)
 
     # @tools
     @tool
+    @memoize
     def list_brain_runs() -> List[str]:
         """Lists the names of the brain runs in the workspace. This includes
         runs for:
@@ -198,59 +283,67 @@ def make_data_inspection_tools(sample_collection):
         - computing hardness (e.g., `hardness`)
         - computing mistakennes (e.g., `mistakenness`)
         """
-        return sample_collection.list_brain_runs()
+        return get_dataset_snapshot(sample_collection).list_brain_runs()
 
     @tool
+    @memoize
     def get_brain_run_info(brain_key: str) -> Dict[str, Any]:
         """Returns the info about the brain run specified by `brain_key`. The
         brain run must exist on the dataset."""
-        return dict(sample_collection.get_brain_info(brain_key).serialize())
+        snapshot = get_dataset_snapshot(sample_collection)
+        return dict(snapshot.get_brain_info(brain_key).serialize())
 
     @tool
+    @memoize
     def list_evaluation_runs() -> List[str]:
         """Lists the names of the evaluation runs in the workspace."""
-        return sample_collection.list_evaluations()
+        return get_dataset_snapshot(sample_collection).list_evaluations()
 
     @tool
+    @memoize
     def get_evaluation_run_info(eval_key: str) -> Dict[str, Any]:
         """Returns the info about the evaluation run specified by `eval_key`. The
         evaluation run must exist on the dataset."""
-        return dict(
-            sample_collection.get_evaluation_info(eval_key).serialize()
-        )
+        snapshot = get_dataset_snapshot(sample_collection)
+        return dict(snapshot.get_evaluation_info(eval_key).serialize())
 
     @tool
+    @memoize
     def list_annotation_runs() -> List[str]:
         """Lists the names of the annotation runs in the workspace."""
-        return sample_collection.list_annotation_runs()
+        return get_dataset_snapshot(sample_collection).list_annotation_runs()
 
     @tool
+    @memoize
     def get_annotation_run_info(annotation_key: str) -> Dict[str, Any]:
         """Returns the info about the annotation run specified by `annotation_key`.
         The annotation run must exist on the dataset."""
-        return dict(
-            sample_collection.get_annotation_info(annotation_key).serialize()
-        )
+        snapshot = get_dataset_snapshot(sample_collection)
+        return dict(snapshot.get_annotation_info(annotation_key).serialize())
 
     @tool
+    @memoize
     def list_custom_runs() -> List[str]:
         """Lists the names of the custom runs in the workspace."""
         return sample_collection.list_runs()
 
     @tool
+    @memoize
     def get_custom_run_info(custom_key: str) -> Dict[str, Any]:
         """Returns the info about the custom run specified by `custom_key`. The
         custom run must exist on the dataset."""
         return dict(sample_collection.get_run_info(custom_key).serialize())
 
     @tool
+    @memoize
     def get_dataset_media_type() -> str:
         """Returns the media type of the dataset. If media type is 'grouped',
         the dataset contains multiple groups slices, each with its own media
         type."""
-        return sample_collection.media_type
+        return get_dataset_snapshot(sample_collection).media_type
 
     @tool
+    @memoize
     def get_schema_of_field(field: str) -> Dict[str, Any]:
         """Returns a dictionary containing the schema of the subfields within
         the specified embedded document field."""
@@ -265,14 +358,14 @@ def make_data_inspection_tools(sample_collection):
             return obj.to_dict().items()
 
     @tool
+    @memoize
     def get_dataset_group_slices() -> List[str]:
         """Returns the group slices of the dataset. For a dataset with media type
         `group`, this will return the group slices. For a dataset with other
         media types, this will return an empty list.
 
         """
-        res = sample_collection.group_slices
-        return res if res is not None else []
+        return get_dataset_snapshot(sample_collection).group_slices
 
     data_inspection_tools = [
         has_metadata,
@@ -342,7 +435,9 @@ def _convert_fiftyone_type(fo_type):
 def _list_fields(sample_collection):
     return {
         k: _convert_fiftyone_type(v)
-        for k, v in dict(sample_collection.get_field_schema()).items()
+        for k, v in get_dataset_snapshot(
+            sample_collection
+        ).field_schema.items()
     }
 
 
@@ -376,23 +471,64 @@ def _involves_label_classes(actors, plan):
 
 
 def _get_text_sim_runs(dataset):
+    snapshot = get_dataset_snapshot(dataset)
     text_runs = []
-    for run in dataset.list_brain_runs():
-        config = dataset.get_brain_info(run).config
+    for run in snapshot.list_brain_runs():
+        config = snapshot.get_brain_info(run).config
         if config.type == "similarity" and config.supports_prompts:
             text_runs.append(run)
     return text_runs
 
 
 def _get_classification_evaluation_runs(dataset):
-    return dataset.list_evaluations(type="classification")
+    return get_dataset_snapshot(dataset).list_evaluations(
+        type="classification"
+    )
 
 
 def _get_detection_evaluation_runs(dataset):
-    return dataset.list_evaluations(type="detection")
+    return get_dataset_snapshot(dataset).list_evaluations(type="detection")
+
+
+def _describe_label_fields(profile, kind, kind_name, label_classes_flag):
+    fields = [
+        name
+        for name, field in profile["fields"].items()
+        if field["kind"] == kind
+    ]
+    if not fields:
+        return fields, ""
+
+    results = f"Dataset has the following {kind_name} fields: {fields}\n"
+    for name in fields:
+        field = profile["fields"][name]
+        if field["has_confidence"]:
+            results += f"Field {name} has confidence values, so it is likely a prediction field.\n"
+        else:
+            results += f"Field {name} does not have confidence values, so it is likely a ground truth field.\n"
+
+        if label_classes_flag:
+            classes = field["classes"]
+            if len(classes) < 100:
+                results += (
+                    f"Field {name} has the following classes: {classes}\n"
+                )
+
+    return fields, results
+
+
+def _describe_run_configs(runs, run_keys):
+    results = ""
+    for run in run_keys:
+        results += f"Here is configuration info about the run {run}:\n"
+        for k, v in runs[run]["config"].items():
+            results += f"    {k}: {v}\n"
+
+    return results
 
 
 def _run_default_inspection_for_plan(dataset, actors, plan):
+    snapshot = get_dataset_snapshot(dataset)
     inspection_results = ""
 
     all_fields_flag = any([actor in all_field_types for actor in actors])
@@ -400,7 +536,7 @@ def _run_default_inspection_for_plan(dataset, actors, plan):
     label_fields_flag = any([actor in label_field_types for actor in actors])
     grouped_flag = any([actor in grouped_field_types for actor in actors])
     match_tags_flag = any([actor in ["MatchTags"] for actor in actors]) or (
-        grouped_flag and dataset.media_type != "group"
+        grouped_flag and snapshot.media_type != "group"
     )
     label_classes_flag = _involves_label_classes(actors, plan)
     sim_flag = any([actor in ["SortBySimilarity"] for actor in actors])
@@ -410,6 +546,18 @@ def _run_default_inspection_for_plan(dataset, actors, plan):
     )
     eval_keys_flag = any(["eval" in step.lower() for step in plan.steps])
 
+    ## Label classes, confidences, tags, and runs are read from the dataset's
+    ## profile rather than queried
+    profile = None
+    if (
+        label_fields_flag
+        or match_tags_flag
+        or sim_flag
+        or eval_patches_flag
+        or eval_keys_flag
+    ):
+        profile = get_dataset_profile(dataset)
+
     ## Basic info
     if all_fields_flag:
         inspection_results += "Dataset has the following fields (type): \n"
@@ -425,75 +573,25 @@ def _run_default_inspection_for_plan(dataset, actors, plan):
 
     ## Grouped
     if grouped_flag:
-        if dataset.media_type == "group":
-            inspection_results += f"Dataset is grouped, so you can use `SelectGroupSlices` stage. The group slices are: {dataset.group_slices}\n"
+        if snapshot.media_type == "group":
+            inspection_results += f"Dataset is grouped, so you can use `SelectGroupSlices` stage. The group slices are: {snapshot.group_slices}\n"
         else:
             inspection_results += "Dataset is not grouped. You cannot use `SelectGroupSlices` stage. Consider using `MatchTags` or a categorical field.\n"
 
     ## Classification, Detection, Polylines
     if label_fields_flag:
-        cls_fields = _list_classification_fields(dataset)
-        if cls_fields:
-            inspection_results += f"Dataset has the following classification fields: {cls_fields}\n"
-            for cls_field in cls_fields:
-                has_confs = (
-                    dataset.limit(10).distinct(f"{cls_field}.confidence") != []
-                )
-                if has_confs:
-                    inspection_results += f"Field {cls_field} has confidence values, so it is likely a prediction field.\n"
-                else:
-                    inspection_results += f"Field {cls_field} does not have confidence values, so it is likely a ground truth field.\n"
-
-                if label_classes_flag:
-                    classes = dataset[:1000].distinct(f"{cls_field}.label")
-                    if len(classes) < 100:
-                        inspection_results += f"Field {cls_field} has the following classes: {classes}\n"
-        det_fields = _list_detection_fields(dataset)
-        if det_fields:
-            inspection_results += (
-                f"Dataset has the following detection fields: {det_fields}\n"
-            )
-            for det_field in det_fields:
-                has_confs = (
-                    dataset.limit(10).distinct(
-                        f"{det_field}.detections.confidence"
-                    )
-                    != []
-                )
-                if has_confs:
-                    inspection_results += f"Field {det_field} has confidence values, so it is likely a prediction field.\n"
-                else:
-                    inspection_results += f"Field {det_field} does not have confidence values, so it is likely a ground truth field.\n"
-
-                if label_classes_flag:
-                    classes = dataset[:1000].distinct(
-                        f"{det_field}.detections.label"
-                    )
-                    if len(classes) < 100:
-                        inspection_results += f"Field {det_field} has the following classes: {classes}\n"
-        pl_fields = _list_polylines_fields(dataset)
-        if pl_fields:
-            inspection_results += (
-                f"Dataset has the following polyline fields: {pl_fields}\n"
-            )
-            for pl_field in pl_fields:
-                has_confs = (
-                    dataset.limit(10).distinct(
-                        f"{pl_field}.polylines.confidence"
-                    )
-                    != []
-                )
-                if has_confs:
-                    inspection_results += f"Field {pl_field} has confidence values, so it is likely a prediction field.\n"
-                else:
-                    inspection_results += f"Field {pl_field} does not have confidence values, so it is likely a ground truth field.\n"
-
-                if label_classes_flag:
-                    classes = dataset[:1000].distinct(
-                        f"{pl_field}.polylines.label"
-                    )
-                    if len(classes) < 100:
-                        inspection_results += f"Field {pl_field} has the following classes: {classes}\n"
+        _, results = _describe_label_fields(
+            profile, "classification", "classification", label_classes_flag
+        )
+        inspection_results += results
+        det_fields, results = _describe_label_fields(
+            profile, "detections", "detection", label_classes_flag
+        )
+        inspection_results += results
+        _, results = _describe_label_fields(
+            profile, "polylines", "polyline", label_classes_flag
+        )
+        inspection_results += results
 
         ## Patches
         if patches_flag and not det_fields:
@@ -508,55 +606,52 @@ def _run_default_inspection_for_plan(dataset, actors, plan):
 
     ## Evaluation Patches
     if eval_patches_flag:
-        det_eval_runs = _get_detection_evaluation_runs(dataset)
+        det_eval_runs = [
+            run
+            for run, info in profile["evaluations"].items()
+            if info["type"] == "detection"
+        ]
         if not det_eval_runs:
             inspection_results += "Dataset does not have detection evaluation runs, so you cannot use `ToEvaluationPatches` stage. You also cannot use 'eval' in `filter_labels()` or `match_labels()` on detection fields.\n"
         else:
             inspection_results += f"Dataset has the following detection evaluation runs: {det_eval_runs}\n"
-            for run in det_eval_runs:
-                inspection_results += (
-                    f"Here is configuration info about the run {run}:\n"
-                )
-                for k, v in dataset.get_evaluation_info(
-                    run
-                ).config.__dict__.items():
-                    inspection_results += f"    {k}: {v}\n"
+            inspection_results += _describe_run_configs(
+                profile["evaluations"], det_eval_runs
+            )
 
     ## Evaluation Keys
     if eval_keys_flag:
-        cls_eval_runs = _get_classification_evaluation_runs(dataset)
+        cls_eval_runs = [
+            run
+            for run, info in profile["evaluations"].items()
+            if info["type"] == "classification"
+        ]
         if not cls_eval_runs:
             inspection_results += "Dataset does not have classification evaluation runs, so you cannot use 'eval' in `filter_labels()` or `match_labels()` on classification fields.\n"
         else:
             inspection_results += f"Dataset has the following classification evaluation runs: {cls_eval_runs}\n"
-            for run in cls_eval_runs:
-                inspection_results += (
-                    f"Here is configuration info about the run {run}:\n"
-                )
-                for k, v in dataset.get_evaluation_info(
-                    run
-                ).config.__dict__.items():
-                    inspection_results += f"    {k}: {v}\n"
+            inspection_results += _describe_run_configs(
+                profile["evaluations"], cls_eval_runs
+            )
 
     # SortBySimilarity
     if sim_flag:
-        text_runs = _get_text_sim_runs(dataset)
+        text_runs = [
+            run
+            for run, info in profile["brain_runs"].items()
+            if info["type"] == "similarity" and info["supports_prompts"]
+        ]
         if not text_runs:
             inspection_results += "Dataset does not have text similarity brain runs, so you cannot use `SortBySimilarity` stage. Instead, consider using `MatchTags` or a categorical field.\n"
         if len(text_runs) > 1:
             inspection_results += f"Dataset has multiple text similarity brain runs: {text_runs}\n"
-            for run in text_runs:
-                inspection_results += (
-                    f"Here is configuration info about the run {run}:\n"
-                )
-                for k, v in dataset.get_brain_info(
-                    run
-                ).config.__dict__.items():
-                    inspection_results += f"    {k}: {v}\n"
+            inspection_results += _describe_run_configs(
+                profile["brain_runs"], text_runs
+            )
 
     ## Sample Tags
     if match_tags_flag or (sim_flag and not text_runs):
-        tags = dataset.distinct("tags")
+        tags = profile["tags"]
         inspection_results += f"There is at least one sample with each of the following tags: {tags}\n"
 
     if inspection_results == "":
@@ -0,0 +1,435 @@
+"""
+Persistent dataset profiles for view planning.
+
+| Copyright 2017-2024, Voxel51, Inc.
+| `voxel51.com <https://voxel51.com/>`_
+|
+"""
+
+import copy
+from datetime import datetime
+import logging
+import os
+import threading
+
+import fiftyone as fo
+from fiftyone import ViewField as F
+
+# pylint: disable=relative-beyond-top-level
+from .caching import LRUCache, SQLiteCache, TieredCache, make_cache_key
+from .concurrency import get_executor
+from .dataset_snapshot import get_dataset_snapshot
+from .utils import get_cache_dir
+
+
+PROFILE_VERSION = 3
+
+# Label fields are profiled via the label list within them
+LABEL_FIELD_KINDS = (
+    ("classification", fo.Classification, "{}"),
+    ("detections", fo.Detections, "{}.detections"),
+    ("polylines", fo.Polylines, "{}.polylines"),
+)
+
+_MAX_CLASSES = 1000
+_NUM_SAMPLED = 1000
+
+_profile_cache = None
+_profile_cache_lock = threading.Lock()
+_profile_lock = threading.Lock()
+_profile_locks = {}
+_pending_builds = {}
+
+logger = logging.getLogger(__name__)
+
+
+def dataset_profile_enabled():
+    flag = os.environ.get("VOXELGPT_DATASET_PROFILE", True)
+    if isinstance(flag, str):
+        return flag.lower() in ("true", "1", "yes", "on")
+    return flag
+
+
+def get_profile_cache():
+    """Returns the (lazily constructed) cache of dataset profiles.
+
+    Profiles are stored in ``dataset_profiles.db`` in the directory returned
+    by :func:`links.utils.get_cache_dir`.
+
+    Returns:
+        a :class:`links.caching.TieredCache`
+    """
+    global _profile_cache
+
+    if _profile_cache is not None:
+        return _profile_cache
+
+    with _profile_cache_lock:
+        if _profile_cache is None:
+            _profile_cache = TieredCache(
+                memory=LRUCache(max_size=32),
+                disk=SQLiteCache(
+                    os.path.join(get_cache_dir(), "dataset_profiles.db"),
+                    max_size=1000,
+                ),
+            )
+
+    return _profile_cache
+
+
+def get_dataset_profile(sample_collection):
+    """Returns a profile of the given sample collection for use when
+    planning views.
+
+    A profile is a dict containing the class vocabulary of each label field
+    and whether it has confidences, the sample tags, and summaries of the
+    evaluation and brain runs of the collection.
+
+    Profiles are built for and persisted per dataset, and views are answered
+    from the profile of their dataset, restricted to the label fields of the
+    view. Once a dataset has been profiled, its profile is returned without
+    profiling any samples until the ``last_modified_at`` of its most recently
+    modified sample changes. At that point, only the samples that were
+    modified since the profile was last refreshed are profiled and merged
+    into it.
+
+    Since merging can only add classes and tags, profiles are rebuilt from
+    scratch if any of the merged samples already existed, as edits may have
+    removed classes, and until then, the merged profile is returned. Profiles
+    are also rebuilt if the label fields of the dataset change or its
+    ``last_deletion_at`` changes.
+
+    Since building a profile requires a pass over the entire dataset,
+    profiles are built in the background. Until a dataset's profile is
+    available, a profile of the first 1000 samples of the collection is built
+    on each call, as is the case if profiles are disabled via the
+    ``VOXELGPT_DATASET_PROFILE`` environment variable or cannot be loaded.
+
+    Args:
+        sample_collection: a
+            :class:`fiftyone.core.collections.SampleCollection`
+
+    Returns:
+        a profile dict
+    """
+    if dataset_profile_enabled():
+        try:
+            profile = _get_persistent_profile(sample_collection)
+            if profile is not None:
+                return profile
+        except Exception as e:
+            logger.warning(
+                "Failed to load dataset profile; profiling the first %d "
+                "samples instead: %s",
+                _NUM_SAMPLED,
+                e,
+            )
+
+    profile = _new_profile(sample_collection)
+    _profile_samples(profile, sample_collection.limit(_NUM_SAMPLED))
+    _profile_runs(profile, sample_collection)
+    return profile
+
+
+def get_fields_with_confidences(sample_collection, fields):
+    """Returns the label fields that contain at least one label with a
+    confidence.
+
+    If dataset profiles are enabled and the dataset's profile has been
+    built, the profile is used. Otherwise, all fields are checked over the
+    entire collection via a single aggregation, rather than over the first
+    samples that :func:`get_dataset_profile` would profile.
+
+    Args:
+        sample_collection: a
+            :class:`fiftyone.core.collections.SampleCollection`
+        fields: a list of label field names
+
+    Returns:
+        a list of field names
+    """
+    profile = None
+    if dataset_profile_enabled():
+        try:
+            profile = _get_persistent_profile(sample_collection)
+        except Exception as e:
+            logger.warning("Failed to load dataset profile: %s", e)
+
+    if profile is not None:
+        return [
+            name
+            for name in fields
+            if profile["fields"].get(name, {}).get("has_confidence", False)
+        ]
+
+    label_fields = _get_label_fields(get_dataset_snapshot(sample_collection))
+    fields = [name for name in fields if name in label_fields]
+    if not fields:
+        return []
+
+    counts = sample_collection.aggregate(
+        [
+            fo.Count(_get_label_path(name, label_fields[name]) + ".confidence")
+            for name in fields
+        ]
+    )
+    return [name for name, count in zip(fields, counts) if count > 0]
+
+
+def _get_persistent_profile(sample_collection):
+    ## Profiles are tracked on the root dataset, whose freshness can be
+    ## checked via an index, rather than per view
+    dataset = sample_collection._root_dataset
+    snapshot = get_dataset_snapshot(dataset)
+    if not snapshot.has_field("last_modified_at"):
+        ## Modifications to samples can't be detected
+        return None
+
+    key = _get_profile_key(dataset)
+    cache = get_profile_cache()
+    state = _get_modification_state(dataset)
+
+    ## Only one refresh of each profile runs at a time, but refreshes of
+    ## different profiles don't wait on each other
+    with _get_key_lock(key):
+        profile = cache.get(key)
+        if _needs_rebuild(profile, snapshot, state):
+            _start_build(key, dataset, state)
+            return None
+
+        refreshed, rebuild = _refresh_profile(profile, dataset, state)
+        if refreshed is not profile:
+            cache.set(key, refreshed)
+
+        if rebuild:
+            _start_build(key, dataset, state)
+
+    return _restrict_profile(refreshed, sample_collection)
+
+
+def _get_key_lock(key):
+    with _profile_lock:
+        lock = _profile_locks.get(key, None)
+        if lock is None:
+            lock = threading.Lock()
+            _profile_locks[key] = lock
+
+    return lock
+
+
+def _get_profile_key(dataset):
+    return make_cache_key("profile", str(dataset._doc.id))
+
+
+def _get_modification_state(dataset):
+    ## Dataset.last_modified_at isn't updated when samples are added, edited,
+    ## or deleted, so the samples themselves are checked
+    return {
+        "last_modified_at": _isoformat(dataset.max("last_modified_at")),
+        "last_deletion_at": _isoformat(
+            getattr(dataset, "last_deletion_at", None)
+        ),
+    }
+
+
+def _needs_rebuild(profile, snapshot, state):
+    if profile is None or profile["version"] != PROFILE_VERSION:
+        return True
+
+    if _get_label_fields_of(profile) != _get_label_fields(snapshot):
+        return True
+
+    ## Samples may have been deleted, so classes and tags may have been
+    ## removed too
+    if profile["last_deletion_at"] != state["last_deletion_at"]:
+        return True
+
+    ## The dataset was empty, so there is nothing to merge into
+    return (
+        profile["last_modified_at"] is None
+        and state["last_modified_at"] is not None
+    )
+
+
+def _start_build(key, dataset, state):
+    with _profile_lock:
+        if key in _pending_builds:
+            return
+
+        _pending_builds[key] = get_executor().submit(
+            _build_profile, key, dataset, state
+        )
+
+
+def _build_profile(key, dataset, state):
+    ## Samples that are modified while the profile is being built are merged
+    ## in by the next refresh, since they are newer than ``state``
+    try:
+        profile = _new_profile(dataset, state)
+        _profile_samples(profile, dataset)
+        _profile_runs(profile, dataset)
+        get_profile_cache().set(key, profile)
+    except Exception as e:
+        logger.warning("Failed to build dataset profile: %s", e)
+    finally:
+        with _profile_lock:
+            _pending_builds.pop(key, None)
+
+
+def _refresh_profile(profile, dataset, state):
+    if profile["last_modified_at"] != state["last_modified_at"]:
+        refreshed = copy.deepcopy(profile)
+        refreshed["last_modified_at"] = state["last_modified_at"]
+
+        since = datetime.fromisoformat(profile["last_modified_at"])
+        first_created_at = _profile_samples(
+            refreshed,
+            dataset.match(F("last_modified_at") > since),
+            check_created_at=True,
+        )
+        refreshed["num_samples"] = dataset.count()
+        _profile_runs(refreshed, dataset)
+
+        ## Edited samples may no longer contain classes or tags that were
+        ## merged before, so the profile must be rebuilt to drop them
+        rebuild = first_created_at is not None and first_created_at <= since
+        return refreshed, rebuild
+
+    snapshot = get_dataset_snapshot(dataset)
+    if profile["run_keys"] != _get_run_keys(snapshot):
+        refreshed = copy.deepcopy(profile)
+        _profile_runs(refreshed, dataset)
+        return refreshed, False
+
+    return profile, False
+
+
+def _restrict_profile(profile, sample_collection):
+    if not isinstance(sample_collection, fo.DatasetView):
+        return profile
+
+    label_fields = _get_label_fields(get_dataset_snapshot(sample_collection))
+    fields = {
+        name: field
+        for name, field in profile["fields"].items()
+        if label_fields.get(name, None) == field["kind"]
+    }
+    if len(fields) == len(profile["fields"]):
+        return profile
+
+    return dict(profile, fields=fields)
+
+
+def _new_profile(sample_collection, state=None):
+    snapshot = get_dataset_snapshot(sample_collection)
+    state = state or {}
+    return {
+        "version": PROFILE_VERSION,
+        "last_modified_at": state.get("last_modified_at", None),
+        "last_deletion_at": state.get("last_deletion_at", None),
+        "num_samples": 0,
+        "fields": {
+            name: {"kind": kind, "has_confidence": False, "classes": []}
+            for name, kind in _get_label_fields(snapshot).items()
+        },
+        "tags": [],
+        "run_keys": [],
+        "evaluations": {},
+        "brain_runs": {},
+    }
+
+
+def _profile_samples(profile, sample_collection, check_created_at=False):
+    ## All statistics are computed in a single pass over the samples
+    aggregations = [fo.Count(), fo.Distinct("tags")]
+    for name, field in profile["fields"].items():
+        path = _get_label_path(name, field["kind"])
+        aggregations.append(fo.Distinct(f"{path}.label"))
+        aggregations.append(fo.Count(f"{path}.confidence"))
+
+    if check_created_at:
+        aggregations.append(fo.Min("created_at"))
+
+    results = sample_collection.aggregate(aggregations)
+
+    profile["num_samples"] += results[0]
+    profile["tags"] = sorted(set(profile["tags"]).union(results[1]))
+
+    num_fields = len(profile["fields"])
+    field_results = results[2 : 2 + 2 * num_fields]
+    for field, classes, num_confidences in zip(
+        profile["fields"].values(), field_results[::2], field_results[1::2]
+    ):
+        classes = sorted(set(field["classes"]).union(classes))
+        field["classes"] = classes[:_MAX_CLASSES]
+        field["has_confidence"] = field["has_confidence"] or (
+            num_confidences > 0
+        )
+
+    if check_created_at:
+        return results[-1]
+
+
+def _profile_runs(profile, sample_collection):
+    snapshot = get_dataset_snapshot(sample_collection)
+
+    evaluations = {}
+    for eval_key in snapshot.list_evaluations():
+        config = snapshot.get_evaluation_info(eval_key).config
+        evaluations[eval_key] = {
+            "type": getattr(config, "type", None),
+            "config": _summarize_config(config),
+        }
+
+    brain_runs = {}
+    for brain_key in snapshot.list_brain_runs():
+        config = snapshot.get_brain_info(brain_key).config
+        brain_runs[brain_key] = {
+            "type": getattr(config, "type", None),
+            "supports_prompts": bool(
+                getattr(config, "supports_prompts", False)
+            ),
+            "config": _summarize_config(config),
+        }
+
+    profile["run_keys"] = _get_run_keys(snapshot)
+    profile["evaluations"] = evaluations
+    profile["brain_runs"] = brain_runs
+
+
+def _summarize_config(config):
+    return {k: str(v) for k, v in config.__dict__.items()}
+
+
+def _get_run_keys(snapshot):
+    return sorted(snapshot.list_evaluations()) + sorted(
+        snapshot.list_brain_runs()
+    )
+
+
+def _get_label_fields(snapshot):
+    label_fields = {}
+    for kind, doc_type, _ in LABEL_FIELD_KINDS:
+        for name in snapshot.list_fields_with_doc_type(doc_type):
+            label_fields[name] = kind
+
+    return label_fields
+
+
+def _get_label_fields_of(profile):
+    return {name: field["kind"] for name, field in profile["fields"].items()}
+
+
+def _get_label_path(name, kind):
+    for _kind, _, path in LABEL_FIELD_KINDS:
+        if _kind == kind:
+            return path.format(name)
+
+    raise ValueError(f"Unsupported label field kind '{kind}'")
+
+
+def _isoformat(dt):
+    if dt is None:
+        return None
+
+    return dt.isoformat()
@@ -0,0 +1,207 @@
+"""
+Per-dataset schema snapshots.
+
+| Copyright 2017-2024, Voxel51, Inc.
+| `voxel51.com <https://voxel51.com/>`_
+|
+"""
+
+import threading
+
+import fiftyone as fo
+
+# pylint: disable=relative-beyond-top-level
+from .caching import LRUCache, make_cache_key
+
+
+_snapshots = LRUCache(max_size=32)
+_snapshots_lock = threading.Lock()
+_schema_versions = {}
+
+
+def get_dataset_snapshot(sample_collection):
+    """Returns a :class:`DatasetSnapshot` of the given sample collection.
+
+    Snapshots are cached, and a new snapshot is only built when the
+    collection's view, active group slice, or ``last_modified_at`` changes, or
+    when its dataset is passed to :func:`invalidate_dataset_snapshots`.
+
+    Args:
+        sample_collection: a
+            :class:`fiftyone.core.collections.SampleCollection`
+
+    Returns:
+        a :class:`DatasetSnapshot`
+    """
+    key = _get_snapshot_key(sample_collection)
+
+    snapshot = _snapshots.get(key)
+    if snapshot is not None:
+        return snapshot
+
+    with _snapshots_lock:
+        snapshot = _snapshots.get(key)
+        if snapshot is None:
+            snapshot = DatasetSnapshot(sample_collection)
+            _snapshots.set(key, snapshot)
+
+    return snapshot
+
+
+def invalidate_dataset_snapshots(sample_collection):
+    """Invalidates all snapshots of the dataset of the given sample
+    collection, including snapshots of its views.
+
+    This should be called after operations like brain runs that may not
+    update the dataset's ``last_modified_at``.
+
+    Args:
+        sample_collection: a
+            :class:`fiftyone.core.collections.SampleCollection`
+    """
+    name = sample_collection._root_dataset.name
+    with _snapshots_lock:
+        _schema_versions[name] = _schema_versions.get(name, 0) + 1
+
+
+def _get_snapshot_key(sample_collection):
+    root_dataset = sample_collection._root_dataset
+    dataset = sample_collection._dataset
+
+    if isinstance(sample_collection, fo.DatasetView):
+        stages = sample_collection._serialize(include_uuids=False)
+    else:
+        stages = None
+
+    return make_cache_key(
+        root_dataset.name,
+        _schema_versions.get(root_dataset.name, 0),
+        dataset.name,
+        getattr(dataset, "last_modified_at", None),
+        stages,
+        sample_collection.group_slice,
+    )
+
+
+class DatasetSnapshot(object):
+    """Snapshot of the schema, runs, and media types of a sample collection.
+
+    The field schema is read once when the snapshot is created and is indexed
+    by embedded document type. Run lists and run configs are loaded the first
+    time they are requested and then reused.
+
+    Args:
+        sample_collection: a
+            :class:`fiftyone.core.collections.SampleCollection`
+    """
+
+    def __init__(self, sample_collection):
+        self.sample_collection = sample_collection
+        self.media_type = sample_collection.media_type
+        self.group_slices = sample_collection.group_slices or []
+        self.group_media_types = sample_collection.group_media_types or {}
+        self.field_schema = dict(sample_collection.get_field_schema())
+        self.flat_field_schema = dict(
+            sample_collection.get_field_schema(flat=True)
+        )
+        self.fields_by_doc_type = _index_by_doc_type(self.field_schema)
+        self._cache = {}
+
+    def get_field_schema(self, ftype=None, embedded_doc_type=None):
+        """Returns the top-level fields of the collection of the given type.
+
+        Args:
+            ftype (None): an optional field type or tuple of field types
+            embedded_doc_type (None): an optional embedded document type or
+                tuple of embedded document types
+
+        Returns:
+            a dict mapping field names to field instances
+        """
+        schema = {}
+        for name, field in self.field_schema.items():
+            if ftype is not None and not isinstance(field, ftype):
+                continue
+
+            if embedded_doc_type is not None and not (
+                isinstance(field, fo.EmbeddedDocumentField)
+                and issubclass(field.document_type, embedded_doc_type)
+            ):
+                continue
+
+            schema[name] = field
+
+        return schema
+
+    def list_fields_with_doc_type(self, doc_type):
+        """Returns the names of the top-level fields whose embedded document
+        type is ``doc_type`` or a subclass of it.
+        """
+        names = set()
+        for field_type, field_names in self.fields_by_doc_type.items():
+            if issubclass(field_type, doc_type):
+                names.update(field_names)
+
+        return [name for name in self.field_schema if name in names]
+
+    def has_field(self, path):
+        """Returns whether the collection has the field ``path``."""
+        return path in self.flat_field_schema
+
+    def get_field(self, path):
+        """Returns the field ``path``, or None if it does not exist."""
+        return self.flat_field_schema.get(path, None)
+
+    def list_brain_runs(self):
+        return self._get(
+            ("brain_runs",), self.sample_collection.list_brain_runs
+        )
+
+    def get_brain_info(self, brain_key):
+        return self._get(
+            ("brain_info", brain_key),
+            self.sample_collection.get_brain_info,
+            brain_key,
+        )
+
+    def list_evaluations(self, type=None):
+        return self._get(
+            ("evaluations", type),
+            self.sample_collection.list_evaluations,
+            type=type,
+        )
+
+    def get_evaluation_info(self, eval_key):
+        return self._get(
+            ("evaluation_info", eval_key),
+            self.sample_collection.get_evaluation_info,
+            eval_key,
+        )
+
+    def list_annotation_runs(self):
+        return self._get(
+            ("annotation_runs",), self.sample_collection.list_annotation_runs
+        )
+
+    def get_annotation_info(self, anno_key):
+        return self._get(
+            ("annotation_info", anno_key),
+            self.sample_collection.get_annotation_info,
+            anno_key,
+        )
+
+    def _get(self, key, func, *args, **kwargs):
+        ## Racing threads may both load a value, which is harmless
+        if key not in self._cache:
+            self._cache[key] = func(*args, **kwargs)
+
+        return self._cache[key]
+
+
+def _index_by_doc_type(schema):
+    index = {}
+    for name, field in schema.items():
+        if isinstance(field, fo.EmbeddedDocumentField):
+            index.setdefault(field.document_type, []).append(name)
+
+    return index
@@ -0,0 +1,362 @@
+"""
+Offline FiftyOne docs corpus builder.
+
+| Copyright 2017-2024, Voxel51, Inc.
+| `voxel51.com <https://voxel51.com/>`_
+|
+"""
+
+from html.parser import HTMLParser
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import time
+
+import numpy as np
+
+# pylint: disable=relative-beyond-top-level
+from .docs_retrieval import LocalDocsIndex, get_docs_index_dir
+from .utils import EMBEDDING_MODEL_NAME, get_embedding_model
+
+
+DEFAULT_DOCS_URL = "https://docs.voxel51.com"
+DOCS_EXTENSIONS = (".rst", ".md", ".html", ".htm")
+
+MANIFEST_FILENAME = "manifest.json"
+IDS_FILENAME = "ids.json"
+
+_SKIPPED_HTML_TAGS = ("script", "style", "nav", "footer")
+_BLOCK_HTML_TAGS = (
+    "p",
+    "div",
+    "section",
+    "pre",
+    "li",
+    "tr",
+    "br",
+    "h1",
+    "h2",
+    "h3",
+    "h4",
+    "h5",
+    "h6",
+)
+_RST_ROLE_PATTERN = re.compile(r":[\w:-]+:`([^`]*)`")
+_RST_SECTION_PATTERN = re.compile(r"^([=\-~^\"'`#*+<>_])\1{2,}\s*$")
+
+logger = logging.getLogger(__name__)
+
+
+def build_docs_index(
+    docs_dir,
+    index_dir=None,
+    base_url=DEFAULT_DOCS_URL,
+    chunk_size=2000,
+    batch_size=256,
+):
+    """Builds or incrementally refreshes a local docs index from a FiftyOne
+    docs tree.
+
+    RST, Markdown, and HTML files are converted to text, split into chunks,
+    and embedded via batched ``embed_documents()`` calls. Chunks are
+    identified by a hash of their source and content, so only the chunks of
+    files that changed since the previous build are embedded again.
+
+    The index directory receives a :class:`links.docs_retrieval.LocalDocsIndex`
+    plus an ``ids.json`` map of chunk IDs and a ``manifest.json`` recording
+    the index version, the per-file checksums of the docs, and the checksums
+    of the index files.
+
+    Args:
+        docs_dir: the root of the docs tree
+        index_dir (None): the directory in which to write the index. By
+            default, :func:`links.docs_retrieval.get_docs_index_dir` is used
+        base_url (DEFAULT_DOCS_URL): the URL at which the docs are served,
+            used to generate the source of each chunk
+        chunk_size (2000): the approximate maximum number of characters per
+            chunk
+        batch_size (256): the number of chunks to embed per request
+
+    Returns:
+        a dict of statistics about the build
+    """
+    if index_dir is None:
+        index_dir = get_docs_index_dir()
+
+    prev_manifest, prev_chunks = _load_previous_index(index_dir)
+    prev_files = prev_manifest.get("files", {})
+
+    files = {}
+    chunks = []
+    for relpath in _find_docs_files(docs_dir):
+        with open(os.path.join(docs_dir, relpath), "rb") as f:
+            data = f.read()
+
+        checksum = hashlib.sha256(data).hexdigest()
+        prev_file = prev_files.get(relpath, None)
+        if (
+            prev_file is not None
+            and prev_file["sha256"] == checksum
+            and all(cid in prev_chunks for cid in prev_file["chunks"])
+        ):
+            chunk_ids = prev_file["chunks"]
+            chunks.extend((cid,) + prev_chunks[cid][:2] for cid in chunk_ids)
+        else:
+            source = _get_source_url(relpath, base_url)
+            text = data.decode("utf-8", errors="ignore")
+            text = _extract_text(text, relpath)
+            chunk_ids = []
+            for content in _chunk_text(text, chunk_size):
+                cid = _get_chunk_id(content, source)
+                chunk_ids.append(cid)
+                chunks.append((cid, content, source))
+
+        files[relpath] = {"sha256": checksum, "chunks": chunk_ids}
+
+    ## Chunks may repeat across files, so dedupe them by ID
+    unique_chunks = {}
+    for cid, content, source in chunks:
+        unique_chunks.setdefault(cid, (content, source))
+
+    ids = list(unique_chunks.keys())
+    pending = [cid for cid in ids if cid not in prev_chunks]
+
+    vectors = {cid: prev_chunks[cid][2] for cid in ids if cid in prev_chunks}
+    if pending:
+        model = get_embedding_model()
+        for i in range(0, len(pending), batch_size):
+            batch = pending[i : i + batch_size]
+            logger.info(
+                "Embedding chunks %d-%d of %d",
+                i + 1,
+                i + len(batch),
+                len(pending),
+            )
+            embeddings = model.embed_documents(
+                [unique_chunks[cid][0] for cid in batch]
+            )
+            vectors.update(zip(batch, embeddings))
+
+    version = prev_manifest.get("version", 0) + 1
+    manifest = {
+        "version": version,
+        "created_at": time.time(),
+        "embedding_model": EMBEDDING_MODEL_NAME,
+        "files": files,
+    }
+
+    _write_index(
+        index_dir,
+        [list(unique_chunks[cid]) for cid in ids],
+        np.asarray([vectors[cid] for cid in ids], dtype=np.float32),
+        ids,
+        manifest,
+    )
+
+    return {
+        "version": version,
+        "num_files": len(files),
+        "num_chunks": len(ids),
+        "num_embedded": len(pending),
+        "num_reused": len(ids) - len(pending),
+    }
+
+
+def verify_docs_index(index_dir=None):
+    """Verifies the checksums of a docs index built by
+    :func:`build_docs_index`.
+
+    Args:
+        index_dir (None): the index directory. By default,
+            :func:`links.docs_retrieval.get_docs_index_dir` is used
+
+    Returns:
+        the index's manifest
+
+    Raises:
+        ValueError: if the index is missing or corrupt
+    """
+    if index_dir is None:
+        index_dir = get_docs_index_dir()
+
+    manifest_path = os.path.join(index_dir, MANIFEST_FILENAME)
+    if not os.path.isfile(manifest_path):
+        raise ValueError(f"No docs index manifest found in '{index_dir}'")
+
+    with open(manifest_path, "r") as f:
+        manifest = json.load(f)
+
+    for filename, checksum in manifest["checksums"].items():
+        path = os.path.join(index_dir, filename)
+        if not os.path.isfile(path) or _get_file_checksum(path) != checksum:
+            raise ValueError(
+                f"Docs index file '{path}' is missing or does not match its "
+                "checksum"
+            )
+
+    return manifest
+
+
+def _load_previous_index(index_dir):
+    manifest_path = os.path.join(index_dir, MANIFEST_FILENAME)
+    ids_path = os.path.join(index_dir, IDS_FILENAME)
+    if not os.path.isfile(manifest_path) or not os.path.isfile(ids_path):
+        return {}, {}
+
+    try:
+        manifest = verify_docs_index(index_dir)
+        with open(ids_path, "r") as f:
+            ids = json.load(f)
+
+        index = LocalDocsIndex(index_dir)
+        if manifest.get("embedding_model", None) != EMBEDDING_MODEL_NAME:
+            return manifest, {}
+
+        chunks = {
+            cid: (doc[0], doc[1], np.asarray(vector, dtype=np.float32))
+            for cid, doc, vector in zip(ids, index.documents, index.embeddings)
+        }
+        return manifest, chunks
+    except Exception as e:
+        logger.warning(
+            "Ignoring previous docs index in '%s': %s", index_dir, e
+        )
+        return {}, {}
+
+
+def _write_index(index_dir, documents, embeddings, ids, manifest):
+    ## Build in a temporary directory so that a failed build does not corrupt
+    ## the existing index
+    tmp_dir = index_dir.rstrip(os.sep) + ".tmp"
+    if os.path.isdir(tmp_dir):
+        shutil.rmtree(tmp_dir)
+
+    LocalDocsIndex.build(documents, tmp_dir, embeddings=embeddings)
+
+    with open(os.path.join(tmp_dir, IDS_FILENAME), "w") as f:
+        json.dump(ids, f)
+
+    manifest["checksums"] = {
+        filename: _get_file_checksum(os.path.join(tmp_dir, filename))
+        for filename in sorted(os.listdir(tmp_dir))
+    }
+    with open(os.path.join(tmp_dir, MANIFEST_FILENAME), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    os.makedirs(index_dir, exist_ok=True)
+    for filename in os.listdir(tmp_dir):
+        os.replace(
+            os.path.join(tmp_dir, filename), os.path.join(index_dir, filename)
+        )
+
+    shutil.rmtree(tmp_dir)
+
+
+def _get_file_checksum(path):
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+
+    return sha.hexdigest()
+
+
+def _find_docs_files(docs_dir):
+    relpaths = []
+    for root, dirnames, filenames in os.walk(docs_dir):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        for filename in sorted(filenames):
+            if filename.lower().endswith(DOCS_EXTENSIONS):
+                path = os.path.join(root, filename)
+                relpaths.append(os.path.relpath(path, docs_dir))
+
+    return relpaths
+
+
+def _get_source_url(relpath, base_url):
+    path = os.path.splitext(relpath)[0].replace(os.sep, "/")
+    return f"{base_url.rstrip('/')}/{path}.html"
+
+
+def _get_chunk_id(content, source):
+    data = f"{source}\n{content}".encode("utf-8")
+    return hashlib.sha256(data).hexdigest()[:32]
+
+
+def _extract_text(text, relpath):
+    ext = os.path.splitext(relpath)[1].lower()
+    if ext in (".html", ".htm"):
+        parser = _HTMLTextParser()
+        parser.feed(text)
+        parser.close()
+        return parser.get_text()
+
+    if ext == ".rst":
+        lines = []
+        for line in text.splitlines():
+            if _RST_SECTION_PATTERN.match(line):
+                continue
+
+            lines.append(_RST_ROLE_PATTERN.sub(r"\1", line))
+
+        return "\n".join(lines)
+
+    return text
+
+
+def _chunk_text(text, chunk_size):
+    paragraphs = [p.strip() for p in re.split(r"\n\s*\n", text)]
+
+    chunks = []
+    current = ""
+    for paragraph in paragraphs:
+        if not paragraph:
+            continue
+
+        while len(paragraph) > chunk_size:
+            if current:
+                chunks.append(current)
+                current = ""
+
+            chunks.append(paragraph[:chunk_size])
+            paragraph = paragraph[chunk_size:]
+
+        if current and len(current) + len(paragraph) + 2 > chunk_size:
+            chunks.append(current)
+            current = ""
+
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+
+    if current:
+        chunks.append(current)
+
+    return chunks
+
+
+class _HTMLTextParser(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self._parts = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIPPED_HTML_TAGS:
+            self._skip_depth += 1
+        elif tag in _BLOCK_HTML_TAGS:
+            self._parts.append("\n\n")
+
+    def handle_endtag(self, tag):
+        if tag in _SKIPPED_HTML_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in _BLOCK_HTML_TAGS:
+            self._parts.append("\n\n")
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self._parts.append(data)
+
+    def get_text(self):
+        return "".join(self._parts)
@@ -6,25 +6,20 @@ FiftyOne docs query dispatcher.
 |
 """
 import os
-import requests
+import re
+import threading
 
-import numpy as np
-
-from langchain_core.prompts import (
-    FewShotPromptTemplate,
-    PromptTemplate,
-)
 from langchain_core.runnables import RunnableLambda
 
 # pylint: disable=relative-beyond-top-level
+from .caching import LRUCache
+from .concurrency import run_sync
+from .docs_retrieval import get_docs_retriever
 from .utils import (
     get_prompt_from,
     PROMPTS_DIR,
     stream_runnable,
-    gpt_4o,
-    embedding_model,
-    protect_text,
-    unprotect_text,
+    get_gpt4o,
 )
 
 
@@ -36,113 +31,233 @@ DOCS_COMPUTATION_QA_PATH = os.path.join(
 )
 DOCS_COMPUTATION_QA_PROMPT_TEMPLATE = get_prompt_from(DOCS_COMPUTATION_QA_PATH)
 
+# Retrieved documents are formatted once and reused across queries
+_formatted_documents = LRUCache(max_size=4096)
 
-def _build_docs_qa_prompt(query, docs):
-    example_template = PromptTemplate(
-        template="Content: {page_content}\nSource: {source}",
-        input_variables=["page_content", "source"],
-    )
+_SHINGLE_SIZE = 5
+_NEAR_DUPLICATE_THRESHOLD = 0.9
+
+# Chunks are only truncated if at least this many tokens of budget remain
+_MIN_TRUNCATED_TOKENS = 64
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+")
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def get_docs_token_budget():
+    budget = os.environ.get("VOXELGPT_DOCS_TOKEN_BUDGET", 4000)
+    if isinstance(budget, str):
+        try:
+            budget = int(budget)
+        except:
+            budget = 4000
+    return budget
+
+
+def _get_encoding():
+    global _encoding
+
+    if _encoding is not None:
+        return _encoding
+
+    with _encoding_lock:
+        if _encoding is None:
+            import tiktoken
+
+            try:
+                _encoding = tiktoken.encoding_for_model("gpt-4o")
+            except KeyError:
+                _encoding = tiktoken.get_encoding("cl100k_base")
+
+    return _encoding
+
+
+def _count_tokens(text):
+    return len(_get_encoding().encode(text))
 
-    examples = [
-        {
-            "page_content": protect_text(doc[0]),
-            "source": doc[1],
-        }
-        for doc in docs
-    ]
-
-    summaries = FewShotPromptTemplate(
-        examples=examples,
-        example_prompt=example_template,
-        prefix="",
-        suffix="",
-        input_variables=[],
-    ).format()
-
-    prompt = DOCS_QA_PROMPT_TEMPLATE.format(
+
+def _build_docs_qa_prompt(query, docs, trace=None):
+    return DOCS_QA_PROMPT_TEMPLATE.format(
         question=query,
-        summaries=summaries,
+        summaries=_build_summaries(docs, trace=trace),
     )
-    return unprotect_text(prompt)
+
+
+def _build_summaries(docs, trace=None):
+    # Docs are ranked best first, so greedily pack them into the budget
+    budget = get_docs_token_budget()
+
+    entries = []
+    texts = []
+    num_tokens = 0
+    num_truncated = 0
+    num_dropped = 0
+    for doc in docs:
+        entry = _get_formatted_document(doc)
+
+        # Near-duplicate chunks only cost prompt tokens, so drop them
+        if any(_is_near_duplicate(entry, e) for e in entries):
+            num_dropped += 1
+            continue
+
+        text, entry_tokens = entry[0], entry[2]
+        remaining = budget - num_tokens
+        if entry_tokens > remaining:
+            text, entry_tokens = None, 0
+            if remaining >= _MIN_TRUNCATED_TOKENS:
+                text, entry_tokens = _truncate_document(doc, remaining)
+
+            if text is None:
+                num_dropped += 1
+                continue
+
+            num_truncated += 1
+
+        # Only chunks that made it into the prompt suppress later duplicates
+        entries.append(entry)
+        texts.append(text)
+        num_tokens += entry_tokens
+
+    if trace is not None:
+        trace.increment("docs_context_tokens", num_tokens)
+        trace.increment("docs_chunks_packed", len(texts))
+        trace.increment("docs_chunks_truncated", num_truncated)
+        trace.increment("docs_chunks_dropped", num_dropped)
+
+    return "\n\n".join(texts)
+
+
+def _get_formatted_document(doc):
+    content, source = doc[0], doc[1]
+    key = (source, content)
+    entry = _formatted_documents.get(key)
+    if entry is None:
+        text = _format_document(content, source)
+        words = content.lower().split()
+        shingles = frozenset(
+            tuple(words[i : i + _SHINGLE_SIZE])
+            for i in range(max(1, len(words) - _SHINGLE_SIZE + 1))
+        )
+        entry = (text, shingles, _count_tokens(text) + 1)
+        _formatted_documents.set(key, entry)
+
+    return entry
+
+
+def _format_document(content, source):
+    return f"Content: {content}\nSource: {source}"
+
+
+def _truncate_document(doc, max_tokens):
+    content, source = doc[0], doc[1]
+
+    # The separator between chunks costs about one token
+    max_tokens -= _count_tokens(_format_document("", source)) + 1
+
+    sentences = []
+    num_tokens = 0
+    for sentence in _SENTENCE_BOUNDARY.split(content):
+        sentence_tokens = _count_tokens(sentence) + 1
+        if num_tokens + sentence_tokens > max_tokens:
+            break
+
+        sentences.append(sentence)
+        num_tokens += sentence_tokens
+
+    if not sentences:
+        return None, 0
+
+    text = _format_document(" ".join(sentences), source)
+    return text, _count_tokens(text) + 1
+
+
+def _is_near_duplicate(entry1, entry2):
+    shingles1 = entry1[1]
+    shingles2 = entry2[1]
+    if not shingles1 or not shingles2:
+        return entry1[0] == entry2[0]
+
+    intersection = len(shingles1 & shingles2)
+    union = len(shingles1) + len(shingles2) - intersection
+    return intersection / union >= _NEAR_DUPLICATE_THRESHOLD
 
 
 def _get_documents(query):
-    query_vector = embedding_model.embed_query(query)
-    query_vector = [str(np.round(qv, 8)) for qv in query_vector]
-    query_vector = ",".join(query_vector)
-    response = requests.get(
-        "http://voxelgpt.fiftyone.ai/retrieve",
-        params={"query": query_vector}
-        # "http://127.0.0.1:5000/retrieve", params={"query": query_vector}
-    )
-    response = response.json()["results"]
-    return response
+    return get_docs_retriever().retrieve(query)
 
 
 def docs_func(info):
     query = info["query"]
-    documents = _get_documents(query)
-    prompt = _build_docs_qa_prompt(query, documents)
-    response = gpt_4o.invoke(prompt)
+    documents = info.get("documents", None)
+    if documents is None:
+        documents = _get_documents(query)
+
+    prompt = _build_docs_qa_prompt(
+        query, documents, trace=info.get("trace", None)
+    )
+    response = get_gpt4o().invoke(prompt)
 
     return {"input": query, "output": response.content}
 
 
 def docs_func_streaming(info):
     query = info["query"]
-    documents = _get_documents(query)
-    prompt = _build_docs_qa_prompt(query, documents)
-    for chunk in gpt_4o.stream(prompt):
+    documents = info.get("documents", None)
+    if documents is None:
+        documents = _get_documents(query)
+
+    prompt = _build_docs_qa_prompt(
+        query, documents, trace=info.get("trace", None)
+    )
+    for chunk in get_gpt4o().stream(prompt):
         yield chunk
 
 
-def run_docs_query(query):
+def run_docs_query(query, trace=None, documents=None):
     docs_runnable = RunnableLambda(docs_func)
-    return docs_runnable.invoke({"query": query})["output"]
+    info = {"query": query, "trace": trace, "documents": documents}
+    return docs_runnable.invoke(info)["output"]
 
 
-def stream_docs_query(query):
+def stream_docs_query(query, trace=None, documents=None):
     docs_runnable_streaming = RunnableLambda(docs_func_streaming)
-    for content in stream_runnable(docs_runnable_streaming, {"query": query}):
+    info = {"query": query, "trace": trace, "documents": documents}
+    for content in stream_runnable(docs_runnable_streaming, info):
         if isinstance(content, Exception):
             raise content
         yield content.content
 
 
-def _build_docs_computation_qa_prompt(query, docs):
-    example_template = PromptTemplate(
-        template="Content: {page_content}\nSource: {source}",
-        input_variables=["page_content", "source"],
-    )
+async def astream_docs_query(query, trace=None, documents=None):
+    if documents is None:
+        documents = await run_sync(_get_documents, query)
+
+    if trace is not None:
+        trace.mark("docs_retrieved")
+
+    prompt = _build_docs_qa_prompt(query, documents, trace=trace)
+    async for content in get_gpt4o().astream(prompt):
+        if trace is not None:
+            trace.mark("docs_first_token")
+
+        yield content.content
+
 
-    examples = [
-        {
-            "page_content": protect_text(doc[0]),
-            "source": doc[1],
-        }
-        for doc in docs
-    ]
-
-    summaries = FewShotPromptTemplate(
-        examples=examples,
-        example_prompt=example_template,
-        prefix="",
-        suffix="",
-        input_variables=[],
-    ).format()
-
-    prompt = DOCS_COMPUTATION_QA_PROMPT_TEMPLATE.format(
+def _build_docs_computation_qa_prompt(query, docs, trace=None):
+    return DOCS_COMPUTATION_QA_PROMPT_TEMPLATE.format(
         question=query,
-        summaries=summaries,
+        summaries=_build_summaries(docs, trace=trace),
     )
-    return unprotect_text(prompt)
 
 
 def docs_computation_func(info):
     query = info["query"]
     documents = _get_documents(query)
-    prompt = _build_docs_computation_qa_prompt(query, documents)
-    response = gpt_4o.invoke(prompt)
+    prompt = _build_docs_computation_qa_prompt(
+        query, documents, trace=info.get("trace", None)
+    )
+    response = get_gpt4o().invoke(prompt)
 
     return {"input": query, "output": response.content}
 
@@ -150,19 +265,30 @@ def docs_computation_func(info):
 def docs_computation_func_streaming(info):
     query = info["query"]
     documents = _get_documents(query)
-    prompt = _build_docs_computation_qa_prompt(query, documents)
-    for chunk in gpt_4o.stream(prompt):
+    prompt = _build_docs_computation_qa_prompt(
+        query, documents, trace=info.get("trace", None)
+    )
+    for chunk in get_gpt4o().stream(prompt):
         yield chunk
 
 
-def run_docs_computation_query(query):
+def run_docs_computation_query(query, trace=None):
     docs_runnable = RunnableLambda(docs_computation_func)
-    return docs_runnable.invoke({"query": query})["output"]
+    return docs_runnable.invoke({"query": query, "trace": trace})["output"]
 
 
-def stream_docs_computation_query(query):
+def stream_docs_computation_query(query, trace=None):
     docs_runnable_streaming = RunnableLambda(docs_computation_func_streaming)
-    for content in stream_runnable(docs_runnable_streaming, {"query": query}):
+    for content in stream_runnable(
+        docs_runnable_streaming, {"query": query, "trace": trace}
+    ):
         if isinstance(content, Exception):
             raise content
         yield content.content
+
+
+async def astream_docs_computation_query(query, trace=None):
+    documents = await run_sync(_get_documents, query)
+    prompt = _build_docs_computation_qa_prompt(query, documents, trace=trace)
+    async for content in get_gpt4o().astream(prompt):
+        yield content.content
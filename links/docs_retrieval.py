@@ -0,0 +1,653 @@
+"""
+FiftyOne docs retrieval.
+
+| Copyright 2017-2024, Voxel51, Inc.
+| `voxel51.com <https://voxel51.com/>`_
+|
+"""
+
+from collections import Counter
+import gzip
+import json
+import logging
+import math
+import os
+import re
+import threading
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# pylint: disable=relative-beyond-top-level
+from .utils import ROOT_DIR, embed_query, get_embedding_model
+
+
+REMOTE_RETRIEVAL_URL = "http://voxelgpt.fiftyone.ai/retrieve"
+
+VECTOR_ENCODINGS = ("float16", "int8", "legacy")
+
+EMBEDDINGS_FILENAME = "embeddings.npy"
+METADATA_FILENAME = "metadata.json"
+BM25_VOCAB_FILENAME = "bm25_vocab.json"
+BM25_OFFSETS_FILENAME = "bm25_offsets.npy"
+BM25_POSTINGS_FILENAME = "bm25_postings.npy"
+BM25_WEIGHTS_FILENAME = "bm25_weights.npy"
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9_]+")
+
+_retriever = None
+_retriever_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+
+def get_docs_index_dir():
+    index_dir = os.environ.get("VOXELGPT_DOCS_INDEX_DIR", None)
+    if not index_dir:
+        index_dir = os.path.join(ROOT_DIR, "docs_index")
+    return index_dir
+
+
+def get_docs_top_k():
+    top_k = os.environ.get("VOXELGPT_DOCS_TOP_K", 10)
+    if isinstance(top_k, str):
+        try:
+            top_k = int(top_k)
+        except:
+            top_k = 10
+    return max(1, top_k)
+
+
+def get_docs_vector_encoding():
+    encoding = os.environ.get("VOXELGPT_DOCS_VECTOR_ENCODING", "float16")
+    encoding = encoding.lower()
+    if encoding not in VECTOR_ENCODINGS:
+        encoding = "float16"
+    return encoding
+
+
+def get_docs_timeout():
+    timeout = os.environ.get("VOXELGPT_DOCS_TIMEOUT", 10)
+    if isinstance(timeout, str):
+        try:
+            timeout = float(timeout)
+        except:
+            timeout = 10
+    return timeout
+
+
+def docs_hybrid_search_enabled():
+    flag = os.environ.get("VOXELGPT_DOCS_HYBRID_SEARCH", True)
+    if isinstance(flag, str):
+        return flag.lower() not in ("false", "0", "no", "off")
+    return flag
+
+
+def get_docs_retriever():
+    """Returns the (lazily constructed) docs retriever.
+
+    The retriever can be configured via the ``VOXELGPT_DOCS_RETRIEVER``
+    environment variable. Supported values are:
+
+    -   ``"auto"`` (default): use the local index if one exists, else the
+        remote service
+    -   ``"local"``: use the local index in ``VOXELGPT_DOCS_INDEX_DIR``
+    -   ``"remote"``: use the remote retrieval service
+
+    Returns:
+        a :class:`DocsRetriever`
+    """
+    global _retriever
+
+    if _retriever is not None:
+        return _retriever
+
+    with _retriever_lock:
+        if _retriever is None:
+            _retriever = _make_docs_retriever()
+
+    return _retriever
+
+
+def _make_docs_retriever():
+    backend = os.environ.get("VOXELGPT_DOCS_RETRIEVER", "auto").lower()
+    index_dir = get_docs_index_dir()
+
+    if backend == "auto":
+        if LocalDocsIndex.exists(index_dir):
+            backend = "local"
+        else:
+            backend = "remote"
+
+    if backend == "local":
+        return LocalDocsRetriever(LocalDocsIndex(index_dir))
+
+    if backend == "remote":
+        return RemoteDocsRetriever()
+
+    raise ValueError(
+        f"Unsupported docs retriever '{backend}'. Supported values are "
+        "('auto', 'local', 'remote')"
+    )
+
+
+class DocsRetriever(object):
+    """Base class for retrievers that return the docs relevant to a query."""
+
+    def retrieve(self, query):
+        """Returns the docs relevant to the given query.
+
+        Args:
+            query: a query string
+
+        Returns:
+            a list of ``[content, source]`` lists
+        """
+        raise NotImplementedError("subclass must implement retrieve()")
+
+
+def encode_query_vector(query_vector, encoding="float16"):
+    """Encodes a query vector as a compact gzipped binary payload.
+
+    Args:
+        query_vector: a query embedding
+        encoding ("float16"): the encoding to use. Supported values are
+            ``("float16", "int8")``
+
+    Returns:
+        a ``(body, headers)`` tuple
+    """
+    query_vector = np.asarray(query_vector, dtype=np.float32)
+    headers = {
+        "Content-Type": "application/octet-stream",
+        "Content-Encoding": "gzip",
+        "X-Vector-Dtype": encoding,
+        "X-Vector-Dim": str(len(query_vector)),
+    }
+
+    if encoding == "float16":
+        data = query_vector.astype("<f2").tobytes()
+    elif encoding == "int8":
+        scale = float(np.abs(query_vector).max()) / 127.0 or 1.0
+        data = np.round(query_vector / scale).astype(np.int8).tobytes()
+        headers["X-Vector-Scale"] = repr(scale)
+    else:
+        raise ValueError(
+            f"Unsupported vector encoding '{encoding}'. Supported values are "
+            "('float16', 'int8')"
+        )
+
+    return gzip.compress(data), headers
+
+
+def decode_query_vector(body, headers):
+    """Decodes a payload created by :func:`encode_query_vector`.
+
+    Args:
+        body: the payload bytes
+        headers: the payload headers
+
+    Returns:
+        a float32 numpy array
+    """
+    data = body
+    if headers.get("Content-Encoding", None) == "gzip":
+        data = gzip.decompress(data)
+
+    encoding = headers["X-Vector-Dtype"]
+    if encoding == "float16":
+        return np.frombuffer(data, dtype="<f2").astype(np.float32)
+
+    if encoding == "int8":
+        scale = float(headers["X-Vector-Scale"])
+        return np.frombuffer(data, dtype=np.int8).astype(np.float32) * scale
+
+    raise ValueError(f"Unsupported vector encoding '{encoding}'")
+
+
+class RemoteDocsRetriever(DocsRetriever):
+    """Retriever that queries the remote VoxelGPT retrieval service.
+
+    Query vectors are POSTed as gzipped binary payloads over a pooled
+    keep-alive session. If the service does not accept binary payloads, the
+    retriever falls back to the legacy format, which sends the vector as
+    comma-separated text in the query string, for the rest of the process.
+
+    Args:
+        url (REMOTE_RETRIEVAL_URL): the URL of the service
+        encoding (None): the vector encoding to use. Supported values are
+            ``("float16", "int8", "legacy")``. By default,
+            :func:`get_docs_vector_encoding` is used
+        timeout (None): the request timeout, in seconds. By default,
+            :func:`get_docs_timeout` is used
+        max_retries (3): the number of times to retry failed connections and
+            server errors
+    """
+
+    _UNSUPPORTED_STATUS_CODES = (400, 404, 405, 411, 413, 415, 501)
+
+    def __init__(
+        self,
+        url=REMOTE_RETRIEVAL_URL,
+        encoding=None,
+        timeout=None,
+        max_retries=3,
+    ):
+        if encoding is None:
+            encoding = get_docs_vector_encoding()
+
+        if timeout is None:
+            timeout = get_docs_timeout()
+
+        self.url = url
+        self.encoding = encoding
+        self.timeout = timeout
+        self.session = _make_session(max_retries)
+
+    def retrieve(self, query):
+        query_vector = embed_query(query)
+
+        if self.encoding != "legacy":
+            results = self._retrieve_binary(query_vector)
+            if results is not None:
+                return results
+
+        return self._retrieve_legacy(query_vector)
+
+    def _retrieve_binary(self, query_vector):
+        body, headers = encode_query_vector(
+            query_vector, encoding=self.encoding
+        )
+        response = self.session.post(
+            self.url, data=body, headers=headers, timeout=self.timeout
+        )
+
+        if response.status_code not in self._UNSUPPORTED_STATUS_CODES:
+            response.raise_for_status()
+            try:
+                return response.json()["results"]
+            except (ValueError, KeyError):
+                pass
+
+        logger.info(
+            "Retrieval service does not support binary vectors (HTTP %d); "
+            "using the legacy format",
+            response.status_code,
+        )
+        self.encoding = "legacy"
+        return None
+
+    def _retrieve_legacy(self, query_vector):
+        query_vector = [str(np.round(qv, 8)) for qv in query_vector]
+        query_vector = ",".join(query_vector)
+        response = self.session.get(
+            self.url, params={"query": query_vector}, timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response.json()["results"]
+
+
+def _make_session(max_retries):
+    retry = Retry(
+        total=max_retries,
+        backoff_factor=0.3,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=("GET", "POST"),
+    )
+    adapter = HTTPAdapter(max_retries=retry, pool_maxsize=16)
+
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class LocalDocsRetriever(DocsRetriever):
+    """Retriever that searches a :class:`LocalDocsIndex`.
+
+    If the index has a BM25 index, lexical and vector rankings are fused via
+    :meth:`LocalDocsIndex.hybrid_search`.
+
+    Args:
+        index: a :class:`LocalDocsIndex`
+        k (None): the number of docs to return. By default,
+            :func:`get_docs_top_k` is used
+        hybrid (None): whether to use hybrid search when possible. By
+            default, :func:`docs_hybrid_search_enabled` is used
+    """
+
+    def __init__(self, index, k=None, hybrid=None):
+        if hybrid is None:
+            hybrid = docs_hybrid_search_enabled()
+
+        self.index = index
+        self.k = k
+        self.hybrid = hybrid
+
+    def retrieve(self, query):
+        k = self.k if self.k is not None else get_docs_top_k()
+        query_vector = embed_query(query)
+
+        if self.hybrid and self.index.bm25 is not None:
+            return self.index.hybrid_search(query, query_vector, k=k)
+
+        return self.index.search(query_vector, k=k)
+
+
+class LocalDocsIndex(object):
+    """In-process nearest neighbor index over a docs corpus.
+
+    The index is stored in a directory containing a matrix of unit-normalized
+    document embeddings in ``embeddings.npy``, which is memory-mapped, and a
+    ``metadata.json`` sidecar listing the ``[content, source]`` of each row.
+    The directory may also contain a :class:`BM25Index`.
+
+    Use :meth:`build` to create an index.
+
+    Args:
+        index_dir: the index directory
+    """
+
+    def __init__(self, index_dir):
+        self.index_dir = index_dir
+
+        self.embeddings = np.load(
+            os.path.join(index_dir, EMBEDDINGS_FILENAME), mmap_mode="r"
+        )
+        with open(os.path.join(index_dir, METADATA_FILENAME), "r") as f:
+            self.documents = json.load(f)
+
+        if len(self.documents) != len(self.embeddings):
+            raise ValueError(
+                f"Index '{index_dir}' has {len(self.embeddings)} embeddings "
+                f"but {len(self.documents)} documents"
+            )
+
+        if BM25Index.exists(index_dir):
+            self.bm25 = BM25Index(index_dir)
+        else:
+            self.bm25 = None
+
+    def __len__(self):
+        return len(self.documents)
+
+    @staticmethod
+    def exists(index_dir):
+        """Determines whether an index exists in the given directory."""
+        return os.path.isfile(
+            os.path.join(index_dir, EMBEDDINGS_FILENAME)
+        ) and os.path.isfile(os.path.join(index_dir, METADATA_FILENAME))
+
+    @classmethod
+    def build(
+        cls,
+        documents,
+        index_dir,
+        embeddings=None,
+        dtype="float16",
+        batch_size=256,
+        bm25=True,
+    ):
+        """Builds an index over the given documents.
+
+        Args:
+            documents: a list of ``(content, source)`` tuples
+            index_dir: the directory in which to write the index
+            embeddings (None): an optional ``num_docs x dim`` array of
+                document embeddings. By default, the contents are embedded
+                with the embedding model
+            dtype ("float16"): the dtype in which to store the embeddings
+            batch_size (256): the number of documents to embed per request
+            bm25 (True): whether to also build a :class:`BM25Index`
+
+        Returns:
+            a :class:`LocalDocsIndex`
+        """
+        documents = [[content, source] for content, source in documents]
+
+        if embeddings is None:
+            model = get_embedding_model()
+            embeddings = []
+            for i in range(0, len(documents), batch_size):
+                batch = documents[i : i + batch_size]
+                embeddings.extend(
+                    model.embed_documents([doc[0] for doc in batch])
+                )
+
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings = embeddings / np.maximum(norms, 1e-12)
+
+        os.makedirs(index_dir, exist_ok=True)
+        np.save(
+            os.path.join(index_dir, EMBEDDINGS_FILENAME),
+            embeddings.astype(dtype),
+        )
+        with open(os.path.join(index_dir, METADATA_FILENAME), "w") as f:
+            json.dump(documents, f)
+
+        if bm25:
+            BM25Index.build([doc[0] for doc in documents], index_dir)
+
+        return cls(index_dir)
+
+    def search(self, query_vector, k=10):
+        """Returns the ``k`` documents most similar to the given vector.
+
+        Args:
+            query_vector: a query embedding
+            k (10): the number of documents to return
+
+        Returns:
+            a list of ``[content, source]`` lists, most similar first
+        """
+        inds = self._vector_search(query_vector, k)
+        return [list(self.documents[i]) for i in inds]
+
+    def hybrid_search(
+        self, query, query_vector, k=10, num_candidates=50, rrf_k=60
+    ):
+        """Returns the ``k`` best documents for the given query, fusing the
+        BM25 and vector rankings via reciprocal rank fusion.
+
+        Args:
+            query: a query string
+            query_vector: a query embedding
+            k (10): the number of documents to return
+            num_candidates (50): the number of candidates to take from each
+                ranking
+            rrf_k (60): the reciprocal rank fusion constant
+
+        Returns:
+            a list of ``[content, source]`` lists, best first
+        """
+        if self.bm25 is None:
+            return self.search(query_vector, k=k)
+
+        num_candidates = max(k, num_candidates)
+        rankings = (
+            self._vector_search(query_vector, num_candidates),
+            self.bm25.search(query, num_candidates),
+        )
+
+        scores = {}
+        for ranking in rankings:
+            for rank, idx in enumerate(ranking):
+                idx = int(idx)
+                scores[idx] = scores.get(idx, 0.0) + 1.0 / (rrf_k + rank + 1)
+
+        inds = sorted(scores, key=lambda idx: -scores[idx])[:k]
+        return [list(self.documents[i]) for i in inds]
+
+    def _vector_search(self, query_vector, k):
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        query_vector = query_vector / max(np.linalg.norm(query_vector), 1e-12)
+
+        scores = np.asarray(self.embeddings @ query_vector, dtype=np.float32)
+        return _top_k(scores, k)
+
+
+class BM25Index(object):
+    """Inverted BM25 index over a docs corpus.
+
+    The BM25 weight of each (term, document) pair is precomputed at build
+    time and stored as flat, memory-mapped posting arrays, so a search only
+    sums the postings of the query's terms.
+
+    Use :meth:`build` to create an index.
+
+    Args:
+        index_dir: the index directory
+    """
+
+    def __init__(self, index_dir):
+        self.index_dir = index_dir
+
+        with open(os.path.join(index_dir, BM25_VOCAB_FILENAME), "r") as f:
+            data = json.load(f)
+
+        self.num_docs = data["num_docs"]
+        self.vocab = data["vocab"]
+        self.offsets = np.load(
+            os.path.join(index_dir, BM25_OFFSETS_FILENAME), mmap_mode="r"
+        )
+        self.postings = np.load(
+            os.path.join(index_dir, BM25_POSTINGS_FILENAME), mmap_mode="r"
+        )
+        self.weights = np.load(
+            os.path.join(index_dir, BM25_WEIGHTS_FILENAME), mmap_mode="r"
+        )
+
+    @staticmethod
+    def exists(index_dir):
+        """Determines whether a BM25 index exists in the given directory."""
+        return all(
+            os.path.isfile(os.path.join(index_dir, filename))
+            for filename in (
+                BM25_VOCAB_FILENAME,
+                BM25_OFFSETS_FILENAME,
+                BM25_POSTINGS_FILENAME,
+                BM25_WEIGHTS_FILENAME,
+            )
+        )
+
+    @classmethod
+    def build(cls, texts, index_dir, k1=1.5, b=0.75):
+        """Builds a BM25 index over the given texts.
+
+        Args:
+            texts: a list of document texts
+            index_dir: the directory in which to write the index
+            k1 (1.5): the BM25 term frequency saturation parameter
+            b (0.75): the BM25 length normalization parameter
+
+        Returns:
+            a :class:`BM25Index`
+        """
+        num_docs = len(texts)
+        term_docs = {}
+        lengths = []
+        for idx, text in enumerate(texts):
+            tokens = tokenize(text)
+            lengths.append(len(tokens))
+            for token, tf in Counter(tokens).items():
+                term_docs.setdefault(token, []).append((idx, tf))
+
+        avg_length = max(sum(lengths) / max(num_docs, 1), 1.0)
+
+        vocab = {}
+        offsets = [0]
+        postings = []
+        weights = []
+        for term in sorted(term_docs):
+            docs = term_docs[term]
+            df = len(docs)
+            idf = math.log(1.0 + (num_docs - df + 0.5) / (df + 0.5))
+            for idx, tf in docs:
+                norm = k1 * (1.0 - b + b * lengths[idx] / avg_length)
+                postings.append(idx)
+                weights.append(idf * tf * (k1 + 1.0) / (tf + norm))
+
+            vocab[term] = len(offsets) - 1
+            offsets.append(len(postings))
+
+        os.makedirs(index_dir, exist_ok=True)
+        with open(os.path.join(index_dir, BM25_VOCAB_FILENAME), "w") as f:
+            json.dump({"num_docs": num_docs, "vocab": vocab}, f)
+
+        np.save(
+            os.path.join(index_dir, BM25_OFFSETS_FILENAME),
+            np.asarray(offsets, dtype=np.int64),
+        )
+        np.save(
+            os.path.join(index_dir, BM25_POSTINGS_FILENAME),
+            np.asarray(postings, dtype=np.int32),
+        )
+        np.save(
+            os.path.join(index_dir, BM25_WEIGHTS_FILENAME),
+            np.asarray(weights, dtype=np.float32),
+        )
+
+        return cls(index_dir)
+
+    def search(self, query, k=10):
+        """Returns the indices of the ``k`` documents with the highest BM25
+        scores for the given query.
+
+        Documents that share no terms with the query are never returned.
+
+        Args:
+            query: a query string
+            k (10): the maximum number of documents to return
+
+        Returns:
+            an array of document indices, best first
+        """
+        scores = np.zeros(self.num_docs, dtype=np.float32)
+        for token in set(tokenize(query)):
+            term_id = self.vocab.get(token, None)
+            if term_id is None:
+                continue
+
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            scores[self.postings[start:end]] += self.weights[start:end]
+
+        k = min(k, int(np.count_nonzero(scores)))
+        return _top_k(scores, k)
+
+
+def tokenize(text):
+    """Tokenizes text for lexical search.
+
+    Identifiers like ``filter_labels`` are kept as a single token, and their
+    parts are also emitted so that they match queries like "filter labels".
+
+    Args:
+        text: a string
+
+    Returns:
+        a list of tokens
+    """
+    tokens = []
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(token)
+        if "_" in token:
+            tokens.extend(part for part in token.split("_") if part)
+
+    return tokens
+
+
+def _top_k(scores, k):
+    num_scores = len(scores)
+    k = min(k, num_scores)
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+
+    if k < num_scores:
+        inds = np.argpartition(-scores, k - 1)[:k]
+    else:
+        inds = np.arange(num_scores)
+
+    return inds[np.argsort(-scores[inds], kind="stable")]
@@ -14,7 +14,7 @@ from fiftyone import ViewField as F
 from .utils import (
     PROMPTS_DIR,
     _build_custom_chain,
-    gpt_4o,
+    get_gpt4o,
 )
 
 EFFECTIVE_QUERY_PATH = os.path.join(
@@ -22,8 +22,17 @@ EFFECTIVE_QUERY_PATH = os.path.join(
 )
 
 
-def generate_effective_query(chat_history):
+def _build_effective_query_chain():
+    return _build_custom_chain(get_gpt4o(), template_path=EFFECTIVE_QUERY_PATH)
+
 
-    chain = _build_custom_chain(gpt_4o, template_path=EFFECTIVE_QUERY_PATH)
+def generate_effective_query(chat_history):
+    chain = _build_effective_query_chain()
     response = chain.invoke({"chat_history": chat_history})
     return response
+
+
+async def agenerate_effective_query(chat_history):
+    chain = _build_effective_query_chain()
+    response = await chain.ainvoke({"chat_history": chat_history})
+    return response
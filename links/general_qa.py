@@ -10,21 +10,29 @@ import os
 from langchain_core.runnables import RunnableLambda
 
 # pylint: disable=relative-beyond-top-level
-from .utils import PROMPTS_DIR, _build_chat_chain, gpt_4o, stream_runnable
+from .utils import (
+    PROMPTS_DIR,
+    _build_chat_chain,
+    get_gpt4o,
+    stream_runnable,
+)
 
 CV_QA_PATH = os.path.join(PROMPTS_DIR, "computer_vision_response.txt")
-cv_chain = _build_chat_chain(gpt_4o, template_path=CV_QA_PATH)
+
+
+def _get_cv_chain():
+    return _build_chat_chain(get_gpt4o(), template_path=CV_QA_PATH)
 
 
 def cv_func(info):
     query = info["query"]
-    response = cv_chain.invoke({"messages": [("user", query)]}).content
+    response = _get_cv_chain().invoke({"messages": [("user", query)]}).content
     return {"input": query, "output": response}
 
 
 def cv_func_streaming(info):
     query = info["query"]
-    for chunk in cv_chain.stream({"messages": [("user", query)]}):
+    for chunk in _get_cv_chain().stream({"messages": [("user", query)]}):
         yield chunk
 
 
@@ -36,6 +44,13 @@ def stream_computer_vision_query(query):
         yield content.content
 
 
+async def astream_computer_vision_query(query):
+    async for content in _get_cv_chain().astream(
+        {"messages": [("user", query)]}
+    ):
+        yield content.content
+
+
 def run_computer_vision_query(query):
     cv_runnable = RunnableLambda(cv_func)
     return cv_runnable.invoke({"query": query})["output"]
@@ -0,0 +1,544 @@
+"""
+Geocoding for geo view stages.
+
+| Copyright 2017-2024, Voxel51, Inc.
+| `voxel51.com <https://voxel51.com/>`_
+|
+"""
+
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# pylint: disable=relative-beyond-top-level
+from .caching import (
+    LRUCache,
+    SQLiteCache,
+    TieredCache,
+    make_cache_key,
+    normalize_text,
+)
+from .utils import get_cache_dir
+
+
+NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
+USER_AGENT = "VoxelGPT (https://github.com/voxel51/voxelgpt)"
+
+_COORDINATE_PRECISION = 6
+
+_geocoder = None
+_geocoder_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+
+def geocoding_offline():
+    flag = os.environ.get("VOXELGPT_GEOCODING_OFFLINE", False)
+    if isinstance(flag, str):
+        return flag.lower() in ("true", "1", "yes", "on")
+    return flag
+
+
+def get_geocoding_timeout():
+    timeout = os.environ.get("VOXELGPT_GEOCODING_TIMEOUT", 10)
+    if isinstance(timeout, str):
+        try:
+            timeout = float(timeout)
+        except:
+            timeout = 10
+    return timeout
+
+
+def get_geocoding_negative_ttl():
+    ttl = os.environ.get("VOXELGPT_GEOCODING_NEGATIVE_TTL", 3600)
+    if isinstance(ttl, str):
+        try:
+            ttl = float(ttl)
+        except:
+            ttl = 3600
+    return ttl
+
+
+def get_geocoding_tolerance():
+    tolerance = os.environ.get("VOXELGPT_GEOCODING_TOLERANCE", 0.0001)
+    if isinstance(tolerance, str):
+        try:
+            tolerance = float(tolerance)
+        except:
+            tolerance = 0.0001
+    return tolerance
+
+
+def get_geocoding_max_vertices():
+    max_vertices = os.environ.get("VOXELGPT_GEOCODING_MAX_VERTICES", 1000)
+    if isinstance(max_vertices, str):
+        try:
+            max_vertices = int(max_vertices)
+        except:
+            max_vertices = 1000
+    return max_vertices
+
+
+def boundary_simplification_enabled():
+    flag = os.environ.get("VOXELGPT_SIMPLIFY_BOUNDARIES", True)
+    if isinstance(flag, str):
+        return flag.lower() in ("true", "1", "yes", "on")
+    return flag
+
+
+def get_geocoder():
+    """Returns the (lazily constructed) geocoder.
+
+    The geocoder is configured via the following environment variables:
+
+    -   ``VOXELGPT_GAZETTEER_PATH``: an optional gazetteer JSON file to
+        consult before the geocoding service
+    -   ``VOXELGPT_GEOCODING_OFFLINE``: whether to never query the geocoding
+        service (False)
+    -   ``VOXELGPT_GEOCODING_TIMEOUT``: the request timeout, in seconds (10)
+    -   ``VOXELGPT_GEOCODING_NEGATIVE_TTL``: the number of seconds for which
+        places that could not be found are cached (3600)
+    -   ``VOXELGPT_GEOCODING_TOLERANCE``: the tolerance, in degrees, with
+        which to simplify boundaries (0.0001)
+
+    Returns:
+        a :class:`Geocoder`
+    """
+    global _geocoder
+
+    if _geocoder is not None:
+        return _geocoder
+
+    with _geocoder_lock:
+        if _geocoder is None:
+            gazetteer = None
+            gazetteer_path = os.environ.get("VOXELGPT_GAZETTEER_PATH", None)
+            if gazetteer_path:
+                gazetteer = Gazetteer.from_json(gazetteer_path)
+
+            cache = TieredCache(
+                memory=LRUCache(max_size=256),
+                disk=SQLiteCache(
+                    os.path.join(get_cache_dir(), "geocoding.db"),
+                    max_size=10000,
+                ),
+            )
+
+            _geocoder = Geocoder(
+                gazetteer=gazetteer,
+                cache=cache,
+                offline=geocoding_offline(),
+                timeout=get_geocoding_timeout(),
+                negative_ttl=get_geocoding_negative_ttl(),
+                tolerance=get_geocoding_tolerance(),
+            )
+
+    return _geocoder
+
+
+def geocode_point(location_name):
+    """Geocodes the given place to a point.
+
+    Args:
+        location_name: a place name
+
+    Returns:
+        a ``(latitude, longitude)`` tuple, or ``(None, None)`` if the place
+        could not be found
+    """
+    return get_geocoder().geocode_point(location_name)
+
+
+def geocode_boundary(location_name):
+    """Geocodes the given place to a boundary.
+
+    Args:
+        location_name: a place name
+
+    Places that consist of several polygons, such as countries with
+    islands, are returned as ``MultiPolygon`` coordinates.
+
+    Returns:
+        the GeoJSON ``Polygon`` or ``MultiPolygon`` coordinates of the
+        boundary, or None if the place could not be found. See
+        :func:`boundary_to_geojson`
+    """
+    return get_geocoder().geocode_boundary(location_name)
+
+
+def is_multipolygon(boundary):
+    """Returns whether the given boundary contains ``MultiPolygon``
+    coordinates rather than ``Polygon`` coordinates.
+
+    Args:
+        boundary: the GeoJSON ``Polygon`` or ``MultiPolygon`` coordinates of
+            a boundary
+
+    Returns:
+        True/False
+    """
+    return bool(boundary) and isinstance(boundary[0][0][0], (list, tuple))
+
+
+def boundary_to_geojson(boundary):
+    """Converts the given boundary to a GeoJSON geometry.
+
+    Args:
+        boundary: the GeoJSON ``Polygon`` or ``MultiPolygon`` coordinates of
+            a boundary
+
+    Returns:
+        a GeoJSON dict of type ``Polygon`` or ``MultiPolygon``
+    """
+    if is_multipolygon(boundary):
+        return {"type": "MultiPolygon", "coordinates": boundary}
+
+    return {"type": "Polygon", "coordinates": boundary}
+
+
+class Gazetteer(object):
+    """Local lookup table of places.
+
+    Gazetteer files are JSON files of the following form::
+
+        {
+            "Eiffel Tower, Paris, France": {
+                "point": [48.8584, 2.2945]
+            },
+            "Paris, France": {
+                "point": [48.8566, 2.3522],
+                "boundary": [[[2.224, 48.815], [2.469, 48.815], ...]]
+            }
+        }
+
+    where points are ``[latitude, longitude]`` and boundaries are GeoJSON
+    ``Polygon`` or ``MultiPolygon`` coordinates, whose rings are lists of
+    ``[longitude, latitude]`` coordinates. Place names are matched
+    case-insensitively.
+
+    Args:
+        places: a dict mapping place names to entries
+    """
+
+    def __init__(self, places):
+        self.places = {_normalize_name(k): v for k, v in places.items()}
+
+    def __len__(self):
+        return len(self.places)
+
+    @classmethod
+    def from_json(cls, path):
+        """Loads a gazetteer from a JSON file.
+
+        Args:
+            path: the path to the file
+
+        Returns:
+            a :class:`Gazetteer`
+        """
+        with open(path, "r") as f:
+            return cls(json.load(f))
+
+    def get(self, location_name, kind):
+        """Returns the ``kind`` (``"point"`` or ``"boundary"``) of the given
+        place, or None if it is not in the gazetteer.
+        """
+        entry = self.places.get(_normalize_name(location_name), None)
+        if entry is None:
+            return None
+
+        return entry.get(kind, None)
+
+
+class Geocoder(object):
+    """Geocoder that consults a local gazetteer, then a persistent cache, and
+    finally the Nominatim geocoding service.
+
+    Results from the service are cached. Places that the service could not
+    find are cached for ``negative_ttl`` seconds, and requests that fail are
+    not cached. Boundaries are simplified and rounded before being cached.
+
+    Args:
+        gazetteer (None): an optional :class:`Gazetteer`
+        cache (None): an optional :class:`links.caching.TieredCache`
+        offline (False): whether to never query the geocoding service
+        timeout (10): the request timeout, in seconds
+        negative_ttl (3600): the number of seconds for which places that could
+            not be found are cached
+        tolerance (0.0001): the tolerance, in degrees, with which to simplify
+            boundaries
+        url (NOMINATIM_URL): the URL of the geocoding service
+    """
+
+    def __init__(
+        self,
+        gazetteer=None,
+        cache=None,
+        offline=False,
+        timeout=10,
+        negative_ttl=3600,
+        tolerance=0.0001,
+        url=NOMINATIM_URL,
+    ):
+        self.gazetteer = gazetteer
+        self.cache = cache
+        self.offline = offline
+        self.timeout = timeout
+        self.negative_ttl = negative_ttl
+        self.tolerance = tolerance
+        self.url = url
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    def geocode_point(self, location_name):
+        point = self._geocode(location_name, "point")
+        if point is None:
+            return None, None
+
+        return float(point[0]), float(point[1])
+
+    def geocode_boundary(self, location_name):
+        return self._geocode(location_name, "boundary")
+
+    def _geocode(self, location_name, kind):
+        if self.gazetteer is not None:
+            value = self.gazetteer.get(location_name, kind)
+            if value is not None:
+                return value
+
+        key = None
+        if self.cache is not None:
+            key = make_cache_key(kind, _normalize_name(location_name))
+            entry = self.cache.get(key)
+            if entry is not None and not _is_expired(entry):
+                return entry["value"]
+
+        if self.offline:
+            return None
+
+        if kind == "point":
+            value = self._query_point(location_name)
+        else:
+            value = self._query_boundary(location_name)
+
+        if key is not None:
+            entry = {"value": value}
+            if value is None:
+                ## The place may have been missing due to a transient issue
+                entry["expires_at"] = time.time() + self.negative_ttl
+
+            self.cache.set(key, entry)
+
+        return value
+
+    def _query_point(self, location_name):
+        data = self._query(location_name, {"addressdetails": 1, "limit": 1})
+        if not data:
+            return None
+
+        place = data[0]
+        return [float(place["lat"]), float(place["lon"])]
+
+    def _query_boundary(self, location_name):
+        data = self._query(
+            location_name,
+            {
+                "polygon_geojson": 1,
+                "polygon_threshold": self.tolerance,
+                "limit": 1,
+            },
+        )
+        if not data:
+            return None
+
+        geojson = data[0].get("geojson", None)
+        if not geojson:
+            return None
+
+        if geojson["type"] not in ("Polygon", "MultiPolygon"):
+            return None
+
+        return _map_rings(
+            lambda ring: simplify_ring(
+                ring, self.tolerance, precision=_COORDINATE_PRECISION
+            ),
+            geojson["coordinates"],
+        )
+
+    def _query(self, location_name, params):
+        params = dict(params, q=location_name, format="json")
+        response = self._get_session().get(
+            self.url,
+            params=params,
+            headers={"User-Agent": USER_AGENT},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def _get_session(self):
+        if self._session is not None:
+            return self._session
+
+        with self._session_lock:
+            if self._session is None:
+                retry = Retry(
+                    total=3,
+                    backoff_factor=0.5,
+                    status_forcelist=(429, 502, 503, 504),
+                    allowed_methods=("GET",),
+                )
+                session = requests.Session()
+                session.mount("https://", HTTPAdapter(max_retries=retry))
+                self._session = session
+
+        return self._session
+
+
+def simplify_boundary(boundary, tolerance=None, max_vertices=None):
+    """Simplifies the rings of a boundary.
+
+    The vertex budget is split across all rings of all polygons in proportion
+    to their number of vertices.
+
+    Args:
+        boundary: the GeoJSON ``Polygon`` or ``MultiPolygon`` coordinates of
+            a boundary
+        tolerance (None): the tolerance, in degrees, with which to simplify
+            the rings. By default, :func:`get_geocoding_tolerance` is used
+        max_vertices (None): the maximum total number of vertices. By
+            default, :func:`get_geocoding_max_vertices` is used
+
+    Returns:
+        the simplified coordinates, of the same type as ``boundary``
+    """
+    if tolerance is None:
+        tolerance = get_geocoding_tolerance()
+
+    if max_vertices is None:
+        max_vertices = get_geocoding_max_vertices()
+
+    num_vertices = sum(len(ring) for ring in _iter_rings(boundary))
+
+    def _simplify(ring):
+        ring_max_vertices = None
+        if max_vertices and num_vertices > max_vertices:
+            ring_max_vertices = max_vertices * len(ring) // num_vertices
+
+        return simplify_ring(
+            ring,
+            tolerance,
+            max_vertices=ring_max_vertices,
+            precision=_COORDINATE_PRECISION,
+        )
+
+    return _map_rings(_simplify, boundary)
+
+
+def _iter_rings(boundary):
+    if is_multipolygon(boundary):
+        for polygon in boundary:
+            yield from polygon
+    else:
+        yield from boundary
+
+
+def _map_rings(func, boundary):
+    if is_multipolygon(boundary):
+        return [[func(ring) for ring in polygon] for polygon in boundary]
+
+    return [func(ring) for ring in boundary]
+
+
+def simplify_ring(ring, tolerance, max_vertices=None, precision=None):
+    """Simplifies a closed ring of ``[x, y]`` coordinates via the
+    Ramer-Douglas-Peucker algorithm.
+
+    Vertices are added in decreasing order of their distance from the
+    simplified ring, so when ``max_vertices`` is reached, the vertices that
+    are kept are the most significant ones. Rings are never simplified to
+    fewer than 4 vertices (including the closing vertex).
+
+    Args:
+        ring: a list of ``[x, y]`` coordinates
+        tolerance: the maximum distance a removed point may be from the
+            simplified ring
+        max_vertices (None): an optional maximum number of vertices
+        precision (None): an optional number of decimals to which to round
+            the coordinates
+
+    Returns:
+        a list of ``[x, y]`` coordinates
+    """
+    points = np.array([p[:2] for p in ring], dtype=np.float64)
+
+    if len(points) > 4 and (tolerance > 0 or max_vertices):
+        if max_vertices:
+            max_vertices = max(max_vertices, 4)
+
+        keep = np.zeros(len(points), dtype=bool)
+        keep[0] = keep[-1] = True
+        num_kept = 2
+
+        ## Segments are split in order of decreasing distance, which also
+        ## avoids recursion limits on large boundaries
+        heap = []
+        _push_segment(heap, points, 0, len(points) - 1)
+        while heap:
+            neg_dist, start, end, idx = heapq.heappop(heap)
+            if num_kept >= 4 and (
+                -neg_dist <= tolerance
+                or (max_vertices and num_kept >= max_vertices)
+            ):
+                break
+
+            keep[idx] = True
+            num_kept += 1
+            _push_segment(heap, points, start, idx)
+            _push_segment(heap, points, idx, end)
+
+        points = points[keep]
+
+    if precision is not None:
+        points = np.round(points, precision)
+
+    return points.tolist()
+
+
+def _push_segment(heap, points, start, end):
+    if end - start < 2:
+        return
+
+    dists = _point_segment_distances(
+        points[start + 1 : end], points[start], points[end]
+    )
+    idx = int(np.argmax(dists))
+    heapq.heappush(heap, (-dists[idx], start, end, start + 1 + idx))
+
+
+def _point_segment_distances(points, start, end):
+    delta = end - start
+    length2 = np.dot(delta, delta)
+    if length2 == 0:
+        return np.linalg.norm(points - start, axis=1)
+
+    t = np.clip(np.dot(points - start, delta) / length2, 0.0, 1.0)
+    closest = start + t[:, np.newaxis] * delta
+    return np.linalg.norm(points - closest, axis=1)
+
+
+def _is_expired(entry):
+    expires_at = entry.get("expires_at", None)
+    return expires_at is not None and time.time() > expires_at
+
+
+def _normalize_name(location_name):
+    return normalize_text(location_name).lower()
@@ -13,7 +13,7 @@ from langchain_core.runnables import RunnableLambda
 from .utils import (
     PROMPTS_DIR,
     _build_chat_chain,
-    gpt_4o,
+    get_gpt4o,
     stream_runnable,
     get_prompt_from,
 )
@@ -23,7 +23,7 @@ VOXELGPT_INFO_PATH = os.path.join(PROMPTS_DIR, "help_dynamic.txt")
 
 def stream_introspection_query(query):
     prompt = get_prompt_from(VOXELGPT_INFO_PATH).format(question=query)
-    chain = _build_chat_chain(gpt_4o, prompt=prompt)
+    chain = _build_chat_chain(get_gpt4o(), prompt=prompt)
 
     def func_streaming(info):
         query = info["query"]
@@ -38,9 +38,17 @@ def stream_introspection_query(query):
         yield content.content
 
 
+async def astream_introspection_query(query):
+    prompt = get_prompt_from(VOXELGPT_INFO_PATH).format(question=query)
+    chain = _build_chat_chain(get_gpt4o(), prompt=prompt)
+
+    async for content in chain.astream({"messages": [("user", query)]}):
+        yield content.content
+
+
 def run_introspection_query(query):
     prompt = get_prompt_from(VOXELGPT_INFO_PATH).format(question=query)
-    chain = _build_chat_chain(gpt_4o, prompt=prompt)
+    chain = _build_chat_chain(get_gpt4o(), prompt=prompt)
 
     def func(info):
         query = info["query"]
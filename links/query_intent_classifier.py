@@ -8,16 +8,13 @@ Query intent classifier.
 import os
 
 # pylint: disable=relative-beyond-top-level
-from .utils import PROMPTS_DIR, _build_custom_chain, gpt_3_5
+from .semantic_cache import semantic_cached
+from .utils import PROMPTS_DIR, _build_custom_chain, get_gpt_35
 
 INTENT_CLASSIFICATION_PATH = os.path.join(
     PROMPTS_DIR, "intent_classification.txt"
 )
 
-intent_chain = _build_custom_chain(
-    gpt_3_5, template_path=INTENT_CLASSIFICATION_PATH
-)
-
 allowed_topics = [
     "documentation",
     "dataset",
@@ -30,9 +27,26 @@ allowed_topics = [
 bad_topic_text = "I'm sorry, I'm not sure what you're asking. Could you please provide more context?"
 
 
+def _build_intent_chain():
+    return _build_custom_chain(
+        get_gpt_35(), template_path=INTENT_CLASSIFICATION_PATH
+    )
+
+
+@semantic_cached("classify_query_intent")
 def classify_query_intent(query):
-    topic = intent_chain.invoke({"query": query}).lower()
+    topic = _build_intent_chain().invoke({"query": query})
+    return _parse_topic(topic)
+
+
+@semantic_cached("classify_query_intent")
+async def aclassify_query_intent(query):
+    topic = await _build_intent_chain().ainvoke({"query": query})
+    return _parse_topic(topic)
+
 
+def _parse_topic(topic):
+    topic = topic.lower()
     for allowed_topic in allowed_topics:
         if allowed_topic in topic:
             return allowed_topic
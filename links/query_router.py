@@ -0,0 +1,113 @@
+"""
+Fused query router.
+
+| Copyright 2017-2024, Voxel51, Inc.
+| `voxel51.com <https://voxel51.com/>`_
+|
+"""
+import os
+from typing import Literal
+
+from langchain_core.pydantic_v1 import BaseModel, Field
+
+# pylint: disable=relative-beyond-top-level
+from .utils import PROMPTS_DIR, _build_chat_chain, get_gpt4o
+
+QUERY_ROUTING_PATH = os.path.join(PROMPTS_DIR, "query_routing.txt")
+
+
+def fused_routing_enabled():
+    flag = os.environ.get("VOXELGPT_FUSED_ROUTER", False)
+    if isinstance(flag, str):
+        return flag.lower() in ("true", "1", "yes", "on")
+    return flag
+
+
+class QueryRoute(BaseModel):
+    """Routing decisions for the user's latest query"""
+
+    effective_query: str = Field(
+        description="The query intended by the user, given the conversation"
+    )
+    intent: Literal[
+        "dataset",
+        "documentation",
+        "general",
+        "workspace",
+        "introspection",
+        "other",
+    ] = Field(description="The intent of the query")
+    run_computation: bool = Field(
+        description="Whether the user wants to run a computation"
+    )
+    create_view: bool = Field(
+        description="Whether answering requires creating a DatasetView"
+    )
+    aggregate: bool = Field(
+        description="Whether answering requires running an aggregation"
+    )
+    set_view: bool = Field(
+        description="Whether the view should be loaded in the App"
+    )
+
+
+def _format_chat_history(chat_history):
+    return "Conversation log:\n\n" + "\n".join(chat_history)
+
+
+def route_query(chat_history):
+    """Makes all routing decisions for the latest query in the chat history
+    with a single structured-output call.
+
+    This replaces the serial calls to ``generate_effective_query()``,
+    ``classify_query_intent()``, ``should_run_computation()``,
+    ``should_create_view()``, ``should_aggregate()``, and
+    ``should_set_view()``.
+
+    Args:
+        chat_history: the chat history list, whose last entry is the user's
+            latest query
+
+    Returns:
+        a :class:`QueryRoute`
+    """
+    route = _build_routing_chain().invoke(
+        {"messages": [("user", _format_chat_history(chat_history))]}
+    )
+    return _finalize_route(route, chat_history)
+
+
+async def aroute_query(chat_history):
+    """Async version of :func:`route_query`.
+
+    Args:
+        chat_history: the chat history list, whose last entry is the user's
+            latest query
+
+    Returns:
+        a :class:`QueryRoute`
+    """
+    route = await _build_routing_chain().ainvoke(
+        {"messages": [("user", _format_chat_history(chat_history))]}
+    )
+    return _finalize_route(route, chat_history)
+
+
+def _build_routing_chain():
+    return _build_chat_chain(
+        get_gpt4o(),
+        template_path=QUERY_ROUTING_PATH,
+        output_type=QueryRoute,
+    )
+
+
+def _finalize_route(route, chat_history):
+    if not route.effective_query:
+        route.effective_query = chat_history[-1].split(":", 1)[-1].strip()
+
+    ## Mirror the keyword short-circuit in `should_run_computation()`
+    lower_query = route.effective_query.lower()
+    if "show" in lower_query and "compute" not in lower_query:
+        route.run_computation = False
+
+    return route
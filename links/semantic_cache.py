@@ -0,0 +1,423 @@
+"""
+Semantic cache for routing decisions.
+
+| Copyright 2017-2024, Voxel51, Inc.
+| `voxel51.com <https://voxel51.com/>`_
+|
+"""
+
+from collections import deque
+import functools
+import inspect
+import json
+import os
+import threading
+
+import numpy as np
+
+# pylint: disable=relative-beyond-top-level
+from .caching import LRUCache, normalize_text
+from .concurrency import run_sync
+from .utils import embed_query, get_cache_dir
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+_query_vectors = LRUCache(max_size=256)
+
+
+def semantic_cache_enabled():
+    flag = os.environ.get("VOXELGPT_SEMANTIC_CACHE", False)
+    if isinstance(flag, str):
+        return flag.lower() in ("true", "1", "yes", "on")
+    return flag
+
+
+def get_semantic_cache_threshold():
+    threshold = os.environ.get("VOXELGPT_SEMANTIC_CACHE_THRESHOLD", 0.95)
+    if isinstance(threshold, str):
+        try:
+            threshold = float(threshold)
+        except:
+            threshold = 0.95
+    return threshold
+
+
+def get_semantic_cache_max_size():
+    max_size = os.environ.get("VOXELGPT_SEMANTIC_CACHE_MAX_SIZE", 10000)
+    if isinstance(max_size, str):
+        try:
+            max_size = int(max_size)
+        except:
+            max_size = 10000
+    return max_size
+
+
+class SemanticCache(object):
+    """Nearest neighbor cache that maps queries to previously computed
+    outcomes.
+
+    Query embeddings are stored as rows of a unit-normalized NumPy matrix, so
+    a lookup is a single matrix-vector product. The matrix is grown
+    geometrically and entries are written into it in place. Once the cache is
+    full, new entries overwrite the oldest ones.
+
+    When persisted, each entry is appended to the cache's files, which are
+    compacted once they contain twice ``max_size`` entries.
+
+    Args:
+        name: the name of the cache
+        threshold (0.95): the minimum cosine similarity required for a hit
+        max_size (10000): the maximum number of entries to store. When
+            exceeded, the oldest entries are evicted
+        dirpath (None): an optional directory in which to persist the index
+    """
+
+    def __init__(self, name, threshold=0.95, max_size=10000, dirpath=None):
+        self.name = name
+        self.threshold = threshold
+        self.max_size = max_size
+        self.dirpath = dirpath
+
+        self.hits = 0
+        self.misses = 0
+        self.similarities = deque(maxlen=10000)
+
+        self._vectors = None
+        self._queries = []
+        self._outcomes = []
+        self._size = 0
+        self._next = 0
+        self._num_persisted = 0
+        self._lock = threading.Lock()
+
+        if dirpath is not None:
+            self._load()
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def queries(self):
+        """The cached queries, from oldest to newest."""
+        return self._ordered(self._queries)
+
+    @property
+    def outcomes(self):
+        """The cached outcomes, from oldest to newest."""
+        return self._ordered(self._outcomes)
+
+    def lookup(self, vector):
+        """Returns the outcome of the most similar previous query, if its
+        similarity exceeds the threshold.
+
+        Args:
+            vector: the query embedding
+
+        Returns:
+            a ``(outcome, similarity)`` tuple. ``outcome`` is None on a miss
+        """
+        vector = _normalize_vector(vector)
+
+        with self._lock:
+            if self._size == 0:
+                self.misses += 1
+                return None, None
+
+            sims = self._vectors[: self._size] @ vector
+            idx = int(np.argmax(sims))
+            similarity = float(sims[idx])
+            self.similarities.append(similarity)
+
+            if similarity >= self.threshold:
+                self.hits += 1
+                return self._outcomes[idx], similarity
+
+            self.misses += 1
+            return None, similarity
+
+    def add(self, query, vector, outcome):
+        """Adds an entry to the cache.
+
+        Args:
+            query: the query string
+            vector: the query embedding
+            outcome: a JSON-serializable outcome
+        """
+        vector = _normalize_vector(vector)
+
+        with self._lock:
+            reset = self._insert(query, vector, outcome)
+
+            if self.dirpath is not None:
+                if reset or self._num_persisted >= 2 * self.max_size:
+                    self._compact()
+                else:
+                    self._append(query, vector, outcome)
+
+    def clear(self):
+        with self._lock:
+            self._vectors = None
+            self._queries = []
+            self._outcomes = []
+            self._size = 0
+            self._next = 0
+            if self.dirpath is not None:
+                self._compact()
+
+    def stats(self):
+        """Returns a dict of statistics describing the cache's performance.
+
+        The ``similarities`` entry summarizes the best similarity observed for
+        each lookup, which is useful for tuning the threshold.
+        """
+        total = self.hits + self.misses
+        stats = {
+            "name": self.name,
+            "size": len(self),
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+        sims = np.array(self.similarities, dtype=np.float32)
+        if sims.size > 0:
+            counts, edges = np.histogram(sims, bins=20, range=(0.0, 1.0))
+            stats["similarities"] = {
+                "count": int(sims.size),
+                "min": float(sims.min()),
+                "max": float(sims.max()),
+                "mean": float(sims.mean()),
+                "p50": float(np.percentile(sims, 50)),
+                "p90": float(np.percentile(sims, 90)),
+                "p99": float(np.percentile(sims, 99)),
+                "histogram": {
+                    "counts": counts.tolist(),
+                    "edges": edges.tolist(),
+                },
+            }
+        else:
+            stats["similarities"] = {"count": 0}
+
+        return stats
+
+    def _ordered(self, values):
+        if self._size < self.max_size:
+            return list(values)
+
+        return values[self._next :] + values[: self._next]
+
+    def _insert(self, query, vector, outcome):
+        reset = self._vectors is None or self._vectors.shape[1] != vector.size
+        if reset:
+            ## Entries embedded by a different model are discarded
+            self._vectors = np.empty(
+                (min(self.max_size, 64), vector.size), dtype=np.float32
+            )
+            self._queries = []
+            self._outcomes = []
+            self._size = 0
+            self._next = 0
+
+        idx = self._next
+        if idx >= len(self._vectors):
+            capacity = min(self.max_size, 2 * len(self._vectors))
+            vectors = np.empty((capacity, vector.size), dtype=np.float32)
+            vectors[: self._size] = self._vectors[: self._size]
+            self._vectors = vectors
+
+        self._vectors[idx] = vector
+        if idx < len(self._queries):
+            self._queries[idx] = query
+            self._outcomes[idx] = outcome
+        else:
+            self._queries.append(query)
+            self._outcomes.append(outcome)
+
+        self._size = max(self._size, idx + 1)
+        self._next = (idx + 1) % self.max_size
+
+        return reset
+
+    def _vectors_path(self):
+        return os.path.join(self.dirpath, self.name + ".vectors")
+
+    def _entries_path(self):
+        return os.path.join(self.dirpath, self.name + ".jsonl")
+
+    def _load(self):
+        try:
+            entries = []
+            with open(self._entries_path(), "r") as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        ## A partially written last entry
+                        break
+
+            vectors = np.fromfile(self._vectors_path(), dtype=np.float32)
+        except:
+            return
+
+        if not entries:
+            return
+
+        dim = entries[0]["dim"]
+        num_entries = min(len(entries), vectors.size // dim)
+        vectors = vectors[: num_entries * dim].reshape(num_entries, dim)
+
+        start = max(0, num_entries - self.max_size)
+        for entry, vector in zip(entries[start:], vectors[start:]):
+            self._insert(entry["query"], vector, entry["outcome"])
+
+        self._num_persisted = num_entries
+
+    def _append(self, query, vector, outcome):
+        try:
+            os.makedirs(self.dirpath, exist_ok=True)
+            with open(self._entries_path(), "a") as f:
+                f.write(_serialize_entry(query, outcome, vector.size))
+
+            with open(self._vectors_path(), "ab") as f:
+                f.write(vector.astype(np.float32).tobytes())
+
+            self._num_persisted += 1
+        except:
+            pass
+
+    def _compact(self):
+        ## Rewrites the files so they only contain the current entries
+        try:
+            os.makedirs(self.dirpath, exist_ok=True)
+            queries = self.queries
+            outcomes = self.outcomes
+            if self._size > 0:
+                order = np.roll(np.arange(self._size), -self._next)
+                vectors = self._vectors[: self._size][order]
+                dim = vectors.shape[1]
+            else:
+                vectors = np.empty((0, 0), dtype=np.float32)
+                dim = 0
+
+            with open(self._entries_path(), "w") as f:
+                for query, outcome in zip(queries, outcomes):
+                    f.write(_serialize_entry(query, outcome, dim))
+
+            with open(self._vectors_path(), "wb") as f:
+                f.write(vectors.tobytes())
+
+            self._num_persisted = self._size
+        except:
+            pass
+
+
+def _serialize_entry(query, outcome, dim):
+    entry = {"query": query, "outcome": outcome, "dim": dim}
+    return json.dumps(entry) + "\n"
+
+
+def _normalize_vector(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector = vector / norm
+    return vector
+
+
+def get_semantic_cache(name):
+    """Returns the semantic cache with the given name, or None if semantic
+    caching is disabled.
+
+    Args:
+        name: the cache name
+    """
+    if not semantic_cache_enabled():
+        return None
+
+    cache = _caches.get(name, None)
+    if cache is not None:
+        return cache
+
+    with _caches_lock:
+        cache = _caches.get(name, None)
+        if cache is None:
+            cache = SemanticCache(
+                name,
+                threshold=get_semantic_cache_threshold(),
+                max_size=get_semantic_cache_max_size(),
+                dirpath=os.path.join(get_cache_dir(), "semantic_cache"),
+            )
+            _caches[name] = cache
+
+    return cache
+
+
+def get_semantic_cache_stats():
+    """Returns a dict mapping cache names to their statistics."""
+    return {name: cache.stats() for name, cache in _caches.items()}
+
+
+def _get_query_vector(query):
+    # The same query is routed through several classifiers in a row, so only
+    # embed it once
+    key = normalize_text(query)
+    vector = _query_vectors.get(key)
+    if vector is None:
+        vector = embed_query(key)
+        _query_vectors.set(key, vector)
+    return vector
+
+
+def semantic_cached(name):
+    """Decorator that serves a routing function's outcome from the semantic
+    cache when a sufficiently similar query has been routed before.
+
+    The decorated function must accept the query string as its first
+    argument and return a JSON-serializable outcome. Coroutine functions are
+    supported, in which case the query is embedded off of the event loop.
+
+    Args:
+        name: the cache name
+    """
+
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def awrapper(query, *args, **kwargs):
+                cache = get_semantic_cache(name)
+                if cache is None:
+                    return await func(query, *args, **kwargs)
+
+                vector = await run_sync(_get_query_vector, query)
+                outcome, _ = cache.lookup(vector)
+                if outcome is not None:
+                    return outcome
+
+                outcome = await func(query, *args, **kwargs)
+                cache.add(query, vector, outcome)
+                return outcome
+
+            return awrapper
+
+        @functools.wraps(func)
+        def wrapper(query, *args, **kwargs):
+            cache = get_semantic_cache(name)
+            if cache is None:
+                return func(query, *args, **kwargs)
+
+            vector = _get_query_vector(query)
+            outcome, _ = cache.lookup(vector)
+            if outcome is not None:
+                return outcome
+
+            outcome = func(query, *args, **kwargs)
+            cache.add(query, vector, outcome)
+            return outcome
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,70 @@
+"""
+Request tracing.
+
+| Copyright 2017-2024, Voxel51, Inc.
+| `voxel51.com <https://voxel51.com/>`_
+|
+"""
+
+import threading
+import time
+
+
+class Trace(object):
+    """Collects counters and timings for a single VoxelGPT request.
+
+    Traces are safe to update from multiple threads.
+
+    Example::
+
+        trace = Trace()
+        for response in ask_voxelgpt_generator(query, dataset, trace=trace):
+            ...
+
+        print(trace.summary())
+    """
+
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.end_time = None
+        self.counters = {}
+        self.timings = {}
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name, value=1):
+        """Increments the counter ``name`` by ``value``."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set(self, name, value):
+        """Records an arbitrary value ``name``."""
+        with self._lock:
+            self.values[name] = value
+
+    def mark(self, name):
+        """Records the number of seconds elapsed since the start of the
+        request as the timing ``name``, unless it has already been recorded.
+        """
+        with self._lock:
+            if name not in self.timings:
+                self.timings[name] = time.perf_counter() - self.start_time
+
+    def finish(self):
+        if self.end_time is None:
+            self.end_time = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        end_time = self.end_time or time.perf_counter()
+        return end_time - self.start_time
+
+    def summary(self):
+        """Returns a dict summarizing the trace."""
+        with self._lock:
+            return {
+                "elapsed": self.elapsed,
+                "counters": dict(self.counters),
+                "timings": dict(self.timings),
+                "values": dict(self.values),
+            }
@@ -6,18 +6,47 @@ Link utils.
 |
 """
 
+from collections import namedtuple
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import contextvars
+import functools
+import json
 import os
 import re
 import threading
+import time
 import queue
+from typing import Optional
 
 from langchain.agents import AgentExecutor, create_tool_calling_agent
 from langchain.callbacks.base import BaseCallbackHandler
+from langchain_core.agents import AgentStep
+from langchain_core.messages import AIMessage, BaseMessage
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import (
     ChatPromptTemplate,
     PromptTemplate,
 )
+from langchain_core.runnables import Runnable
+
+# pylint: disable=relative-beyond-top-level
+from .caching import (
+    LRUCache,
+    SQLiteCache,
+    TieredCache,
+    deserialize_vector,
+    make_cache_key,
+    normalize_text,
+    serialize_vector,
+)
+from .concurrency import (
+    abandon_tool_call,
+    get_tool_executor,
+    get_tool_timeout,
+    run_sync,
+    stream_in_background,
+    tool_workers_available,
+)
 
 
 EMBEDDING_MODEL_NAME = "text-embedding-3-large"
@@ -90,57 +119,248 @@ def protect_text(text):
     return text
 
 
-def _get_dummy_messages():
-    chat_template = ChatPromptTemplate.from_messages(
-        [
-            (
-                "system",
-                "You are a helpful assistant. Help me with my math homework!",
-            ),
-            ("human", "{user_input}"),
-        ]
-    )
-    messages = chat_template.format_messages(
-        user_input="Hello! Could you solve 2+2?"
-    )
-    return messages
+def get_cache_dir():
+    """Returns the directory in which VoxelGPT stores its local caches.
+
+    The location can be configured via the ``VOXELGPT_CACHE_DIR`` environment
+    variable.
+    """
+    cache_dir = os.environ.get("VOXELGPT_CACHE_DIR", None)
+    if not cache_dir:
+        cache_dir = os.path.join(os.path.expanduser("~"), ".cache", "voxelgpt")
+
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
+
+
+### MODEL REGISTRY ###
+
+GPT_35_MODEL_NAME = "gpt-3.5-turbo"
+GPT_4O_MODEL_NAME = "gpt-4o"
 
+_AZURE_DEPLOYMENT_NAME_VARS = {
+    GPT_35_MODEL_NAME: "AZURE_OPENAI_GPT35_DEPLOYMENT_NAME",
+    GPT_4O_MODEL_NAME: "AZURE_OPENAI_GPT4O_DEPLOYMENT_NAME",
+    EMBEDDING_MODEL_NAME: "AZURE_OPENAI_TEXT_EMBEDDING_3_LARGE_DEPLOYMENT_NAME",
+}
+
+_models = {}
+_models_lock = threading.Lock()
 
-def _get_dummy_text():
-    return "This is a text to embed"
+_model_health = None
+_model_health_lock = threading.Lock()
 
 
 def get_embedding_model():
-    if _is_azure_deployment():
-        try:
-            embedding_model = _get_embedding_model_azure()
-            embedding_model.embed_query(_get_dummy_text())
-            return embedding_model
-        except:
-            pass
-    return _get_embedding_model_openai()
+    """Returns the (lazily constructed) embedding model."""
+    return _get_model(
+        EMBEDDING_MODEL_NAME,
+        _get_embedding_model_azure,
+        _get_embedding_model_openai,
+    )
 
 
 def get_gpt4o():
-    if _is_azure_deployment():
-        try:
-            model = _get_gpt4o_azure()
-            model.invoke(_get_dummy_messages())
-            return model
-        except Exception as e:
-            pass
-    return _get_gpt4o_openai()
+    """Returns the (lazily constructed) GPT-4o chat model."""
+    return _get_model(GPT_4O_MODEL_NAME, _get_gpt4o_azure, _get_gpt4o_openai)
 
 
 def get_gpt_35():
-    if _is_azure_deployment():
+    """Returns the (lazily constructed) GPT-3.5 chat model."""
+    return _get_model(GPT_35_MODEL_NAME, _get_gpt_35_azure, _get_gpt_35_openai)
+
+
+def _get_model(name, azure_factory, openai_factory):
+    # Models are built on first use and memoized for the lifetime of the
+    # process. No requests are made to validate them; instead, Azure failures
+    # observed at runtime are recorded via `report_model_failure()`
+    use_azure = _use_azure(name)
+    key = (name, use_azure)
+
+    model = _models.get(key, None)
+    if model is not None:
+        return model
+
+    with _models_lock:
+        model = _models.get(key, None)
+        if model is None:
+            model = azure_factory() if use_azure else openai_factory()
+            _models[key] = model
+
+    return model
+
+
+def _use_azure(name):
+    provider = os.environ.get("VOXELGPT_MODEL_PROVIDER", None)
+    if provider is not None and provider.lower() == "openai":
+        return False
+
+    if not _is_azure_deployment():
+        return False
+
+    if not os.environ.get(_AZURE_DEPLOYMENT_NAME_VARS[name], None):
+        return False
+
+    if provider is not None and provider.lower() == "azure":
+        return True
+
+    return _is_model_healthy(name)
+
+
+def get_model_health_ttl():
+    ttl = os.environ.get("VOXELGPT_MODEL_HEALTH_TTL", 600)
+    if isinstance(ttl, str):
         try:
-            model = _get_gpt_35_azure()
-            model.invoke(_get_dummy_messages())
-            return model
-        except Exception as e:
+            ttl = float(ttl)
+        except:
+            ttl = 600
+    return ttl
+
+
+def _get_model_health_path():
+    return os.path.join(get_cache_dir(), "model_health.json")
+
+
+def _load_model_health():
+    global _model_health
+
+    if _model_health is not None:
+        return _model_health
+
+    with _model_health_lock:
+        if _model_health is None:
+            try:
+                with open(_get_model_health_path(), "r") as f:
+                    _model_health = json.load(f)
+            except:
+                _model_health = {}
+
+    return _model_health
+
+
+def _is_model_healthy(name):
+    record = _load_model_health().get(name, None)
+    if record is None:
+        return True
+
+    if time.time() - record["timestamp"] > get_model_health_ttl():
+        return True
+
+    return record["healthy"]
+
+
+def report_model_failure(name):
+    """Records that the Azure deployment of the given model is unavailable.
+
+    Until the record expires (see ``VOXELGPT_MODEL_HEALTH_TTL``), the OpenAI
+    API is used for this model instead. The record is persisted to disk so
+    that it is shared across processes.
+
+    Args:
+        name: the model name
+    """
+    health = _load_model_health()
+    with _model_health_lock:
+        health[name] = {"healthy": False, "timestamp": time.time()}
+        try:
+            with open(_get_model_health_path(), "w") as f:
+                json.dump(health, f)
+        except:
             pass
-    return _get_gpt_35_openai()
+
+
+def _is_unavailable_error(error):
+    import openai
+
+    return isinstance(
+        error,
+        (
+            openai.APIConnectionError,
+            openai.AuthenticationError,
+            openai.NotFoundError,
+            openai.PermissionDeniedError,
+        ),
+    )
+
+
+class ModelHealthHandler(BaseCallbackHandler):
+    """Marks the Azure deployment of a model as unhealthy when it errors."""
+
+    def __init__(self, name):
+        super().__init__()
+        self.name = name
+
+    def on_llm_error(self, error, **kwargs):
+        if _is_unavailable_error(error):
+            report_model_failure(self.name)
+
+
+def embed_query(text):
+    """Embeds the given text with the embedding model.
+
+    Embeddings are served from the embedding cache when possible. See
+    :func:`get_embedding_cache` for details.
+
+    Args:
+        text: a string
+
+    Returns:
+        a list of floats
+    """
+    return embed_queries([text])[0]
+
+
+def embed_queries(texts):
+    """Embeds the given texts with the embedding model.
+
+    Texts whose embeddings are not cached are embedded in a single request.
+
+    Args:
+        texts: a list of strings
+
+    Returns:
+        a list of lists of floats
+    """
+    cache = get_embedding_cache()
+
+    vectors = [None] * len(texts)
+    pending = {}
+    for idx, text in enumerate(texts):
+        text = normalize_text(text)
+        if cache is not None:
+            vector = cache.get(_get_embedding_cache_key(text))
+            if vector is not None:
+                vectors[idx] = vector
+                continue
+
+        pending.setdefault(text, []).append(idx)
+
+    if not pending:
+        return vectors
+
+    pending_texts = list(pending.keys())
+    pending_vectors = _embed_texts(pending_texts)
+    for text, vector in zip(pending_texts, pending_vectors):
+        if cache is not None:
+            cache.set(_get_embedding_cache_key(text), vector)
+
+        for idx in pending[text]:
+            vectors[idx] = vector
+
+    return vectors
+
+
+def _embed_texts(texts):
+    model = get_embedding_model()
+    try:
+        if len(texts) == 1:
+            return [model.embed_query(texts[0])]
+
+        return model.embed_documents(texts)
+    except Exception as e:
+        if _use_azure(EMBEDDING_MODEL_NAME) and _is_unavailable_error(e):
+            report_model_failure(EMBEDDING_MODEL_NAME)
+        raise
 
 
 def _is_azure_deployment():
@@ -181,7 +401,7 @@ def _get_embedding_model_azure():
 def _get_gpt_35_openai():
     from langchain_openai import ChatOpenAI
 
-    return ChatOpenAI(model="gpt-3.5-turbo", temperature=0)
+    return ChatOpenAI(model=GPT_35_MODEL_NAME, temperature=0)
 
 
 def _get_gpt_35_azure():
@@ -193,6 +413,7 @@ def _get_gpt_35_azure():
         azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
         api_key=os.getenv("AZURE_OPENAI_KEY"),
         temperature=0,
+        callbacks=[ModelHealthHandler(GPT_35_MODEL_NAME)],
     )
 
 
@@ -205,18 +426,14 @@ def _get_gpt4o_azure():
         azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
         api_key=os.getenv("AZURE_OPENAI_KEY"),
         temperature=0,
+        callbacks=[ModelHealthHandler(GPT_4O_MODEL_NAME)],
     )
 
 
 def _get_gpt4o_openai():
     from langchain_openai import ChatOpenAI
 
-    return ChatOpenAI(model="gpt-4o", temperature=0)
-
-
-gpt_3_5 = get_gpt_35()
-gpt_4o = get_gpt4o()
-embedding_model = get_embedding_model()
+    return ChatOpenAI(model=GPT_4O_MODEL_NAME, temperature=0)
 
 
 def get_prompt_from(path):
@@ -230,15 +447,17 @@ def _make_replacements(expr):
     return expr
 
 
-def _build_custom_chain(model, template_path=None, prompt=None):
+def _build_custom_chain(model, template_path=None, prompt=None, cache=True):
     if template_path:
         prompt = get_prompt_from(template_path)
     chain = PromptTemplate.from_template(prompt) | model | StrOutputParser()
+    if cache:
+        chain = _cache_chain(chain, model, prompt)
     return chain
 
 
 def _build_chat_chain(
-    model, output_type=None, template_path=None, prompt=None
+    model, output_type=None, template_path=None, prompt=None, cache=True
 ):
 
     if template_path:
@@ -258,9 +477,417 @@ def _build_chat_chain(
         )
         | curr_model
     )
+    if cache:
+        chain = _cache_chain(chain, model, prompt, output_type=output_type)
     return chain
 
 
+### RESPONSE CACHE ###
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def _get_env_flag(name, default):
+    flag = os.environ.get(name, default)
+    if isinstance(flag, str):
+        return flag.lower() not in ("false", "0", "no", "off")
+    return flag
+
+
+def _get_env_number(name, default):
+    value = os.environ.get(name, default)
+    if isinstance(value, str):
+        try:
+            value = float(value)
+        except:
+            value = default
+    return value
+
+
+def get_response_cache():
+    """Returns the LLM response cache, or None if caching is disabled.
+
+    The cache is configured via the following environment variables:
+
+    -   ``VOXELGPT_RESPONSE_CACHE``: whether to cache responses (True)
+    -   ``VOXELGPT_RESPONSE_CACHE_DISK``: whether to persist responses to disk
+        (True)
+    -   ``VOXELGPT_RESPONSE_CACHE_SIZE``: the maximum number of in-memory
+        entries (1024)
+    -   ``VOXELGPT_RESPONSE_CACHE_DISK_SIZE``: the maximum number of on-disk
+        entries (100000)
+    -   ``VOXELGPT_RESPONSE_CACHE_TTL``: the number of seconds after which
+        cached responses expire (604800)
+    """
+    global _response_cache
+
+    if not _get_env_flag("VOXELGPT_RESPONSE_CACHE", True):
+        return None
+
+    if _response_cache is not None:
+        return _response_cache
+
+    with _response_cache_lock:
+        if _response_cache is None:
+            ttl = _get_env_number("VOXELGPT_RESPONSE_CACHE_TTL", 604800)
+            memory = LRUCache(
+                max_size=int(
+                    _get_env_number("VOXELGPT_RESPONSE_CACHE_SIZE", 1024)
+                ),
+                ttl=ttl,
+            )
+
+            disk = None
+            if _get_env_flag("VOXELGPT_RESPONSE_CACHE_DISK", True):
+                disk = SQLiteCache(
+                    os.path.join(get_cache_dir(), "responses.db"),
+                    max_size=int(
+                        _get_env_number(
+                            "VOXELGPT_RESPONSE_CACHE_DISK_SIZE", 100000
+                        )
+                    ),
+                    ttl=ttl,
+                )
+
+            _response_cache = TieredCache(memory=memory, disk=disk)
+
+    return _response_cache
+
+
+### EMBEDDING CACHE ###
+
+_embedding_cache = None
+_embedding_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    """Returns the query embedding cache, or None if caching is disabled.
+
+    Embeddings are keyed by the embedding model name and the whitespace
+    normalized text. On disk, embeddings are stored as float16 vectors.
+
+    The cache is configured via the following environment variables:
+
+    -   ``VOXELGPT_EMBEDDING_CACHE``: whether to cache embeddings (True)
+    -   ``VOXELGPT_EMBEDDING_CACHE_DISK``: whether to persist embeddings to
+        disk (True)
+    -   ``VOXELGPT_EMBEDDING_CACHE_SIZE``: the maximum number of in-memory
+        entries (1024)
+    -   ``VOXELGPT_EMBEDDING_CACHE_DISK_SIZE``: the maximum number of on-disk
+        entries (100000)
+    """
+    global _embedding_cache
+
+    if not _get_env_flag("VOXELGPT_EMBEDDING_CACHE", True):
+        return None
+
+    if _embedding_cache is not None:
+        return _embedding_cache
+
+    with _embedding_cache_lock:
+        if _embedding_cache is None:
+            memory = LRUCache(
+                max_size=int(
+                    _get_env_number("VOXELGPT_EMBEDDING_CACHE_SIZE", 1024)
+                )
+            )
+
+            disk = None
+            if _get_env_flag("VOXELGPT_EMBEDDING_CACHE_DISK", True):
+                disk = SQLiteCache(
+                    os.path.join(get_cache_dir(), "embeddings.db"),
+                    max_size=int(
+                        _get_env_number(
+                            "VOXELGPT_EMBEDDING_CACHE_DISK_SIZE", 100000
+                        )
+                    ),
+                )
+
+            _embedding_cache = TieredCache(
+                memory=memory,
+                disk=disk,
+                serialize=serialize_vector,
+                deserialize=deserialize_vector,
+            )
+
+    return _embedding_cache
+
+
+def _get_embedding_cache_key(text):
+    return make_cache_key(EMBEDDING_MODEL_NAME, text)
+
+
+def _get_model_id(model):
+    for attr in ("deployment_name", "model_name", "model"):
+        value = getattr(model, attr, None)
+        if value:
+            return value
+
+    return type(model).__name__
+
+
+def _get_schema_id(output_type):
+    if output_type is None:
+        return None
+
+    try:
+        return output_type.schema()
+    except:
+        return getattr(output_type, "__name__", str(output_type))
+
+
+def _cache_chain(chain, model, prompt, output_type=None):
+    # Only deterministic responses are safe to reuse
+    if getattr(model, "temperature", None) != 0:
+        return chain
+
+    key_parts = (
+        prompt,
+        _get_model_id(model),
+        getattr(model, "temperature", None),
+        _get_schema_id(output_type),
+    )
+    return CachedRunnable(chain, key_parts, output_type=output_type)
+
+
+def _serialize_response(response):
+    if isinstance(response, str):
+        return {"type": "str", "value": response}
+
+    if isinstance(response, BaseMessage):
+        return {"type": "message", "value": response.content}
+
+    if hasattr(response, "dict"):
+        return {"type": "model", "value": response.dict()}
+
+    return None
+
+
+def _deserialize_response(data, output_type=None):
+    if data["type"] == "str":
+        return data["value"]
+
+    if data["type"] == "message":
+        return AIMessage(content=data["value"])
+
+    return output_type(**data["value"])
+
+
+class CachedRunnable(Runnable):
+    """Wraps a runnable so that its responses are served from the response
+    cache when possible.
+
+    The cache key is a normalized hash of the prompt template, the model name
+    and parameters, the structured output schema, and the call's inputs.
+
+    Pass ``use_cache=False`` to :meth:`invoke`, :meth:`stream`,
+    :meth:`ainvoke`, or :meth:`astream` to bypass the cache for a single call.
+
+    Since the cache may read from disk, :meth:`ainvoke` and :meth:`astream`
+    access it via :func:`links.concurrency.run_sync`.
+
+    Args:
+        runnable: the runnable to wrap
+        key_parts: a tuple of objects that identify the runnable
+        output_type (None): the structured output type of the runnable, if
+            any
+    """
+
+    def __init__(self, runnable, key_parts, output_type=None):
+        self.runnable = runnable
+        self.key_parts = key_parts
+        self.output_type = output_type
+
+    def _get_key(self, input):
+        return make_cache_key(self.key_parts, input)
+
+    def _lookup(self, key):
+        cache = get_response_cache()
+        if cache is None:
+            return None
+
+        data = cache.get(key)
+        if data is None:
+            return None
+
+        return _deserialize_response(data, output_type=self.output_type)
+
+    def _store(self, key, response):
+        cache = get_response_cache()
+        if cache is None or response is None:
+            return
+
+        data = _serialize_response(response)
+        if data is not None:
+            cache.set(key, data)
+
+    def invoke(self, input, config=None, use_cache=True, **kwargs):
+        if not use_cache:
+            return self.runnable.invoke(input, config=config, **kwargs)
+
+        key = self._get_key(input)
+        response = self._lookup(key)
+        if response is None:
+            response = self.runnable.invoke(input, config=config, **kwargs)
+            self._store(key, response)
+
+        return response
+
+    def stream(self, input, config=None, use_cache=True, **kwargs):
+        if not use_cache:
+            yield from self.runnable.stream(input, config=config, **kwargs)
+            return
+
+        key = self._get_key(input)
+        response = self._lookup(key)
+        if response is not None:
+            yield response
+            return
+
+        response = None
+        for chunk in self.runnable.stream(input, config=config, **kwargs):
+            response = _add_chunks(response, chunk)
+            yield chunk
+
+        self._store(key, response)
+
+    async def ainvoke(self, input, config=None, use_cache=True, **kwargs):
+        if not use_cache:
+            return await self.runnable.ainvoke(input, config=config, **kwargs)
+
+        key = self._get_key(input)
+        response = await run_sync(self._lookup, key)
+        if response is None:
+            response = await self.runnable.ainvoke(
+                input, config=config, **kwargs
+            )
+            await run_sync(self._store, key, response)
+
+        return response
+
+    async def astream(self, input, config=None, use_cache=True, **kwargs):
+        if not use_cache:
+            async for chunk in self.runnable.astream(
+                input, config=config, **kwargs
+            ):
+                yield chunk
+            return
+
+        key = self._get_key(input)
+        response = await run_sync(self._lookup, key)
+        if response is not None:
+            yield response
+            return
+
+        response = None
+        async for chunk in self.runnable.astream(
+            input, config=config, **kwargs
+        ):
+            response = _add_chunks(response, chunk)
+            yield chunk
+
+        await run_sync(self._store, key, response)
+
+
+def _add_chunks(response, chunk):
+    if response is None:
+        return chunk
+
+    try:
+        return response + chunk
+    except TypeError:
+        return chunk
+
+
+def parallel_tool_calls_enabled():
+    flag = os.environ.get("VOXELGPT_PARALLEL_TOOL_CALLS", True)
+    if isinstance(flag, str):
+        return flag.lower() in ("true", "1", "yes", "on")
+    return flag
+
+
+_PendingAgentStep = namedtuple("_PendingAgentStep", ["action", "future"])
+
+
+class ParallelAgentExecutor(AgentExecutor):
+    """Agent executor that concurrently runs the tool calls that the agent
+    makes in a single turn.
+
+    Tool calls run on the pool returned by
+    :func:`links.concurrency.get_tool_executor`, so each step takes as long
+    as its slowest tool call rather than the sum of them. Tool calls that
+    have not finished ``tool_timeout`` seconds after the step's tool calls
+    were started are reported to the agent as having timed out.
+
+    Tool calls that time out cannot be interrupted, so they keep occupying a
+    worker of the pool until they finish. While every worker is occupied by
+    such calls, new tool calls are reported to the agent as unavailable
+    rather than being queued behind them.
+    """
+
+    tool_timeout: Optional[float] = None
+
+    def _iter_next_step(self, *args, **kwargs):
+        pending = []
+        deadline = None
+        for output in super()._iter_next_step(*args, **kwargs):
+            if isinstance(output, _PendingAgentStep):
+                if not pending and self.tool_timeout is not None:
+                    deadline = time.monotonic() + self.tool_timeout
+
+                pending.append(output)
+            else:
+                yield output
+
+        for agent_action, future in pending:
+            yield self._get_agent_step(agent_action, future, deadline)
+
+    def _perform_agent_action(
+        self,
+        name_to_tool_map,
+        color_mapping,
+        agent_action,
+        run_manager=None,
+    ):
+        if not tool_workers_available():
+            observation = (
+                f"Tool '{agent_action.tool}' is unavailable because earlier "
+                "tool calls that timed out are still running"
+            )
+            return AgentStep(action=agent_action, observation=observation)
+
+        ## Start the tool call here and wait for it in _iter_next_step()
+        func = functools.partial(
+            super()._perform_agent_action,
+            name_to_tool_map,
+            color_mapping,
+            agent_action,
+            run_manager=run_manager,
+        )
+        context = contextvars.copy_context()
+        future = get_tool_executor().submit(context.run, func)
+        return _PendingAgentStep(agent_action, future)
+
+    def _get_agent_step(self, agent_action, future, deadline):
+        ## All tool calls of a step share one deadline, so a step never waits
+        ## more than tool_timeout seconds in total
+        if deadline is not None:
+            timeout = max(0, deadline - time.monotonic())
+        else:
+            timeout = None
+
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            abandon_tool_call(future)
+            observation = (
+                f"Tool '{agent_action.tool}' timed out after "
+                f"{self.tool_timeout} seconds"
+            )
+            return AgentStep(action=agent_action, observation=observation)
+
+
 def _build_agent_executor_chain(model, tools, template_path):
     prompt = ChatPromptTemplate.from_messages(
         [
@@ -270,38 +897,33 @@ def _build_agent_executor_chain(model, tools, template_path):
         ]
     )
     agent = create_tool_calling_agent(model, tools, prompt)
-    agent_executor = AgentExecutor(
-        agent=agent,
-        tools=tools,
-    )
+    if parallel_tool_calls_enabled():
+        agent_executor = ParallelAgentExecutor(
+            agent=agent,
+            tools=tools,
+            tool_timeout=get_tool_timeout(),
+        )
+    else:
+        agent_executor = AgentExecutor(
+            agent=agent,
+            tools=tools,
+        )
     return agent_executor
 
 
-def _build_runnable_thread(runnable, info):
-    def _runnable_thread(runnable, info, q):
-        for chunk in runnable.stream(info):
-            q.put(chunk)
-        q.put(None)
-
-    q = queue.Queue()
-    thread = threading.Thread(
-        target=_runnable_thread, args=(runnable, info, q)
-    )
-    thread.start()
-    return q
-
+def stream_runnable(runnable, info):
+    """Streams the output of the given runnable.
 
-def _get_runnable_thread_output(q):
-    while True:
-        chunk = q.get()
-        if chunk is None:
-            break
-        yield chunk
+    See :func:`links.concurrency.stream_in_background` for details.
 
+    Args:
+        runnable: a runnable
+        info: the input to the runnable
 
-def stream_runnable(runnable, info):
-    q = _build_runnable_thread(runnable, info)
-    return _get_runnable_thread_output(q)
+    Returns:
+        a generator that emits the streamed chunks
+    """
+    return stream_in_background(runnable.stream, info)
 
 
 def get_openai_key():
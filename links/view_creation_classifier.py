@@ -9,11 +9,12 @@ View creation classifier.
 import os
 
 # pylint: disable=relative-beyond-top-level
+from .semantic_cache import semantic_cached
 from .utils import (
     PROMPTS_DIR,
     _build_custom_chain,
-    gpt_3_5,
-    gpt_4o,
+    get_gpt_35,
+    get_gpt4o,
     protect_text,
 )
 
@@ -22,11 +23,21 @@ CREATE_VIEW_CLASSIFICATION_PATH = os.path.join(
 )
 
 
-def should_create_view(query):
-    chain = _build_custom_chain(
-        gpt_3_5, template_path=CREATE_VIEW_CLASSIFICATION_PATH
+def _build_create_view_chain():
+    return _build_custom_chain(
+        get_gpt_35(), template_path=CREATE_VIEW_CLASSIFICATION_PATH
     )
-    response = chain.invoke({"query": query})
+
+
+@semantic_cached("should_create_view")
+def should_create_view(query):
+    response = _build_create_view_chain().invoke({"query": query})
+    return "view" in response.lower()
+
+
+@semantic_cached("should_create_view")
+async def ashould_create_view(query):
+    response = await _build_create_view_chain().ainvoke({"query": query})
     return "view" in response.lower()
 
 
@@ -48,14 +59,43 @@ def _format(view):
 _view_words = ("view", "add", "now")
 
 
-def should_add_to_view(query, view, view_kw_flag=None, dataset_kw_flag=None):
+def _get_add_to_view_keyword_decision(query, view_kw_flag, dataset_kw_flag):
     if view_kw_flag or any(word in query.lower() for word in _view_words):
         return True
     if dataset_kw_flag or "dataset" in query.lower():
         return False
+    return None
+
+
+def _build_add_to_view_chain():
+    return _build_custom_chain(
+        get_gpt4o(), template_path=ADD_TO_VIEW_CLASSIFICATION_PATH
+    )
+
 
-    chain = _build_custom_chain(
-        gpt_4o, template_path=ADD_TO_VIEW_CLASSIFICATION_PATH
+def should_add_to_view(query, view, view_kw_flag=None, dataset_kw_flag=None):
+    decision = _get_add_to_view_keyword_decision(
+        query, view_kw_flag, dataset_kw_flag
     )
+    if decision is not None:
+        return decision
+
+    chain = _build_add_to_view_chain()
     response = chain.invoke({"query": query, "current_view": _format(view)})
     return "add" in response.lower()
+
+
+async def ashould_add_to_view(
+    query, view, view_kw_flag=None, dataset_kw_flag=None
+):
+    decision = _get_add_to_view_keyword_decision(
+        query, view_kw_flag, dataset_kw_flag
+    )
+    if decision is not None:
+        return decision
+
+    chain = _build_add_to_view_chain()
+    response = await chain.ainvoke(
+        {"query": query, "current_view": _format(view)}
+    )
+    return "add" in response.lower()
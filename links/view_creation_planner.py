@@ -10,7 +10,12 @@ from langchain_core.pydantic_v1 import BaseModel, Field
 from typing import List
 
 # pylint: disable=relative-beyond-top-level
-from .utils import PROMPTS_DIR, _build_chat_chain, gpt_4o, get_prompt_from
+from .utils import (
+    PROMPTS_DIR,
+    _build_chat_chain,
+    get_gpt4o,
+    get_prompt_from,
+)
 
 CREATE_VIEW_PLANNING_PATH = os.path.join(
     PROMPTS_DIR, "create_view_planning.txt"
@@ -29,29 +34,56 @@ class ViewCreationPlan(BaseModel):
     )
 
 
-def create_view_creation_plan(query):
-    planner = _build_chat_chain(
-        gpt_4o,
+def _build_planner():
+    return _build_chat_chain(
+        get_gpt4o(),
         template_path=CREATE_VIEW_PLANNING_PATH,
         output_type=ViewCreationPlan,
     )
 
+
+def create_view_creation_plan(query):
+    planner = _build_planner()
     response = planner.invoke({"messages": [("user", query)]})
     return response
 
 
-def revise_view_creation_plan(query, inspection_results, view_creation_plan):
+async def acreate_view_creation_plan(query):
+    planner = _build_planner()
+    response = await planner.ainvoke({"messages": [("user", query)]})
+    return response
+
+
+def _build_revision_planner(query, inspection_results, view_creation_plan):
     prompt = get_prompt_from(REVISE_VIEW_PLANNING_PATH).format(
         query=query,
         dataset_info=inspection_results,
         initial_plan=view_creation_plan,
     )
-    planner = _build_chat_chain(
-        gpt_4o,
+    return _build_chat_chain(
+        get_gpt4o(),
         prompt=prompt,
         output_type=ViewCreationPlan,
     )
+
+
+def revise_view_creation_plan(query, inspection_results, view_creation_plan):
+    planner = _build_revision_planner(
+        query, inspection_results, view_creation_plan
+    )
     response = planner.invoke({"messages": [("user", query)]})
     if response is None or response.steps is None:
         return view_creation_plan
     return response
+
+
+async def arevise_view_creation_plan(
+    query, inspection_results, view_creation_plan
+):
+    planner = _build_revision_planner(
+        query, inspection_results, view_creation_plan
+    )
+    response = await planner.ainvoke({"messages": [("user", query)]})
+    if response is None or response.steps is None:
+        return view_creation_plan
+    return response
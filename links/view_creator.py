@@ -6,38 +6,142 @@ View creator.
 |
 """
 
+import os
+
 import fiftyone as fo
 
 # pylint: disable=relative-beyond-top-level
+from .concurrency import get_executor, map_concurrently
 from .view_stage_delegator import delegate_view_stage_creation
 from .view_stage_constructor import construct_stage
 from .view_stage_validator import validate_view_stage
 from .utils import has_metadata
 
 
-def create_view_from_plan(sample_collection, view_creation_plan):
+def speculative_view_creation_enabled():
+    flag = os.environ.get("VOXELGPT_SPECULATIVE_VIEW_CREATION", False)
+    if isinstance(flag, str):
+        return flag.lower() in ("true", "1", "yes", "on")
+    return flag
+
+
+def get_view_stage_max_workers():
+    max_workers = os.environ.get("VOXELGPT_VIEW_STAGE_WORKERS", 4)
+    if isinstance(max_workers, str):
+        try:
+            max_workers = int(max_workers)
+        except:
+            max_workers = 4
+    return max_workers
+
+
+def _create_stage(step, sample_collection, assignees=None, trace=None):
+    assignee = assignees.get(step, None) if assignees else None
+    if assignee is None:
+        assignee = delegate_view_stage_creation(step)
+        if trace is not None:
+            trace.increment("view_stage_delegations")
+    elif trace is not None:
+        trace.increment("view_stage_delegations_saved")
+
+    stage = construct_stage(step, assignee, sample_collection)
+    stage = validate_view_stage(stage, sample_collection)
+    if stage is None or isinstance(stage, str):
+        return stage
+
+    return stage.build(), str(stage.__repr__())
+
+
+def _is_possible_step(step):
+    return not step.lower().startswith("no")
+
+
+def start_speculative_stages(
+    sample_collection, view_creation_plan, assignees=None, trace=None
+):
+    """Starts constructing the stages for the given plan in the background.
+
+    This is intended to be called while the plan is being revised. The
+    returned futures can be passed to :func:`create_view_from_plan`, which
+    reuses the stages for steps that survive revision and discards the rest.
+
+    Args:
+        sample_collection: a
+            :class:`fiftyone.core.collections.SampleCollection`
+        view_creation_plan: a
+            :class:`links.view_creation_planner.ViewCreationPlan`
+        assignees (None): an optional dict mapping steps to view stage types
+        trace (None): an optional :class:`links.tracing.Trace`
+
+    Returns:
+        a dict mapping steps to :class:`concurrent.futures.Future` instances
+    """
+    executor = get_executor()
+    speculative_stages = {}
+    for step in view_creation_plan.steps:
+        if not _is_possible_step(step) or step in speculative_stages:
+            continue
+
+        speculative_stages[step] = executor.submit(
+            _create_stage,
+            step,
+            sample_collection,
+            assignees=assignees,
+            trace=trace,
+        )
+
+    return speculative_stages
+
+
+def create_view_from_plan(
+    sample_collection,
+    view_creation_plan,
+    assignees=None,
+    speculative_stages=None,
+    trace=None,
+):
+    """Creates a view by constructing a stage for each step of the plan.
+
+    Args:
+        sample_collection: a
+            :class:`fiftyone.core.collections.SampleCollection`
+        view_creation_plan: a
+            :class:`links.view_creation_planner.ViewCreationPlan`
+        assignees (None): an optional dict mapping steps to the view stage
+            types that they have already been delegated to. Steps in this
+            dict are not delegated again
+        speculative_stages (None): an optional dict of futures returned by
+            :func:`start_speculative_stages`
+        trace (None): an optional :class:`links.tracing.Trace` in which to
+            record the number of delegation calls made and saved
+
+    Returns:
+        a ``(view, stage_reprs)`` tuple, or ``(None, None)`` if the view is
+        invalid
+    """
     impossible_stages = []
-    view_creation_actors = []
+    possible_steps = []
 
     for step in view_creation_plan.steps:
-        if step.lower().startswith("no"):
-            impossible_stages.append(step)
+        if _is_possible_step(step):
+            possible_steps.append(step)
         else:
-            view_creation_actors.append(delegate_view_stage_creation(step))
+            impossible_stages.append(step)
 
-    view_stages = []
-    stage_reprs = []
-    built_stages = []
-    for assignee, step in zip(view_creation_actors, view_creation_plan.steps):
-        stage = construct_stage(step, assignee, sample_collection)
-        stage = validate_view_stage(stage, sample_collection)
-        if stage is not None:
-            if isinstance(stage, str):
-                impossible_stages.append(step + " - " + stage)
-            else:
-                built_stages.append(stage.build())
-                stage_reprs.append(str(stage.__repr__()))
+    speculative_stages = _discard_unused_speculative_stages(
+        speculative_stages, possible_steps, trace=trace
+    )
 
+    built_stages, stage_reprs, failed_stages = _construct_stages(
+        sample_collection,
+        possible_steps,
+        assignees=assignees,
+        speculative_stages=speculative_stages,
+        trace=trace,
+    )
+    impossible_stages.extend(failed_stages)
+
+    view_stages = []
     _compute_metadata_if_needed(sample_collection, stage_reprs)
     _reorder_built_stages_if_needed(built_stages)
     for stage in built_stages:
@@ -53,6 +157,69 @@ def create_view_from_plan(sample_collection, view_creation_plan):
     return view, stage_reprs
 
 
+def _construct_stages(
+    sample_collection,
+    steps,
+    assignees=None,
+    speculative_stages=None,
+    trace=None,
+):
+    speculative_stages = speculative_stages or {}
+
+    def _get_stage(step):
+        future = speculative_stages.get(step, None)
+        if future is not None:
+            return future.result()
+
+        return _create_stage(
+            step, sample_collection, assignees=assignees, trace=trace
+        )
+
+    ## Steps don't depend on each other, so construct them concurrently
+    results = map_concurrently(
+        _get_stage,
+        steps,
+        max_workers=get_view_stage_max_workers(),
+    )
+
+    built_stages = []
+    stage_reprs = []
+    impossible_stages = []
+    for step, (stage, error) in zip(steps, results):
+        if error is not None:
+            impossible_stages.append(step + " - " + str(error))
+        elif stage is not None:
+            if isinstance(stage, str):
+                impossible_stages.append(step + " - " + stage)
+            else:
+                built_stage, stage_repr = stage
+                built_stages.append(built_stage)
+                stage_reprs.append(stage_repr)
+
+    return built_stages, stage_reprs, impossible_stages
+
+
+def _discard_unused_speculative_stages(speculative_stages, steps, trace=None):
+    if not speculative_stages:
+        return {}
+
+    used_stages = {}
+    for step, future in speculative_stages.items():
+        if step in steps:
+            used_stages[step] = future
+        else:
+            future.cancel()
+
+    if trace is not None:
+        trace.increment("speculative_stages_reused", len(used_stages))
+        trace.increment(
+            "speculative_stages_discarded",
+            len(speculative_stages) - len(used_stages),
+        )
+
+    return used_stages
+
+
 def _reorder_built_stages_if_needed(built_stages):
     ## Put all GeoNear and GeoWithin stages at the beginning
     for i, stage in enumerate(built_stages):
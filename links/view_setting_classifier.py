@@ -8,16 +8,27 @@ View setting classifier.
 import os
 
 # pylint: disable=relative-beyond-top-level
-from .utils import PROMPTS_DIR, _build_custom_chain, gpt_3_5
+from .semantic_cache import semantic_cached
+from .utils import PROMPTS_DIR, _build_custom_chain, get_gpt_35
 
 SET_VIEW_CLASSIFICATION_PATH = os.path.join(
     PROMPTS_DIR, "should_set_view_classification.txt"
 )
 
 
-def should_set_view(query):
-    chain = _build_custom_chain(
-        gpt_3_5, template_path=SET_VIEW_CLASSIFICATION_PATH
+def _build_set_view_chain():
+    return _build_custom_chain(
+        get_gpt_35(), template_path=SET_VIEW_CLASSIFICATION_PATH
     )
-    response = chain.invoke({"query": query})
+
+
+@semantic_cached("should_set_view")
+def should_set_view(query):
+    response = _build_set_view_chain().invoke({"query": query})
+    return "set" in response.lower()
+
+
+@semantic_cached("should_set_view")
+async def ashould_set_view(query):
+    response = await _build_set_view_chain().ainvoke({"query": query})
     return "set" in response.lower()
@@ -8,7 +8,6 @@ View creation classifier.
 
 import json
 import os
-import requests
 from typing import (
     List,
     Dict,
@@ -23,10 +22,18 @@ import fiftyone as fo
 from fiftyone import ViewField as F
 
 # pylint: disable=relative-beyond-top-level
+from .dataset_snapshot import get_dataset_snapshot
+from .geocoding import (
+    boundary_simplification_enabled,
+    boundary_to_geojson,
+    geocode_boundary,
+    geocode_point,
+    simplify_boundary,
+)
 from .utils import (
     PROMPTS_DIR,
     _build_chat_chain,
-    gpt_4o,
+    get_gpt4o,
     _make_replacements,
     _format_filter_expression,
     get_prompt_from,
@@ -282,20 +289,7 @@ class ExcludeFields(ViewStage):
 
 
 def _geocode_point(address):
-    url = "https://nominatim.openstreetmap.org/search"
-    params = {"q": address, "format": "json", "addressdetails": 1, "limit": 1}
-    headers = {"User-Agent": "YourAppName/1.0 (your-email@example.com)"}
-
-    response = requests.get(url, params=params, headers=headers)
-    data = response.json()
-
-    if data:
-        first_place = data[0]
-        latitude = first_place.get("lat")
-        longitude = first_place.get("lon")
-        return float(latitude), float(longitude)
-    else:
-        return None, None
+    return geocode_point(address)
 
 
 class GeoNear(ViewStage):
@@ -346,19 +340,11 @@ class GeoNear(ViewStage):
 
 
 def _geocode_boundary(address):
-    url = "https://nominatim.openstreetmap.org/search"
-    params = {"q": address, "format": "json", "polygon_geojson": 1, "limit": 1}
-    headers = {"User-Agent": "YourAppName/1.0 (your-email@example.com)"}
+    boundary = geocode_boundary(address)
+    if boundary is not None and boundary_simplification_enabled():
+        boundary = simplify_boundary(boundary)
 
-    response = requests.get(url, params=params, headers=headers)
-    data = response.json()
-
-    if data:
-        first_place = data[0]
-        geojson = first_place.get("geojson")
-        return geojson["coordinates"]
-    else:
-        return None
+    return boundary
 
 
 class GeoWithin(ViewStage):
@@ -389,7 +375,7 @@ class GeoWithin(ViewStage):
             raise ValueError(
                 f"Could not geocode location: {self.location_name}"
             )
-        return fo.GeoWithin(boundary)
+        return fo.GeoWithin(boundary_to_geojson(boundary))
 
     def __repr__(self):
         return f"geo_within('{self.location_name}')"
@@ -1000,7 +986,7 @@ def _construct_filter_field_expression(stage, step, dataset):
     FILTER_FIELD_EXPRESSION_PATH = os.path.join(PROMPTS_DIR, prompt_filename)
     prompt = get_prompt_from(FILTER_FIELD_EXPRESSION_PATH).format(query=step)
 
-    chain = _build_chat_chain(gpt_4o, prompt=prompt)
+    chain = _build_chat_chain(get_gpt4o(), prompt=prompt)
 
     resp = chain.invoke({"messages": [("user", step)]}).content
     stage.filter_expression = resp
@@ -1015,18 +1001,15 @@ MATCH_LABELS_EXPRESSION_PROMPT_FILENAMES = {
 
 
 def _identify_label_field_type(dataset, field_names, filter_expression):
+    snapshot = get_dataset_snapshot(dataset)
     if (
-        dataset.media_type == "group"
-        and "3d" in dataset.group_media_types.values()
+        snapshot.media_type == "group"
+        and "3d" in snapshot.group_media_types.values()
     ):
         if "volume" in filter_expression or "rotation" in filter_expression:
             return "detections_3d"
-    num_det_fields = len(
-        dataset.get_field_schema(embedded_doc_type=fo.Detections)
-    )
-    num_cls_fields = len(
-        dataset.get_field_schema(embedded_doc_type=fo.Classification)
-    )
+    num_det_fields = len(snapshot.list_fields_with_doc_type(fo.Detections))
+    num_cls_fields = len(snapshot.list_fields_with_doc_type(fo.Classification))
 
     if num_cls_fields == 0:
         return "detections_2d"
@@ -1068,7 +1051,7 @@ def _construct_match_labels_expression(stage, step, dataset):
     MATCH_LABELS_EXPRESSION_PATH = os.path.join(PROMPTS_DIR, prompt_filename)
 
     prompt = get_prompt_from(MATCH_LABELS_EXPRESSION_PATH).format(query=step)
-    chain = _build_chat_chain(gpt_4o, prompt=prompt)
+    chain = _build_chat_chain(get_gpt4o(), prompt=prompt)
 
     resp = chain.invoke({"messages": [("user", step)]}).content
     stage.filter_expression = resp
@@ -1080,7 +1063,7 @@ def _construct_match_expression(stage, step, *args):
     )
     prompt = get_prompt_from(FILTER_FIELD_EXPRESSION_PATH).format(query=step)
 
-    chain = _build_chat_chain(gpt_4o, prompt=prompt)
+    chain = _build_chat_chain(get_gpt4o(), prompt=prompt)
 
     resp = chain.invoke({"messages": [("user", step)]}).content
     stage.filter_expression = resp
@@ -1102,7 +1085,9 @@ def construct_stage(step, assignee, dataset):
 
     output_type = VIEW_STAGE_OUTPUT_TYPES[assignee]
 
-    chain = _build_chat_chain(gpt_4o, prompt=prompt, output_type=output_type)
+    chain = _build_chat_chain(
+        get_gpt4o(), prompt=prompt, output_type=output_type
+    )
     stage = chain.invoke({"messages": [("user", step)]})
     _construct_view_expression_if_needed(stage, step, dataset)
     return stage
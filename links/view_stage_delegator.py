@@ -8,7 +8,7 @@ View creation classifier.
 import os
 
 # pylint: disable=relative-beyond-top-level
-from .utils import PROMPTS_DIR, _build_custom_chain, gpt_4o
+from .utils import PROMPTS_DIR, _build_custom_chain, get_gpt4o
 
 
 VIEW_STAGE_DELEGATION_PATH = os.path.join(
@@ -16,8 +16,15 @@ VIEW_STAGE_DELEGATION_PATH = os.path.join(
 )
 
 
-def delegate_view_stage_creation(step):
-    chain = _build_custom_chain(
-        gpt_4o, template_path=VIEW_STAGE_DELEGATION_PATH
+def _build_delegation_chain():
+    return _build_custom_chain(
+        get_gpt4o(), template_path=VIEW_STAGE_DELEGATION_PATH
     )
-    return chain.invoke({"question": step})
+
+
+def delegate_view_stage_creation(step):
+    return _build_delegation_chain().invoke({"question": step})
+
+
+async def adelegate_view_stage_creation(step):
+    return await _build_delegation_chain().ainvoke({"question": step})
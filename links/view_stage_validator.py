@@ -19,6 +19,8 @@ from .utils import (
     fp_field_names,
     fn_field_names,
 )
+from .dataset_profile import get_fields_with_confidences
+from .dataset_snapshot import get_dataset_snapshot
 from .data_inspection import (
     _get_classification_evaluation_runs,
     _get_detection_evaluation_runs,
@@ -89,12 +91,13 @@ def _validate_to_evaluation_patches_stage(view_stage, dataset):
 
 
 def _validate_select_group_slices_stage(view_stage, dataset):
-    if dataset.media_type != "group":
+    snapshot = get_dataset_snapshot(dataset)
+    if snapshot.media_type != "group":
         return "No: Dataset is not a group dataset"
 
     if view_stage.slices is not None:
         if not all(
-            slice_name in dataset.group_slices
+            slice_name in snapshot.group_slices
             for slice_name in view_stage.slices
         ):
             return "No: Invalid group slices"
@@ -118,7 +121,7 @@ def _validate_match_tags_stage(view_stage, dataset):
 
 
 def _get_label_tags_field(dataset, label_field):
-    all_fields = list(dataset.get_field_schema(flat=True).keys())
+    all_fields = list(get_dataset_snapshot(dataset).flat_field_schema.keys())
     for field in all_fields:
         if field.startswith(label_field) and field.endswith("tags"):
             return field
@@ -243,9 +246,12 @@ def _get_field(view_stage):
     )
 
 
-def _has_predictions(dataset, field):
-    view = dataset.filter_labels(field, F("confidence"))
-    return view.count() > 0
+def _get_prediction_fields(dataset, fields):
+    ## Checks all fields at once rather than querying each field separately
+    try:
+        return get_fields_with_confidences(dataset, fields)
+    except:
+        return []
 
 
 def _resolve_label_field(view_stage, dataset, gt=True, doc_type=None):
@@ -254,6 +260,8 @@ def _resolve_label_field(view_stage, dataset, gt=True, doc_type=None):
     ## gt=True --> resolve ground truth field
     ## gt=False --> resolve prediction field
 
+    snapshot = get_dataset_snapshot(dataset)
+
     def _resolve_label_field_evaluations():
 
         filter_expr = view_stage.filter_expression.lower()
@@ -262,7 +270,7 @@ def _resolve_label_field(view_stage, dataset, gt=True, doc_type=None):
                 eval_keys = _get_detection_evaluation_runs(dataset)
                 if len(eval_keys) != 0:
                     eval_key = eval_keys[0]
-                    eval_run = dataset.get_evaluation_info(eval_key)
+                    eval_run = snapshot.get_evaluation_info(eval_key)
                     return (
                         eval_run.config.gt_field
                         if gt
@@ -272,7 +280,7 @@ def _resolve_label_field(view_stage, dataset, gt=True, doc_type=None):
                 eval_keys = _get_classification_evaluation_runs(dataset)
                 if len(eval_keys) != 0:
                     eval_key = eval_keys[0]
-                    eval_run = dataset.get_evaluation_info(eval_key)
+                    eval_run = snapshot.get_evaluation_info(eval_key)
                     return (
                         eval_run.config.gt_field
                         if gt
@@ -296,15 +304,13 @@ def _resolve_label_field(view_stage, dataset, gt=True, doc_type=None):
     )
 
     if len(candidate_fields) != 0:
+        prediction_fields = _get_prediction_fields(dataset, candidate_fields)
         for field in candidate_fields:
-            try:
-                hp = _has_predictions(dataset, field)
-                if hp and not gt:
-                    return field
-                elif not hp and gt:
-                    return field
-            except Exception as e:
-                continue
+            hp = field in prediction_fields
+            if hp and not gt:
+                return field
+            elif not hp and gt:
+                return field
 
     ## if no candidate fields found, try to resolve otherwise
     if gt:
@@ -327,8 +333,9 @@ def _resolve_label_field(view_stage, dataset, gt=True, doc_type=None):
                 + _list_polylines_fields(dataset)
             )
 
+        prediction_fields = _get_prediction_fields(dataset, candidate_fields)
         for field in candidate_fields:
-            if _has_predictions(dataset, field):
+            if field in prediction_fields:
                 return field
 
     return None
@@ -344,7 +351,15 @@ def _resolve_prediction_field(view_stage, dataset, doc_type=None):
     )
 
 
+def _is_label_field(snapshot, field):
+    field = snapshot.get_field(field)
+    return isinstance(field, fo.EmbeddedDocumentField) and issubclass(
+        field.document_type, fo.Label
+    )
+
+
 def _validate_filter_labels_fields(view_stage, dataset):
+    snapshot = get_dataset_snapshot(dataset)
     field = _get_field(view_stage)
 
     # ignore multi-field case for now
@@ -353,31 +368,25 @@ def _validate_filter_labels_fields(view_stage, dataset):
     elif isinstance(field, list):
         field = field[0]
 
-    if dataset.has_field(field) and issubclass(
-        dataset.get_field(field).document_type, fo.Label
-    ):
+    if _is_label_field(snapshot, field):
         return view_stage
 
     if (
         field.endswith("predictions")
         and field != "predictions"
-        and not dataset.has_field(field)
+        and not snapshot.has_field(field)
     ):
         field = field.replace("predictions", "")
         if field.endswith("_") or field.endswith(" "):
             field = field[:-1]
-        if dataset.has_field(field) and issubclass(
-            dataset.get_field(field).document_type, fo.Label
-        ):
+        if _is_label_field(snapshot, field):
             return _set_field(view_stage, field)
 
-    for dataset_field in list(dataset.get_field_schema().keys()):
+    for dataset_field in list(snapshot.field_schema.keys()):
         if dataset_field.lower().replace("_", "_") == field.lower().replace(
             "_", "_"
         ):
-            if issubclass(
-                dataset.get_field(dataset_field).document_type, fo.Label
-            ):
+            if _is_label_field(snapshot, dataset_field):
                 return _set_field(view_stage, dataset_field)
 
     if field == "predictions":
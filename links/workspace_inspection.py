@@ -14,7 +14,7 @@ from langchain_core.tools import tool
 import fiftyone as fo
 
 # pylint: disable=relative-beyond-top-level
-from .utils import PROMPTS_DIR, _build_agent_executor_chain, gpt_4o
+from .utils import PROMPTS_DIR, _build_agent_executor_chain, get_gpt4o
 
 WORKSPACE_INSPECTION_PATH = os.path.join(
     PROMPTS_DIR, "workspace_inspection.txt"
@@ -24,7 +24,7 @@ WORKSPACE_INSPECTION_PATH = os.path.join(
 def _create_workspace_agent_executor():
     tools = make_workspace_inspection_tools()
     return _build_agent_executor_chain(
-        gpt_4o, tools, WORKSPACE_INSPECTION_PATH
+        get_gpt4o(), tools, WORKSPACE_INSPECTION_PATH
     )
 
 
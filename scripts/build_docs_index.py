@@ -0,0 +1,74 @@
+"""
+Builds or refreshes the local FiftyOne docs index used by VoxelGPT.
+
+Usage::
+
+    python scripts/build_docs_index.py /path/to/fiftyone/docs/source \
+        [--index-dir DIR] [--base-url URL] [--chunk-size N] [--verify]
+
+| Copyright 2017-2024, Voxel51, Inc.
+| `voxel51.com <https://voxel51.com/>`_
+|
+"""
+import argparse
+import logging
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from links.docs_corpus import (
+    DEFAULT_DOCS_URL,
+    build_docs_index,
+    verify_docs_index,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("docs_dir", help="the root of the docs tree")
+    parser.add_argument(
+        "--index-dir",
+        default=None,
+        help="the directory in which to write the index",
+    )
+    parser.add_argument(
+        "--base-url",
+        default=DEFAULT_DOCS_URL,
+        help="the URL at which the docs are served",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=2000,
+        help="the approximate maximum number of characters per chunk",
+    )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="verify the checksums of the index after building it",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    stats = build_docs_index(
+        args.docs_dir,
+        index_dir=args.index_dir,
+        base_url=args.base_url,
+        chunk_size=args.chunk_size,
+    )
+    print(
+        f"Built docs index v{stats['version']}: {stats['num_files']} files, "
+        f"{stats['num_chunks']} chunks ({stats['num_embedded']} embedded, "
+        f"{stats['num_reused']} reused)"
+    )
+
+    if args.verify:
+        verify_docs_index(args.index_dir)
+        print("Checksums verified")
+
+
+if __name__ == "__main__":
+    main()
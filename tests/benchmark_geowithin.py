@@ -0,0 +1,136 @@
+"""
+Benchmark the effect of boundary simplification on ``GeoWithin`` queries.
+
+A synthetic dataset of random geolocated samples is queried with a detailed
+synthetic boundary, both as-is and after simplification with various
+tolerances and vertex caps. For each boundary, the median query time and the
+number of samples whose membership differs from the original boundary are
+reported.
+
+Usage::
+
+    python tests/benchmark_geowithin.py [--num-samples N] [--num-vertices N]
+
+| Copyright 2017-2024, Voxel51, Inc.
+| `voxel51.com <https://voxel51.com/>`_
+|
+"""
+import argparse
+import math
+import os
+import random
+import statistics
+import sys
+import time
+
+import fiftyone as fo
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from links.geocoding import simplify_boundary
+
+
+CENTER = (2.3522, 48.8566)
+RADIUS = 0.1
+
+SETTINGS = (
+    (0, 0),
+    (0.00001, 0),
+    (0.0001, 0),
+    (0.0001, 1000),
+    (0.0001, 250),
+    (0.001, 100),
+)
+
+
+def make_boundary(num_vertices, seed=51):
+    """Returns a star-shaped ring with a ragged, coastline-like edge."""
+    rng = random.Random(seed)
+    ring = []
+    for i in range(num_vertices):
+        theta = 2 * math.pi * i / num_vertices
+        r = RADIUS * (
+            1
+            + 0.1 * math.sin(7 * theta)
+            + 0.02 * math.sin(97 * theta)
+            + 0.002 * rng.uniform(-1, 1)
+        )
+        ring.append(
+            [CENTER[0] + r * math.cos(theta), CENTER[1] + r * math.sin(theta)]
+        )
+
+    return [ring + [ring[0]]]
+
+
+def make_dataset(num_samples, seed=51):
+    rng = random.Random(seed)
+    dataset = fo.Dataset()
+    dataset.add_samples(
+        [
+            fo.Sample(
+                filepath=f"/tmp/geowithin/{i}.jpg",
+                location=fo.GeoLocation(
+                    point=[
+                        CENTER[0] + rng.uniform(-1.5, 1.5) * RADIUS,
+                        CENTER[1] + rng.uniform(-1.5, 1.5) * RADIUS,
+                    ]
+                ),
+            )
+            for i in range(num_samples)
+        ]
+    )
+    dataset.create_index([("location.point", "2dsphere")])
+    return dataset
+
+
+def time_query(dataset, boundary, repeats):
+    times = []
+    ids = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        ids = set(dataset.geo_within(boundary).values("id"))
+        times.append(time.perf_counter() - start)
+
+    return statistics.median(times), ids
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-samples", type=int, default=100000)
+    parser.add_argument("--num-vertices", type=int, default=50000)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    dataset = make_dataset(args.num_samples)
+    boundary = make_boundary(args.num_vertices)
+
+    try:
+        _, expected_ids = time_query(dataset, boundary, 1)
+
+        print(
+            f"{'tolerance':>10} {'max_vertices':>12} {'vertices':>9} "
+            f"{'simplify (ms)':>13} {'query (ms)':>10} {'mismatches':>10}"
+        )
+        for tolerance, max_vertices in SETTINGS:
+            start = time.perf_counter()
+            simplified = simplify_boundary(
+                boundary, tolerance=tolerance, max_vertices=max_vertices
+            )
+            simplify_time = time.perf_counter() - start
+
+            query_time, ids = time_query(dataset, simplified, args.repeats)
+            num_vertices = sum(len(ring) for ring in simplified)
+            mismatches = len(ids ^ expected_ids)
+
+            print(
+                f"{tolerance:>10} {max_vertices:>12} {num_vertices:>9} "
+                f"{1000 * simplify_time:>13.1f} {1000 * query_time:>10.1f} "
+                f"{mismatches:>10}"
+            )
+    finally:
+        dataset.delete()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Benchmark the fused query router against the per-link classifiers.
+
+Every query in ``test_examples.csv`` is a view creation query, so the
+expected routing is ``intent == "dataset"`` and ``create_view == True``.
+
+Usage::
+
+    python tests/benchmark_router.py [--limit N]
+
+| Copyright 2017-2024, Voxel51, Inc.
+| `voxel51.com <https://voxel51.com/>`_
+|
+"""
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+# Caches would make the second pass over each query artificially fast
+os.environ["VOXELGPT_RESPONSE_CACHE"] = "false"
+os.environ["VOXELGPT_SEMANTIC_CACHE"] = "false"
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from links.effective_query_generator import generate_effective_query
+from links.query_intent_classifier import classify_query_intent
+from links.query_router import route_query
+from links.computation import should_run_computation
+from links.view_creation_classifier import should_create_view
+from links.aggregation_classifier import should_aggregate
+from links.view_setting_classifier import should_set_view
+
+
+TEST_EXAMPLES_PATH = os.path.join(ROOT_DIR, "tests", "test_examples.csv")
+
+FLAGS = ("intent", "run_computation", "create_view", "aggregate", "set_view")
+
+
+def route_serial(chat_history):
+    query = generate_effective_query(chat_history)
+    intent = classify_query_intent(query)
+    route = {"intent": intent}
+    if intent != "dataset":
+        return route
+
+    route["run_computation"] = should_run_computation(query)
+    if route["run_computation"]:
+        return route
+
+    route["create_view"] = should_create_view(query)
+    route["aggregate"] = should_aggregate(query)
+    route["set_view"] = should_set_view(query)
+    return route
+
+
+def route_fused(chat_history):
+    route = route_query(chat_history)
+    return {flag: getattr(route, flag) for flag in FLAGS}
+
+
+def is_correct(route):
+    return route["intent"] == "dataset" and route.get("create_view", False)
+
+
+def run_benchmark(queries):
+    results = {"serial": [], "fused": []}
+    agreement = {flag: 0 for flag in FLAGS}
+    compared = {flag: 0 for flag in FLAGS}
+
+    for i, query in enumerate(queries, 1):
+        chat_history = [f"User: {query}"]
+        routes = {}
+        for name, func in (("serial", route_serial), ("fused", route_fused)):
+            start = time.perf_counter()
+            routes[name] = func(chat_history)
+            elapsed = time.perf_counter() - start
+            results[name].append((elapsed, is_correct(routes[name])))
+
+        for flag in FLAGS:
+            if flag in routes["serial"]:
+                compared[flag] += 1
+                if routes["serial"][flag] == routes["fused"][flag]:
+                    agreement[flag] += 1
+
+        print(
+            f"[{i}/{len(queries)}] serial={results['serial'][-1][0]:.2f}s "
+            f"fused={results['fused'][-1][0]:.2f}s {query}"
+        )
+
+    print("")
+    for name, rows in results.items():
+        latencies = pd.Series([r[0] for r in rows])
+        accuracy = sum(r[1] for r in rows) / len(rows)
+        print(
+            f"{name:>6}: accuracy={accuracy:.1%} "
+            f"mean={latencies.mean():.2f}s "
+            f"p50={latencies.quantile(0.5):.2f}s "
+            f"p90={latencies.quantile(0.9):.2f}s"
+        )
+
+    print("")
+    print("Agreement between serial and fused routing:")
+    for flag in FLAGS:
+        if compared[flag]:
+            print(f"  {flag}: {agreement[flag] / compared[flag]:.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--limit", type=int, default=None, help="number of queries to run"
+    )
+    args = parser.parse_args()
+
+    df = pd.read_csv(TEST_EXAMPLES_PATH)
+    queries = df["query"].dropna().tolist()
+    if args.limit is not None:
+        queries = queries[: args.limit]
+
+    run_benchmark(queries)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Agent executor tests.
+
+| Copyright 2017-2024, Voxel51, Inc.
+| `voxel51.com <https://voxel51.com/>`_
+|
+"""
+import os
+import sys
+import time
+
+from langchain.agents.agent import RunnableMultiActionAgent
+from langchain_core.agents import AgentAction, AgentFinish
+from langchain_core.runnables import RunnableLambda
+from langchain_core.tools import tool
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import links.concurrency as lc
+from links.concurrency import get_num_abandoned_tool_calls
+from links.utils import ParallelAgentExecutor
+
+
+@tool
+def sleep_for(seconds: float) -> float:
+    """Sleeps for the given number of seconds."""
+    time.sleep(seconds)
+    return seconds
+
+
+def _make_agent(durations):
+    def plan(inputs):
+        steps = inputs["intermediate_steps"]
+        if steps:
+            observations = [str(step[1]) for step in steps]
+            return AgentFinish({"output": observations}, "")
+
+        return [
+            AgentAction("sleep_for", {"seconds": d}, "") for d in durations
+        ]
+
+    return RunnableMultiActionAgent(
+        runnable=RunnableLambda(plan), stream_runnable=False
+    )
+
+
+def _wait_for_abandoned_tool_calls():
+    while get_num_abandoned_tool_calls() > 0:
+        time.sleep(0.05)
+
+
+def test_tool_calls_run_concurrently():
+    executor = ParallelAgentExecutor(
+        agent=_make_agent([0.5, 0.5, 0.5]), tools=[sleep_for]
+    )
+
+    start = time.perf_counter()
+    response = executor.invoke({"input": "sleep"})
+    elapsed = time.perf_counter() - start
+
+    assert response["output"] == ["0.5", "0.5", "0.5"]
+    assert elapsed < 1.2
+
+
+def test_tool_call_timeout():
+    executor = ParallelAgentExecutor(
+        agent=_make_agent([0.01, 1.0]), tools=[sleep_for], tool_timeout=0.2
+    )
+
+    response = executor.invoke({"input": "sleep"})
+
+    assert response["output"] == [
+        "0.01",
+        "Tool 'sleep_for' timed out after 0.2 seconds",
+    ]
+
+
+def test_tool_calls_share_timeout():
+    executor = ParallelAgentExecutor(
+        agent=_make_agent([0.15, 0.3, 0.45]),
+        tools=[sleep_for],
+        tool_timeout=0.25,
+    )
+
+    start = time.perf_counter()
+    response = executor.invoke({"input": "sleep"})
+    elapsed = time.perf_counter() - start
+
+    ## Each call finishes within the timeout of the call before it, but not
+    ## within the timeout of the step
+    assert response["output"] == [
+        "0.15",
+        "Tool 'sleep_for' timed out after 0.25 seconds",
+        "Tool 'sleep_for' timed out after 0.25 seconds",
+    ]
+    assert elapsed < 0.4
+
+
+def test_abandoned_tool_calls_dont_starve_agents():
+    _wait_for_abandoned_tool_calls()
+
+    ## Use a fresh pool with a single worker
+    tool_executor = lc._tool_executor
+    tool_max_workers = lc._tool_max_workers
+    lc._tool_executor = None
+    os.environ["VOXELGPT_TOOL_WORKERS"] = "1"
+    try:
+        lc.get_tool_executor()
+
+        ## The pool's size is used, regardless of the current environment
+        del os.environ["VOXELGPT_TOOL_WORKERS"]
+
+        executor = ParallelAgentExecutor(
+            agent=_make_agent([0.5]), tools=[sleep_for], tool_timeout=0.1
+        )
+        response = executor.invoke({"input": "sleep"})
+        assert response["output"] == [
+            "Tool 'sleep_for' timed out after 0.1 seconds"
+        ]
+        assert get_num_abandoned_tool_calls() == 1
+
+        ## The hung call occupies every worker, so new calls aren't queued
+        executor = ParallelAgentExecutor(
+            agent=_make_agent([0.01]), tools=[sleep_for], tool_timeout=0.1
+        )
+        response = executor.invoke({"input": "sleep"})
+        assert response["output"] == [
+            "Tool 'sleep_for' is unavailable because earlier tool calls "
+            "that timed out are still running"
+        ]
+
+        _wait_for_abandoned_tool_calls()
+        response = executor.invoke({"input": "sleep"})
+        assert response["output"] == ["0.01"]
+    finally:
+        os.environ.pop("VOXELGPT_TOOL_WORKERS", None)
+        lc.get_tool_executor().shutdown()
+        lc._tool_executor = tool_executor
+        lc._tool_max_workers = tool_max_workers
@@ -0,0 +1,108 @@
+"""
+Caching tests.
+
+| Copyright 2017-2024, Voxel51, Inc.
+| `voxel51.com <https://voxel51.com/>`_
+|
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from links.caching import (
+    LRUCache,
+    SQLiteCache,
+    TieredCache,
+    deserialize_vector,
+    make_cache_key,
+    serialize_vector,
+)
+
+
+def test_make_cache_key_normalizes_whitespace():
+    key1 = make_cache_key("Show me  dogs\n", "gpt-4o", {"query": "a  b"})
+    key2 = make_cache_key("Show me dogs", "gpt-4o", {"query": "a b"})
+    key3 = make_cache_key("Show me dogs", "gpt-3.5-turbo", {"query": "a b"})
+
+    assert key1 == key2
+    assert key1 != key3
+
+
+def test_lru_cache_eviction():
+    cache = LRUCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+def test_lru_cache_ttl():
+    cache = LRUCache(ttl=0.01)
+    cache.set("a", 1)
+    time.sleep(0.02)
+
+    assert cache.get("a") is None
+
+
+def test_sqlite_cache(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = SQLiteCache(path, max_size=2)
+    cache.set("a", b"1")
+    cache.set("b", b"2")
+    cache.get("a")
+    cache.set("c", b"3")
+
+    assert len(cache) == 2
+    assert cache.get("a") == b"1"
+    assert cache.get("b") is None
+
+    # Entries persist across instances
+    cache = SQLiteCache(path, max_size=2)
+    assert cache.get("c") == b"3"
+
+
+def test_sqlite_cache_ttl(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.db"), ttl=0.01)
+    cache.set("a", b"1")
+    time.sleep(0.02)
+
+    assert cache.get("a") is None
+
+
+def test_tiered_cache(tmp_path):
+    disk = SQLiteCache(str(tmp_path / "cache.db"))
+    cache = TieredCache(memory=LRUCache(), disk=disk)
+    cache.set("a", {"type": "str", "value": "yes"})
+
+    # Disk hits are promoted to memory
+    cache.memory.clear()
+    assert cache.get("a", use_memory=False) == {"type": "str", "value": "yes"}
+    assert cache.get("a", use_disk=False) is None
+    assert cache.get("a") == {"type": "str", "value": "yes"}
+    assert cache.get("a", use_disk=False) == {"type": "str", "value": "yes"}
+
+    assert cache.get("b") is None
+    assert cache.stats()["misses"] == 2
+
+
+def test_vector_cache(tmp_path):
+    vector = [0.1, -0.25, 0.5, 0.0]
+    data = serialize_vector(vector)
+    assert len(data) == 2 * len(vector)
+
+    disk = SQLiteCache(str(tmp_path / "embeddings.db"))
+    cache = TieredCache(
+        disk=disk,
+        serialize=serialize_vector,
+        deserialize=deserialize_vector,
+    )
+    cache.set("a", vector)
+
+    result = cache.get("a")
+    assert len(result) == len(vector)
+    assert all(abs(r - v) < 1e-3 for r, v in zip(result, vector))
@@ -0,0 +1,226 @@
+"""
+Concurrency tests.
+
+| Copyright 2017-2024, Voxel51, Inc.
+| `voxel51.com <https://voxel51.com/>`_
+|
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from links.concurrency import (
+    TaskGroup,
+    get_event_loop,
+    get_stream_queue_size,
+    get_stream_stats,
+    iterate_async_generator,
+    map_concurrently,
+    run_sync,
+    stream_in_background,
+)
+
+
+def test_task_group_runs_concurrently():
+    barrier = threading.Barrier(2, timeout=5)
+
+    def _task(value):
+        barrier.wait()
+        return value
+
+    tasks = TaskGroup()
+    tasks.submit("a", _task, 1)
+    tasks.submit("b", _task, 2)
+
+    assert tasks.result("a") == 1
+    assert tasks.result("b") == 2
+
+
+def test_task_group_raises_task_errors():
+    def _task():
+        raise ValueError("bad")
+
+    tasks = TaskGroup()
+    tasks.submit("a", _task)
+
+    with pytest.raises(ValueError):
+        tasks.result("a")
+
+
+def test_task_group_cancel():
+    executor = ThreadPoolExecutor(max_workers=1)
+    started = []
+
+    def _task(name):
+        started.append(name)
+        time.sleep(0.05)
+
+    tasks = TaskGroup(executor=executor)
+    tasks.submit("a", _task, "a")
+    tasks.submit("b", _task, "b")
+    tasks.cancel()
+    executor.shutdown(wait=True)
+
+    assert "a" not in tasks
+    assert started == ["a"]
+
+
+def test_map_concurrently_preserves_order_and_captures_errors():
+    def _task(value):
+        if value == 2:
+            raise ValueError("bad")
+
+        time.sleep(0.01 * (4 - value))
+        return value * 10
+
+    results = map_concurrently(_task, [1, 2, 3], max_workers=3)
+
+    assert results[0] == (10, None)
+    assert results[1][0] is None
+    assert isinstance(results[1][1], ValueError)
+    assert results[2] == (30, None)
+
+
+def test_task_group_aresult():
+    tasks = TaskGroup()
+    tasks.submit("a", lambda: 1)
+
+    assert asyncio.run(tasks.aresult("a")) == 1
+
+
+def test_task_group_submit_async():
+    async def _main():
+        event = asyncio.Event()
+
+        async def _wait():
+            await event.wait()
+            return 1
+
+        async def _set():
+            event.set()
+            return 2
+
+        tasks = TaskGroup()
+        tasks.submit_async("wait", _wait())
+        tasks.submit_async("set", _set())
+
+        return await tasks.aresult("wait"), await tasks.aresult("set")
+
+    assert asyncio.run(_main()) == (1, 2)
+
+
+def test_task_group_cancel_async_task():
+    async def _main():
+        async def _task():
+            await asyncio.sleep(10)
+
+        tasks = TaskGroup()
+        task = tasks.submit_async("a", _task())
+        await asyncio.sleep(0)
+        tasks.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        return "a" in tasks
+
+    assert asyncio.run(_main()) is False
+
+
+def test_run_sync_uses_blocking_executor():
+    async def _main():
+        return await run_sync(lambda: threading.current_thread().name)
+
+    assert asyncio.run(_main()).startswith("voxelgpt-blocking")
+
+
+async def _agen(values):
+    for value in values:
+        yield await run_sync(lambda: value * 10)
+
+
+def test_iterate_async_generator():
+    assert list(iterate_async_generator(_agen([1, 2, 3]))) == [10, 20, 30]
+
+
+def test_iterate_async_generator_inside_event_loop():
+    async def _main():
+        return list(iterate_async_generator(_agen([1, 2])))
+
+    assert asyncio.run(_main()) == [10, 20]
+
+
+def test_iterate_async_generator_reuses_event_loop():
+    async def _agen():
+        yield asyncio.get_running_loop()
+
+    loop1 = next(iterate_async_generator(_agen()))
+    loop2 = next(iterate_async_generator(_agen()))
+
+    assert loop1 is loop2 is get_event_loop()
+
+
+def test_iterate_async_generator_closes_generator():
+    closed = []
+
+    async def _agen():
+        try:
+            yield 1
+            yield 2
+        finally:
+            closed.append(True)
+
+    gen = iterate_async_generator(_agen())
+    assert next(gen) == 1
+    gen.close()
+
+    assert closed == [True]
+
+
+def test_stream_in_background():
+    assert list(stream_in_background(range, 5)) == [0, 1, 2, 3, 4]
+    assert get_stream_stats()["active_streams"] == 0
+
+
+def test_stream_in_background_emits_errors():
+    def _produce():
+        yield 1
+        raise ValueError("bad")
+
+    chunks = list(stream_in_background(_produce))
+
+    assert chunks[0] == 1
+    assert isinstance(chunks[1], ValueError)
+
+
+def test_stream_in_background_backpressure_and_cancel():
+    produced = []
+    closed = threading.Event()
+
+    def _produce():
+        try:
+            for i in range(10000):
+                produced.append(i)
+                yield i
+        finally:
+            closed.set()
+
+    stream = stream_in_background(_produce)
+    assert next(stream) == 0
+    time.sleep(0.2)
+
+    ## The producer is blocked on the bounded queue
+    assert len(produced) <= get_stream_queue_size() + 2
+    assert get_stream_stats()["active_streams"] == 1
+
+    stream.close()
+
+    assert closed.wait(timeout=5)
+    assert len(produced) < 10000
+    assert get_stream_stats()["active_streams"] == 0
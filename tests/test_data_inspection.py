@@ -0,0 +1,58 @@
+"""
+Data inspection tests.
+
+| Copyright 2017-2024, Voxel51, Inc.
+| `voxel51.com <https://voxel51.com/>`_
+|
+"""
+import os
+import sys
+
+import fiftyone as fo
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import links.data_inspection as ldi
+
+
+def test_tool_results_are_memoized():
+    dataset = fo.Dataset()
+    dataset.add_sample(
+        fo.Sample(
+            filepath="image.jpg",
+            ground_truth=fo.Detections(
+                detections=[
+                    fo.Detection(label="cat", bounding_box=[0, 0, 1, 1])
+                ]
+            ),
+        )
+    )
+
+    calls = []
+    list_detection_fields = ldi._list_detection_fields
+
+    def _list_detection_fields(sample_collection):
+        calls.append(sample_collection)
+        return list_detection_fields(sample_collection)
+
+    ldi._list_detection_fields = _list_detection_fields
+    try:
+        tools = {t.name: t for t in ldi.make_data_inspection_tools(dataset)}
+        tool = tools["list_detection_fields"]
+
+        ## Within a request, each tool runs at most once per arguments
+        token = ldi._tool_results.set({})
+        try:
+            assert tool.invoke({}) == ["ground_truth"]
+            assert tool.invoke({}) == ["ground_truth"]
+        finally:
+            ldi._tool_results.reset(token)
+
+        assert len(calls) == 1
+
+        ## Outside of a request, results are not memoized
+        assert tool.invoke({}) == ["ground_truth"]
+        assert len(calls) == 2
+    finally:
+        ldi._list_detection_fields = list_detection_fields
+
+    dataset.delete()
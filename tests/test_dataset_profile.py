@@ -0,0 +1,279 @@
+"""
+Dataset profile tests.
+
+| Copyright 2017-2024, Voxel51, Inc.
+| `voxel51.com <https://voxel51.com/>`_
+|
+"""
+import os
+import sys
+import threading
+import time
+
+import fiftyone as fo
+from fiftyone import ViewField as F
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import links.dataset_profile as ldp
+from links.caching import LRUCache, TieredCache
+
+
+def _make_sample(label, confidence=None, tags=None):
+    return fo.Sample(
+        filepath=f"{label}.jpg",
+        tags=tags or [],
+        ground_truth=fo.Detections(
+            detections=[fo.Detection(label=label, bounding_box=[0, 0, 1, 1])]
+        ),
+        predictions=fo.Classification(label=label, confidence=confidence),
+    )
+
+
+def _wait_for_builds():
+    with ldp._profile_lock:
+        futures = list(ldp._pending_builds.values())
+
+    for future in futures:
+        future.result()
+
+
+def test_dataset_profile():
+    ldp._profile_cache = TieredCache(memory=LRUCache())
+
+    dataset = fo.Dataset()
+    dataset.add_samples(
+        [
+            _make_sample("cat", confidence=0.9, tags=["train"]),
+            _make_sample("dog", confidence=0.8, tags=["val"]),
+        ]
+    )
+
+    ## Profiles are built in the background, and until then only the first
+    ## samples are profiled
+    num_sampled = ldp._NUM_SAMPLED
+    ldp._NUM_SAMPLED = 1
+    try:
+        sampled = ldp.get_dataset_profile(dataset)
+    finally:
+        ldp._NUM_SAMPLED = num_sampled
+
+    assert sampled["num_samples"] == 1
+    assert sampled["fields"]["ground_truth"]["classes"] == ["cat"]
+
+    _wait_for_builds()
+    profile = ldp.get_dataset_profile(dataset)
+    assert profile["num_samples"] == 2
+    assert profile["tags"] == ["train", "val"]
+    assert profile["fields"] == {
+        "predictions": {
+            "kind": "classification",
+            "has_confidence": True,
+            "classes": ["cat", "dog"],
+        },
+        "ground_truth": {
+            "kind": "detections",
+            "has_confidence": False,
+            "classes": ["cat", "dog"],
+        },
+    }
+
+    ## Unchanged datasets are not profiled again
+    assert ldp.get_dataset_profile(dataset) is profile
+
+    ## Modified samples are merged into the profile
+    dataset.add_sample(_make_sample("bird", tags=["test"]))
+    refreshed = ldp.get_dataset_profile(dataset)
+    assert refreshed["num_samples"] == 3
+    assert refreshed["tags"] == ["test", "train", "val"]
+    assert refreshed["fields"]["ground_truth"]["classes"] == [
+        "bird",
+        "cat",
+        "dog",
+    ]
+
+    ## Deleting samples rebuilds the profile
+    dataset.delete_samples(dataset.match(F("predictions.label") == "bird"))
+    sampled = ldp.get_dataset_profile(dataset)
+    assert sampled["num_samples"] == 2
+    assert sampled["fields"]["ground_truth"]["classes"] == ["cat", "dog"]
+
+    _wait_for_builds()
+    rebuilt = ldp.get_dataset_profile(dataset)
+    assert rebuilt["num_samples"] == 2
+    assert rebuilt["fields"]["ground_truth"]["classes"] == ["cat", "dog"]
+    assert ldp.get_dataset_profile(dataset) is rebuilt
+
+    dataset.delete()
+
+
+def _get_profile(sample_collection):
+    ## Returns the persistent profile of the collection, building it first
+    ldp.get_dataset_profile(sample_collection)
+    _wait_for_builds()
+    return ldp.get_dataset_profile(sample_collection)
+
+
+def test_edited_labels_are_removed_from_profile():
+    ldp._profile_cache = TieredCache(memory=LRUCache())
+
+    dataset = fo.Dataset()
+    dataset.add_samples(
+        [
+            _make_sample("cat", confidence=0.9),
+            _make_sample("dog", confidence=0.8),
+        ]
+    )
+
+    profile = _get_profile(dataset)
+    assert profile["fields"]["predictions"]["classes"] == ["cat", "dog"]
+
+    ## Relabel "cat" as "kitten" and clear all confidences
+    time.sleep(0.01)
+    for sample in dataset:
+        if sample.predictions.label == "cat":
+            sample.predictions.label = "kitten"
+
+        sample.predictions.confidence = None
+        sample.save()
+
+    ## Edits are merged right away, but can't remove the old values
+    merged = ldp.get_dataset_profile(dataset)
+    assert merged["fields"]["predictions"]["classes"] == [
+        "cat",
+        "dog",
+        "kitten",
+    ]
+    assert merged["fields"]["predictions"]["has_confidence"]
+
+    ## So the profile is rebuilt in the background
+    _wait_for_builds()
+    rebuilt = ldp.get_dataset_profile(dataset)
+    assert rebuilt["fields"]["predictions"]["classes"] == ["dog", "kitten"]
+    assert not rebuilt["fields"]["predictions"]["has_confidence"]
+    assert rebuilt["fields"]["ground_truth"]["classes"] == ["cat", "dog"]
+
+    ## Added samples are merged without rebuilding
+    time.sleep(0.01)
+    dataset.add_sample(_make_sample("bird"))
+    refreshed = ldp.get_dataset_profile(dataset)
+    assert refreshed["fields"]["predictions"]["classes"] == [
+        "bird",
+        "dog",
+        "kitten",
+    ]
+    assert not ldp._pending_builds
+
+    dataset.delete()
+
+
+def test_views_use_dataset_profile():
+    ldp._profile_cache = TieredCache(memory=LRUCache())
+
+    dataset = fo.Dataset()
+    dataset.add_samples(
+        [
+            _make_sample("cat", confidence=0.9),
+            _make_sample("dog", confidence=0.8),
+        ]
+    )
+
+    profile = _get_profile(dataset)
+
+    ## Views don't build profiles of their own
+    view = dataset.match(F("predictions.label") == "cat")
+    assert ldp.get_dataset_profile(view) is profile
+    assert not ldp._pending_builds
+
+    ## But only describe the label fields that they contain
+    view = dataset.select_fields("ground_truth")
+    view_profile = ldp.get_dataset_profile(view)
+    assert not ldp._pending_builds
+    assert list(view_profile["fields"].keys()) == ["ground_truth"]
+    assert view_profile["fields"]["ground_truth"] == (
+        profile["fields"]["ground_truth"]
+    )
+
+    dataset.delete()
+
+
+def test_profiles_of_other_datasets_dont_wait():
+    ldp._profile_cache = TieredCache(memory=LRUCache())
+
+    dataset1 = fo.Dataset()
+    dataset1.add_sample(_make_sample("cat"))
+    dataset2 = fo.Dataset()
+    dataset2.add_sample(_make_sample("dog"))
+
+    _get_profile(dataset1)
+    _get_profile(dataset2)
+
+    ## Simulate a refresh of the first dataset that is in progress
+    profiles = []
+    lock = ldp._get_key_lock(ldp._get_profile_key(dataset1))
+    with lock:
+        thread = threading.Thread(
+            target=lambda: profiles.append(ldp.get_dataset_profile(dataset2))
+        )
+        thread.start()
+        thread.join(timeout=5)
+
+    assert profiles
+    assert profiles[0]["fields"]["ground_truth"]["classes"] == ["dog"]
+
+    dataset1.delete()
+    dataset2.delete()
+
+
+def test_get_fields_with_confidences():
+    dataset = fo.Dataset()
+    dataset.add_samples(
+        [
+            _make_sample("cat", confidence=0.9),
+            _make_sample("dog", confidence=0.8),
+        ]
+    )
+
+    fields = ["ground_truth", "predictions", "missing"]
+    os.environ["VOXELGPT_DATASET_PROFILE"] = "false"
+    try:
+        assert ldp.get_fields_with_confidences(dataset, fields) == [
+            "predictions"
+        ]
+
+        profile = ldp.get_dataset_profile(dataset)
+        assert profile["fields"]["predictions"]["has_confidence"]
+        assert profile["fields"]["ground_truth"]["classes"] == ["cat", "dog"]
+    finally:
+        del os.environ["VOXELGPT_DATASET_PROFILE"]
+
+    dataset.delete()
+
+
+def test_get_fields_with_confidences_before_profile_is_built():
+    ldp._profile_cache = TieredCache(memory=LRUCache())
+
+    ## The only confidences are beyond the first samples
+    dataset = fo.Dataset()
+    dataset.add_samples(
+        [
+            _make_sample("cat"),
+            _make_sample("dog", confidence=0.8),
+        ]
+    )
+
+    fields = ["ground_truth", "predictions"]
+    num_sampled = ldp._NUM_SAMPLED
+    ldp._NUM_SAMPLED = 1
+    try:
+        assert ldp.get_fields_with_confidences(dataset, fields) == [
+            "predictions"
+        ]
+
+        _wait_for_builds()
+        assert ldp.get_fields_with_confidences(dataset, fields) == [
+            "predictions"
+        ]
+    finally:
+        ldp._NUM_SAMPLED = num_sampled
+
+    dataset.delete()
@@ -0,0 +1,84 @@
+"""
+Dataset snapshot tests.
+
+| Copyright 2017-2024, Voxel51, Inc.
+| `voxel51.com <https://voxel51.com/>`_
+|
+"""
+import os
+import sys
+
+import fiftyone as fo
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from links.dataset_snapshot import (
+    get_dataset_snapshot,
+    invalidate_dataset_snapshots,
+)
+
+
+def _make_dataset():
+    dataset = fo.Dataset()
+    dataset.add_sample(
+        fo.Sample(
+            filepath="image.jpg",
+            ground_truth=fo.Detections(
+                detections=[
+                    fo.Detection(label="cat", bounding_box=[0, 0, 1, 1])
+                ]
+            ),
+            weather=fo.Classification(label="sunny"),
+            location=fo.GeoLocation(point=[-73.9855, 40.758]),
+        )
+    )
+    return dataset
+
+
+def test_snapshot_matches_schema():
+    dataset = _make_dataset()
+    snapshot = get_dataset_snapshot(dataset)
+
+    for doc_type in (
+        fo.Detections,
+        fo.Classification,
+        fo.GeoLocation,
+        fo.Label,
+    ):
+        expected = list(
+            dataset.get_field_schema(embedded_doc_type=doc_type).keys()
+        )
+        assert snapshot.list_fields_with_doc_type(doc_type) == expected
+
+    ## GeoLocation is a Label subclass
+    assert snapshot.list_fields_with_doc_type(fo.Label) == [
+        "ground_truth",
+        "weather",
+        "location",
+    ]
+    assert snapshot.has_field("ground_truth.detections.label")
+    assert not snapshot.has_field("predictions")
+    assert snapshot.media_type == "image"
+    assert snapshot.group_slices == []
+
+    dataset.delete()
+
+
+def test_snapshot_reuse_and_invalidation():
+    dataset = _make_dataset()
+
+    snapshot = get_dataset_snapshot(dataset)
+    assert get_dataset_snapshot(dataset) is snapshot
+
+    view = dataset.select_fields("ground_truth")
+    view_snapshot = get_dataset_snapshot(view)
+    assert view_snapshot is not snapshot
+    assert view_snapshot.list_fields_with_doc_type(fo.Classification) == []
+    assert get_dataset_snapshot(dataset.select_fields("ground_truth")) is (
+        view_snapshot
+    )
+
+    invalidate_dataset_snapshots(view)
+    assert get_dataset_snapshot(dataset) is not snapshot
+    assert get_dataset_snapshot(view) is not view_snapshot
+
+    dataset.delete()
@@ -0,0 +1,91 @@
+"""
+Docs corpus builder tests.
+
+| Copyright 2017-2024, Voxel51, Inc.
+| `voxel51.com <https://voxel51.com/>`_
+|
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import links.docs_corpus as ldc
+from links.docs_retrieval import LocalDocsIndex
+
+
+class _FakeEmbeddingModel(object):
+    def __init__(self):
+        self.num_embedded = 0
+
+    def embed_documents(self, texts):
+        self.num_embedded += len(texts)
+        return [
+            [float(len(text)), 1.0, float(text.count("e"))] for text in texts
+        ]
+
+
+def _write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def test_extract_text():
+    html = "<html><script>x = 1</script><p>Hello <b>world</b></p></html>"
+    assert ldc._extract_text(html, "a.html").split() == ["Hello", "world"]
+
+    rst = "Title\n=====\n\nUse :meth:`filter_labels` here"
+    assert ldc._extract_text(rst, "a.rst") == "Title\n\nUse filter_labels here"
+
+
+def test_chunk_text():
+    text = "a" * 10 + "\n\n" + "b" * 10 + "\n\n" + "c" * 25
+    chunks = ldc._chunk_text(text, 25)
+    assert chunks == ["a" * 10 + "\n\n" + "b" * 10, "c" * 25]
+
+
+def test_build_docs_index_incremental(tmp_path, monkeypatch):
+    model = _FakeEmbeddingModel()
+    monkeypatch.setattr(ldc, "get_embedding_model", lambda: model)
+
+    docs_dir = str(tmp_path / "docs")
+    index_dir = str(tmp_path / "index")
+    _write(os.path.join(docs_dir, "user_guide", "using_views.rst"), "Views")
+    _write(os.path.join(docs_dir, "index.md"), "Welcome\n\nto docs")
+
+    stats = ldc.build_docs_index(docs_dir, index_dir=index_dir, chunk_size=10)
+    assert stats["version"] == 1
+    assert stats["num_files"] == 2
+    assert stats["num_embedded"] == stats["num_chunks"] == 3
+
+    index = LocalDocsIndex(index_dir)
+    sources = {doc[1] for doc in index.documents}
+    assert "https://docs.voxel51.com/user_guide/using_views.html" in sources
+
+    _write(os.path.join(docs_dir, "index.md"), "Welcome\n\nto views")
+    model.num_embedded = 0
+
+    stats = ldc.build_docs_index(docs_dir, index_dir=index_dir, chunk_size=10)
+    assert stats["version"] == 2
+    assert stats["num_embedded"] == model.num_embedded == 1
+    assert stats["num_reused"] == 2
+
+    manifest = ldc.verify_docs_index(index_dir)
+    assert manifest["version"] == 2
+
+
+def test_verify_docs_index_detects_corruption(tmp_path, monkeypatch):
+    monkeypatch.setattr(ldc, "get_embedding_model", _FakeEmbeddingModel)
+
+    docs_dir = str(tmp_path / "docs")
+    index_dir = str(tmp_path / "index")
+    _write(os.path.join(docs_dir, "index.md"), "Welcome")
+    ldc.build_docs_index(docs_dir, index_dir=index_dir)
+
+    with open(os.path.join(index_dir, "metadata.json"), "w") as f:
+        f.write("[]")
+
+    with pytest.raises(ValueError):
+        ldc.verify_docs_index(index_dir)
@@ -0,0 +1,215 @@
+"""
+Docs QA tests.
+
+| Copyright 2017-2024, Voxel51, Inc.
+| `voxel51.com <https://voxel51.com/>`_
+|
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import links.docs_qa_with_sources as ldq
+from links.tracing import Trace
+
+
+class _WordEncoding(object):
+    ## Counts one token per word, so that budgets are easy to reason about
+    def encode(self, text):
+        return text.split()
+
+
+def _use_word_encoding():
+    encoding = ldq._encoding
+    ldq._encoding = _WordEncoding()
+    ldq._formatted_documents.clear()
+    return encoding
+
+
+def _restore_encoding(encoding):
+    ldq._encoding = encoding
+    ldq._formatted_documents.clear()
+
+
+def _words(prefix, num_words):
+    return " ".join(f"{prefix}{i}" for i in range(num_words))
+
+
+def _packed_contents(summaries):
+    return [
+        text.split("\n")[0][len("Content: ") :]
+        for text in summaries.split("\n\n")
+        if text
+    ]
+
+
+def test_exact_duplicates_are_dropped():
+    encoding = _use_word_encoding()
+    try:
+        doc = (_words("w", 20), "https://docs.voxel51.com/a")
+        other = (_words("w", 20), "https://docs.voxel51.com/b")
+
+        summaries = ldq._build_summaries([doc, doc, other])
+
+        assert _packed_contents(summaries) == [doc[0]]
+    finally:
+        _restore_encoding(encoding)
+
+
+def test_near_duplicates_are_dropped():
+    encoding = _use_word_encoding()
+    try:
+        ## 13 words have 9 shingles. Appending one word adds one shingle, for
+        ## a similarity of 9/10, and appending two adds two, for 9/11
+        doc = (_words("w", 13), "https://docs.voxel51.com/a")
+        at_threshold = (_words("w", 14), "https://docs.voxel51.com/b")
+        below_threshold = (_words("w", 15), "https://docs.voxel51.com/c")
+
+        entry = ldq._get_formatted_document(doc)
+        assert ldq._is_near_duplicate(
+            entry, ldq._get_formatted_document(at_threshold)
+        )
+        assert not ldq._is_near_duplicate(
+            entry, ldq._get_formatted_document(below_threshold)
+        )
+
+        summaries = ldq._build_summaries([doc, at_threshold, below_threshold])
+
+        assert _packed_contents(summaries) == [
+            doc[0],
+            below_threshold[0],
+        ]
+    finally:
+        _restore_encoding(encoding)
+
+
+def test_distinct_and_short_chunks_are_kept():
+    encoding = _use_word_encoding()
+    try:
+        docs = [
+            (_words("a", 20), "https://docs.voxel51.com/a"),
+            (_words("b", 20), "https://docs.voxel51.com/b"),
+            ("Use fo.Dataset()", "https://docs.voxel51.com/c"),
+            ("Use fo.load_dataset()", "https://docs.voxel51.com/d"),
+        ]
+
+        summaries = ldq._build_summaries(docs)
+
+        assert _packed_contents(summaries) == [doc[0] for doc in docs]
+    finally:
+        _restore_encoding(encoding)
+
+
+def test_formatted_documents_are_cached():
+    encoding = _use_word_encoding()
+    try:
+        doc = ("Use fo.Dataset()", "https://docs.voxel51.com/a")
+
+        entry = ldq._get_formatted_document(doc)
+
+        assert entry[0] == (
+            "Content: Use fo.Dataset()\nSource: https://docs.voxel51.com/a"
+        )
+        assert ldq._get_formatted_document(doc) is entry
+    finally:
+        _restore_encoding(encoding)
+
+
+def test_chunks_are_packed_into_token_budget():
+    encoding = _use_word_encoding()
+    os.environ["VOXELGPT_DOCS_TOKEN_BUDGET"] = "100"
+    try:
+        ## Each chunk costs its words plus 4 tokens of formatting
+        docs = [
+            (_words("a", 60), "https://docs.voxel51.com/a"),
+            (_words("b", 40), "https://docs.voxel51.com/b"),
+            (_words("c", 10), "https://docs.voxel51.com/c"),
+        ]
+        trace = Trace()
+
+        summaries = ldq._build_summaries(docs, trace=trace)
+
+        ## The second chunk doesn't fit and too little budget remains to
+        ## truncate it, but the third chunk still fits
+        assert _packed_contents(summaries) == [docs[0][0], docs[2][0]]
+        assert trace.counters == {
+            "docs_context_tokens": 78,
+            "docs_chunks_packed": 2,
+            "docs_chunks_truncated": 0,
+            "docs_chunks_dropped": 1,
+        }
+    finally:
+        del os.environ["VOXELGPT_DOCS_TOKEN_BUDGET"]
+        _restore_encoding(encoding)
+
+
+def test_chunks_are_truncated_at_sentence_boundaries():
+    encoding = _use_word_encoding()
+    os.environ["VOXELGPT_DOCS_TOKEN_BUDGET"] = str(
+        ldq._MIN_TRUNCATED_TOKENS + 10
+    )
+    try:
+        sentences = [_words(f"s{i}w", 20) + "." for i in range(5)]
+        doc = (" ".join(sentences), "https://docs.voxel51.com/a")
+        trace = Trace()
+
+        summaries = ldq._build_summaries([doc], trace=trace)
+
+        ## Three 21-token sentences plus 4 tokens of formatting fit in 74
+        assert _packed_contents(summaries) == [" ".join(sentences[:3])]
+        assert trace.counters["docs_context_tokens"] == 64
+        assert trace.counters["docs_chunks_truncated"] == 1
+        assert trace.counters["docs_chunks_dropped"] == 0
+
+        text, num_tokens = ldq._truncate_document(doc, 30)
+        assert text == f"Content: {sentences[0]}\nSource: {doc[1]}"
+        assert num_tokens == 24
+
+        assert ldq._truncate_document(doc, 20) == (None, 0)
+    finally:
+        del os.environ["VOXELGPT_DOCS_TOKEN_BUDGET"]
+        _restore_encoding(encoding)
+
+
+def test_chunks_are_not_truncated_below_min_tokens():
+    encoding = _use_word_encoding()
+    os.environ["VOXELGPT_DOCS_TOKEN_BUDGET"] = str(
+        ldq._MIN_TRUNCATED_TOKENS - 1
+    )
+    try:
+        sentences = [_words(f"s{i}w", 10) + "." for i in range(10)]
+        doc = (" ".join(sentences), "https://docs.voxel51.com/a")
+        trace = Trace()
+
+        summaries = ldq._build_summaries([doc], trace=trace)
+
+        assert summaries == ""
+        assert trace.counters["docs_chunks_packed"] == 0
+        assert trace.counters["docs_chunks_dropped"] == 1
+    finally:
+        del os.environ["VOXELGPT_DOCS_TOKEN_BUDGET"]
+        _restore_encoding(encoding)
+
+
+def test_dropped_chunks_dont_suppress_near_duplicates():
+    encoding = _use_word_encoding()
+    os.environ["VOXELGPT_DOCS_TOKEN_BUDGET"] = "80"
+    try:
+        ## A single 100 word sentence can't be truncated to fit, but a near
+        ## duplicate whose first sentence is 40 words can
+        words = _words("w", 100).split()
+        doc = (" ".join(words), "https://docs.voxel51.com/a")
+        words[39] += "."
+        near_duplicate = (" ".join(words), "https://docs.voxel51.com/b")
+
+        assert ldq._is_near_duplicate(
+            ldq._get_formatted_document(doc),
+            ldq._get_formatted_document(near_duplicate),
+        )
+
+        summaries = ldq._build_summaries([doc, near_duplicate])
+
+        assert _packed_contents(summaries) == [" ".join(words[:40])]
+    finally:
+        del os.environ["VOXELGPT_DOCS_TOKEN_BUDGET"]
+        _restore_encoding(encoding)
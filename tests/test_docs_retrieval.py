@@ -0,0 +1,107 @@
+"""
+Docs retrieval tests.
+
+| Copyright 2017-2024, Voxel51, Inc.
+| `voxel51.com <https://voxel51.com/>`_
+|
+"""
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from links.docs_retrieval import (
+    BM25Index,
+    LocalDocsIndex,
+    decode_query_vector,
+    encode_query_vector,
+    tokenize,
+)
+
+
+DOCUMENTS = [
+    ("How to load a dataset", "https://docs.voxel51.com/a"),
+    ("How to export a dataset", "https://docs.voxel51.com/b"),
+    ("How to compute embeddings", "https://docs.voxel51.com/c"),
+]
+
+EMBEDDINGS = [[1.0, 0.0, 0.0], [0.7, 0.7, 0.0], [0.0, 0.0, 2.0]]
+
+
+def test_local_docs_index_search(tmp_path):
+    index_dir = str(tmp_path / "index")
+    assert not LocalDocsIndex.exists(index_dir)
+
+    index = LocalDocsIndex.build(DOCUMENTS, index_dir, embeddings=EMBEDDINGS)
+
+    assert LocalDocsIndex.exists(index_dir)
+    assert BM25Index.exists(index_dir)
+    assert len(index) == 3
+    assert index.embeddings.dtype == np.float16
+
+    results = index.search([1.0, 0.1, 0.0], k=2)
+    assert results == [list(DOCUMENTS[0]), list(DOCUMENTS[1])]
+
+    results = index.search([0.0, 0.0, 1.0], k=10)
+    assert len(results) == 3
+    assert results[0] == list(DOCUMENTS[2])
+
+
+def test_local_docs_index_reload(tmp_path):
+    index_dir = str(tmp_path / "index")
+    LocalDocsIndex.build(
+        DOCUMENTS, index_dir, embeddings=EMBEDDINGS, dtype="float32"
+    )
+
+    index = LocalDocsIndex(index_dir)
+
+    assert isinstance(index.embeddings, np.memmap)
+    assert index.embeddings.dtype == np.float32
+    assert index.search([0.0, 1.0, 0.0], k=1) == [list(DOCUMENTS[1])]
+
+
+def test_encode_query_vector():
+    query_vector = np.random.default_rng(0).uniform(-0.1, 0.1, size=3072)
+    legacy = ",".join(str(np.round(qv, 8)) for qv in query_vector)
+
+    body, headers = encode_query_vector(query_vector, encoding="float16")
+    assert len(body) < len(legacy) / 4
+    decoded = decode_query_vector(body, headers)
+    assert np.allclose(decoded, query_vector, atol=1e-3)
+
+    body, headers = encode_query_vector(query_vector, encoding="int8")
+    assert len(body) < len(legacy) / 8
+    decoded = decode_query_vector(body, headers)
+    assert np.allclose(decoded, query_vector, atol=1e-3)
+
+
+def test_tokenize():
+    tokens = tokenize("Use dataset.filter_labels() and F('label')")
+    assert "filter_labels" in tokens
+    assert "filter" in tokens
+    assert "labels" in tokens
+    assert "dataset" in tokens
+
+
+def test_bm25_index(tmp_path):
+    texts = [
+        "Use filter_labels() to filter the labels of a collection",
+        "Use compute_similarity() to index your dataset by similarity",
+        "Datasets can be exported to disk in many formats",
+    ]
+    index = BM25Index.build(texts, str(tmp_path / "index"))
+
+    assert list(index.search("compute_similarity", k=3)) == [1]
+    assert list(index.search("how do I filter labels?", k=3))[0] == 0
+    assert len(index.search("unrelated words", k=3)) == 0
+
+
+def test_local_docs_index_hybrid_search(tmp_path):
+    index_dir = str(tmp_path / "index")
+    index = LocalDocsIndex.build(DOCUMENTS, index_dir, embeddings=EMBEDDINGS)
+
+    # The vector favors the first document, but the query names the third
+    results = index.hybrid_search("compute embeddings", [1.0, 0.0, 0.1], k=2)
+    assert results[0] == list(DOCUMENTS[2])
+    assert len(results) == 2
@@ -0,0 +1,181 @@
+"""
+Geocoding tests.
+
+| Copyright 2017-2024, Voxel51, Inc.
+| `voxel51.com <https://voxel51.com/>`_
+|
+"""
+import math
+import os
+import sys
+import time
+
+import pytest
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from links.caching import LRUCache, TieredCache
+from links.geocoding import (
+    Gazetteer,
+    Geocoder,
+    boundary_to_geojson,
+    simplify_boundary,
+    simplify_ring,
+)
+
+
+PARIS_BOUNDARY = [[[2.2, 48.8], [2.5, 48.8], [2.5, 48.9], [2.2, 48.8]]]
+
+
+def test_simplify_ring():
+    ring = [[0.0, 0.0], [0.5, 0.00001], [1.0, 0.0], [1.0, 1.0], [0.0, 0.0]]
+    simplified = simplify_ring(ring, 0.001)
+    assert simplified == [[0.0, 0.0], [1.0, 0.0], [1.0, 1.0], [0.0, 0.0]]
+
+    rounded = simplify_ring([[0.1234567, 1.7654321]], 0.001, precision=3)
+    assert rounded == [[0.123, 1.765]]
+
+
+def _make_circle(num_vertices):
+    ring = [
+        [
+            math.cos(2 * math.pi * i / num_vertices),
+            math.sin(2 * math.pi * i / num_vertices),
+        ]
+        for i in range(num_vertices)
+    ]
+    return ring + [ring[0]]
+
+
+def test_simplify_ring_max_vertices():
+    ring = _make_circle(10000)
+
+    simplified = simplify_ring(ring, 0, max_vertices=100)
+    assert len(simplified) == 100
+    assert simplified[0] == simplified[-1] == ring[0]
+
+    simplified = simplify_ring(ring, 0, max_vertices=2)
+    assert len(simplified) == 4
+
+    simplified = simplify_ring(ring, 0.01, max_vertices=1000)
+    assert 4 < len(simplified) < 1000
+
+
+def test_simplify_boundary():
+    boundary = [_make_circle(2999), _make_circle(999)]
+
+    simplified = simplify_boundary(boundary, tolerance=0, max_vertices=400)
+    assert [len(ring) for ring in simplified] == [300, 100]
+
+    simplified = simplify_boundary(boundary, tolerance=0, max_vertices=0)
+    assert [len(ring) for ring in simplified] == [3000, 1000]
+
+
+def test_simplify_multipolygon_boundary():
+    boundary = [[_make_circle(2999)], [_make_circle(999)]]
+
+    simplified = simplify_boundary(boundary, tolerance=0, max_vertices=400)
+
+    ## The vertex budget is shared by the rings of all polygons
+    assert [[len(ring) for ring in p] for p in simplified] == [[300], [100]]
+
+
+def test_geocoder_keeps_all_polygons():
+    island = [[[0.0, 0.0], [1.0, 0.0], [1.0, 1.0], [0.0, 0.0]]]
+    mainland = [[[5.0, 5.0], [9.0, 5.0], [9.0, 9.0], [5.0, 9.0], [5.0, 5.0]]]
+
+    class _Geocoder(Geocoder):
+        def _query(self, location_name, params):
+            if location_name == "Paris, France":
+                geojson = {"type": "Polygon", "coordinates": PARIS_BOUNDARY}
+            else:
+                geojson = {
+                    "type": "MultiPolygon",
+                    "coordinates": [mainland, island],
+                }
+
+            return [{"geojson": geojson}]
+
+    geocoder = _Geocoder(tolerance=0)
+
+    boundary = geocoder.geocode_boundary("Hawaii")
+    assert boundary == [mainland, island]
+    assert boundary_to_geojson(boundary) == {
+        "type": "MultiPolygon",
+        "coordinates": [mainland, island],
+    }
+
+    boundary = geocoder.geocode_boundary("Paris, France")
+    assert boundary == PARIS_BOUNDARY
+    assert boundary_to_geojson(boundary) == {
+        "type": "Polygon",
+        "coordinates": PARIS_BOUNDARY,
+    }
+
+
+def test_gazetteer_lookup():
+    gazetteer = Gazetteer(
+        {
+            "Paris, France": {
+                "point": [48.8566, 2.3522],
+                "boundary": PARIS_BOUNDARY,
+            }
+        }
+    )
+    geocoder = Geocoder(gazetteer=gazetteer, offline=True)
+
+    assert geocoder.geocode_point("paris,  FRANCE") == (48.8566, 2.3522)
+    assert geocoder.geocode_boundary("Paris, France") == PARIS_BOUNDARY
+    assert geocoder.geocode_point("Lyon, France") == (None, None)
+    assert geocoder.geocode_boundary("Lyon, France") is None
+
+
+def test_geocoder_caches_results():
+    class _Geocoder(Geocoder):
+        num_queries = 0
+
+        def _query(self, location_name, params):
+            self.num_queries += 1
+            if location_name == "nowhere":
+                return []
+
+            return [{"lat": "40.7", "lon": "-74.0"}]
+
+    geocoder = _Geocoder(cache=TieredCache(memory=LRUCache()))
+
+    assert geocoder.geocode_point("New York") == (40.7, -74.0)
+    assert geocoder.geocode_point("new york") == (40.7, -74.0)
+    assert geocoder.geocode_point("nowhere") == (None, None)
+    assert geocoder.geocode_point("nowhere") == (None, None)
+    assert geocoder.num_queries == 2
+
+
+def test_geocoder_expires_missing_places_and_skips_failures():
+    class _Geocoder(Geocoder):
+        num_queries = 0
+        fail = False
+
+        def _query(self, location_name, params):
+            self.num_queries += 1
+            if self.fail:
+                raise requests.ConnectionError("unavailable")
+
+            return []
+
+    geocoder = _Geocoder(cache=TieredCache(memory=LRUCache()), negative_ttl=0)
+
+    ## Places that could not be found are queried again once their TTL expires
+    assert geocoder.geocode_point("nowhere") == (None, None)
+    time.sleep(0.01)
+    assert geocoder.geocode_point("nowhere") == (None, None)
+    assert geocoder.num_queries == 2
+
+    ## Failed requests are not cached
+    geocoder.fail = True
+    for _ in range(2):
+        with pytest.raises(requests.ConnectionError):
+            geocoder.geocode_point("Boston")
+
+    geocoder.fail = False
+    assert geocoder.geocode_point("Boston") == (None, None)
+    assert geocoder.num_queries == 5
@@ -0,0 +1,71 @@
+"""
+Fused query router tests.
+
+| Copyright 2017-2024, Voxel51, Inc.
+| `voxel51.com <https://voxel51.com/>`_
+|
+"""
+import asyncio
+import os
+import sys
+
+from langchain_core.runnables import RunnableLambda
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import links.query_router as lqr
+
+
+def _make_route(effective_query, run_computation=True):
+    return lqr.QueryRoute(
+        effective_query=effective_query,
+        intent="dataset",
+        run_computation=run_computation,
+        create_view=True,
+        aggregate=False,
+        set_view=True,
+    )
+
+
+def _route(chat_history, route):
+    ## Routes the chat history with a chain that returns `route`
+    build_routing_chain = lqr._build_routing_chain
+    lqr._build_routing_chain = lambda: RunnableLambda(lambda _: route.copy())
+    try:
+        return (
+            lqr.route_query(chat_history),
+            asyncio.run(lqr.aroute_query(chat_history)),
+        )
+    finally:
+        lqr._build_routing_chain = build_routing_chain
+
+
+def test_show_queries_dont_run_computations():
+    for route in _route(
+        ["User: show me the most unique images"],
+        _make_route("Show me the most unique images"),
+    ):
+        assert not route.run_computation
+        assert route.create_view
+
+
+def test_compute_queries_run_computations():
+    for query in (
+        "Show me the uniqueness after you compute it",
+        "Compute uniqueness",
+    ):
+        for route in _route([f"User: {query}"], _make_route(query)):
+            assert route.run_computation
+
+
+def test_effective_query_defaults_to_latest_query():
+    for route in _route(
+        ["User: show me 10 random samples"],
+        _make_route("", run_computation=False),
+    ):
+        assert route.effective_query == "show me 10 random samples"
+        assert not route.run_computation
+
+    ## The fallback is subject to the keyword override too
+    for route in _route(["User: show me dogs"], _make_route("")):
+        assert route.effective_query == "show me dogs"
+        assert not route.run_computation
@@ -0,0 +1,220 @@
+"""
+LLM response cache tests.
+
+| Copyright 2017-2024, Voxel51, Inc.
+| `voxel51.com <https://voxel51.com/>`_
+|
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+
+from langchain_core.language_models.fake_chat_models import (
+    FakeListChatModel,
+)
+from langchain_core.pydantic_v1 import BaseModel
+from langchain_core.runnables import RunnableLambda
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import links.utils as lu
+from links.caching import LRUCache, SQLiteCache, TieredCache
+
+
+PROMPT = "Answer the question: {query}"
+
+
+class _FakeChatModel(FakeListChatModel):
+    ## Responds with each of its responses in turn, so cache misses are
+    ## detectable
+    temperature: float = 0
+    model_name: str = "fake-model"
+
+
+class _Answer(BaseModel):
+    answer: str
+    confidence: float
+
+
+class _RecordingCache(TieredCache):
+    ## Records the threads from which the cache is accessed
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.threads = []
+
+    def get(self, key, **kwargs):
+        self.threads.append(threading.current_thread().name)
+        return super().get(key, **kwargs)
+
+    def set(self, key, value, **kwargs):
+        self.threads.append(threading.current_thread().name)
+        return super().set(key, value, **kwargs)
+
+
+def _use_cache(cache=None):
+    response_cache = lu._response_cache
+    lu._response_cache = cache or TieredCache(memory=LRUCache())
+    return response_cache
+
+
+def _restore_cache(response_cache):
+    lu._response_cache = response_cache
+
+
+def _make_chain(**kwargs):
+    model = _FakeChatModel(responses=["first", "second"], **kwargs)
+    return lu._build_custom_chain(model, prompt=PROMPT)
+
+
+def _stream(chain, inputs, **kwargs):
+    return "".join(chain.stream(inputs, **kwargs))
+
+
+async def _astream(chain, inputs, **kwargs):
+    chunks = []
+    async for chunk in chain.astream(inputs, **kwargs):
+        chunks.append(chunk)
+
+    return "".join(chunks)
+
+
+def test_invoke_and_stream_hits():
+    response_cache = _use_cache()
+    try:
+        chain = _make_chain()
+        assert isinstance(chain, lu.CachedRunnable)
+
+        assert chain.invoke({"query": "a"}) == "first"
+        assert chain.invoke({"query": "a"}) == "first"
+        assert _stream(chain, {"query": "a"}) == "first"
+
+        ## Streamed responses are cached once the stream completes
+        assert _stream(chain, {"query": "b"}) == "second"
+        assert _stream(chain, {"query": "b"}) == "second"
+        assert chain.invoke({"query": "b"}) == "second"
+    finally:
+        _restore_cache(response_cache)
+
+
+def test_ainvoke_and_astream_hits():
+    cache = _RecordingCache(memory=LRUCache())
+    response_cache = _use_cache(cache)
+    try:
+        chain = _make_chain()
+
+        async def _run():
+            return [
+                await chain.ainvoke({"query": "a"}),
+                await chain.ainvoke({"query": "a"}),
+                await _astream(chain, {"query": "a"}),
+                await _astream(chain, {"query": "b"}),
+                await _astream(chain, {"query": "b"}),
+                await chain.ainvoke({"query": "b"}),
+            ]
+
+        responses = asyncio.run(_run())
+
+        assert responses == [
+            "first",
+            "first",
+            "first",
+            "second",
+            "second",
+            "second",
+        ]
+
+        ## The cache may read from disk, so it is not accessed on the loop
+        assert cache.threads
+        assert all(t.startswith("voxelgpt-blocking") for t in cache.threads)
+    finally:
+        _restore_cache(response_cache)
+
+
+def test_use_cache_false_bypasses_cache():
+    response_cache = _use_cache()
+    try:
+        chain = _make_chain()
+
+        assert chain.invoke({"query": "a"}) == "first"
+        assert chain.invoke({"query": "a"}, use_cache=False) == "second"
+        assert _stream(chain, {"query": "a"}, use_cache=False) == "first"
+        assert (
+            asyncio.run(chain.ainvoke({"query": "a"}, use_cache=False))
+            == "second"
+        )
+        assert (
+            asyncio.run(_astream(chain, {"query": "a"}, use_cache=False))
+            == "first"
+        )
+
+        ## Bypassed calls don't overwrite the cached response
+        assert chain.invoke({"query": "a"}) == "first"
+    finally:
+        _restore_cache(response_cache)
+
+
+def test_nonzero_temperature_is_not_cached():
+    response_cache = _use_cache()
+    try:
+        chain = _make_chain(temperature=0.7)
+
+        assert not isinstance(chain, lu.CachedRunnable)
+        assert chain.invoke({"query": "a"}) == "first"
+        assert chain.invoke({"query": "a"}) == "second"
+    finally:
+        _restore_cache(response_cache)
+
+
+def test_structured_output_round_trip():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        disk = SQLiteCache(os.path.join(tmp_dir, "responses.db"))
+        response_cache = _use_cache(TieredCache(memory=LRUCache(), disk=disk))
+        try:
+            calls = []
+
+            def _answer(inputs):
+                calls.append(inputs)
+                return _Answer(answer=inputs["query"], confidence=0.5)
+
+            chain = lu.CachedRunnable(
+                RunnableLambda(_answer), ("prompt",), output_type=_Answer
+            )
+
+            assert chain.invoke({"query": "a"}) == _Answer(
+                answer="a", confidence=0.5
+            )
+
+            ## Responses are deserialized from disk into the output type
+            lu._response_cache.memory.clear()
+            response = chain.invoke({"query": "a"})
+
+            assert isinstance(response, _Answer)
+            assert response == _Answer(answer="a", confidence=0.5)
+            assert len(calls) == 1
+        finally:
+            _restore_cache(response_cache)
+
+
+def test_cache_key_depends_on_schema_and_model():
+    class _OtherAnswer(BaseModel):
+        answer: str
+
+    model = _FakeChatModel(responses=["first"])
+    other_model = _FakeChatModel(responses=["first"], model_name="other")
+
+    def _get_key(model, output_type=None):
+        chain = lu._cache_chain(
+            RunnableLambda(lambda x: x), model, PROMPT, output_type
+        )
+        return chain._get_key({"query": "a"})
+
+    keys = [
+        _get_key(model),
+        _get_key(other_model),
+        _get_key(model, output_type=_Answer),
+        _get_key(model, output_type=_OtherAnswer),
+    ]
+
+    assert len(set(keys)) == len(keys)
+    assert _get_key(model, output_type=_Answer) == keys[2]
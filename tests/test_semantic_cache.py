@@ -0,0 +1,140 @@
+"""
+Semantic cache tests.
+
+| Copyright 2017-2024, Voxel51, Inc.
+| `voxel51.com <https://voxel51.com/>`_
+|
+"""
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from links.semantic_cache import SemanticCache
+
+
+def test_semantic_cache_lookup():
+    cache = SemanticCache("test", threshold=0.9)
+    cache.add("show me dogs", [1.0, 0.0, 0.0], "dataset")
+
+    outcome, similarity = cache.lookup([0.99, 0.05, 0.0])
+    assert outcome == "dataset"
+    assert similarity > 0.9
+
+    outcome, similarity = cache.lookup([0.0, 1.0, 0.0])
+    assert outcome is None
+    assert np.isclose(similarity, 0.0)
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["similarities"]["count"] == 2
+
+
+def test_semantic_cache_eviction():
+    cache = SemanticCache("test", threshold=0.99, max_size=2)
+    cache.add("a", [1.0, 0.0], True)
+    cache.add("b", [0.0, 1.0], False)
+    cache.add("c", [-1.0, 0.0], True)
+
+    assert len(cache) == 2
+    assert cache.queries == ["b", "c"]
+
+
+def test_semantic_cache_persistence(tmp_path):
+    cache = SemanticCache("test", dirpath=str(tmp_path))
+    cache.add("show me dogs", [1.0, 0.0], False)
+
+    cache = SemanticCache("test", dirpath=str(tmp_path))
+    assert cache.lookup([1.0, 0.0])[0] is False
+
+
+def test_semantic_cache_overwrites_oldest_entries():
+    cache = SemanticCache("test", threshold=0.99, max_size=3)
+    for i in range(5):
+        vector = np.zeros(8)
+        vector[i] = 1.0
+        cache.add(str(i), vector, i)
+
+    assert len(cache) == 3
+    assert cache.queries == ["2", "3", "4"]
+    assert cache.outcomes == [2, 3, 4]
+    assert cache.lookup(np.eye(8)[0])[0] is None
+    assert cache.lookup(np.eye(8)[3])[0] == 3
+
+
+def test_semantic_cache_persists_incrementally(tmp_path):
+    cache = SemanticCache("test", max_size=2, dirpath=str(tmp_path))
+    cache.add("a", [1.0, 0.0, 0.0], "a")
+    cache.add("b", [0.0, 1.0, 0.0], "b")
+    size = os.path.getsize(cache._vectors_path())
+
+    ## Each entry is appended rather than rewriting the files
+    cache.add("c", [0.0, 0.0, 1.0], "c")
+    assert os.path.getsize(cache._vectors_path()) == size + 3 * 4
+
+    ## Once the files contain 2x max_size entries, they are compacted
+    cache.add("d", [1.0, 1.0, 0.0], "d")
+    cache.add("e", [0.0, 1.0, 1.0], "e")
+    assert os.path.getsize(cache._vectors_path()) == 2 * 3 * 4
+
+    cache = SemanticCache("test", max_size=2, dirpath=str(tmp_path))
+    assert cache.queries == ["d", "e"]
+    assert cache.lookup([0.0, 1.0, 1.0])[0] == "e"
+
+
+def test_should_run_computation_keywords_bypass_cache():
+    import links.computation as lc
+    import links.semantic_cache as lsc
+
+    queries = []
+
+    def embed_query(query):
+        queries.append(query)
+        return [1.0, 0.0]
+
+    cache = SemanticCache("should_run_computation")
+    cache.add("compute uniqueness", [1.0, 0.0], True)
+
+    _embed_query = lsc.embed_query
+    lsc.embed_query = embed_query
+    lsc._caches["should_run_computation"] = cache
+    os.environ["VOXELGPT_SEMANTIC_CACHE"] = "true"
+    try:
+        ## The keyword rule applies before the cache is consulted
+        assert lc.should_run_computation("show uniqueness") is False
+        assert queries == []
+
+        assert lc.should_run_computation("compute the uniqueness") is True
+        assert queries == ["compute the uniqueness"]
+    finally:
+        lsc.embed_query = _embed_query
+        lsc._caches.pop("should_run_computation")
+        del os.environ["VOXELGPT_SEMANTIC_CACHE"]
+
+
+def test_semantic_cached_coroutine():
+    import asyncio
+
+    import links.semantic_cache as lsc
+
+    calls = []
+
+    @lsc.semantic_cached("test_async")
+    async def classify(query):
+        calls.append(query)
+        return "dataset"
+
+    _embed_query = lsc.embed_query
+    lsc.embed_query = lambda query: [1.0, 0.0]
+    lsc._caches["test_async"] = SemanticCache("test_async")
+    os.environ["VOXELGPT_SEMANTIC_CACHE"] = "true"
+    try:
+        assert asyncio.run(classify("show me dogs")) == "dataset"
+        assert asyncio.run(classify("show me the dogs")) == "dataset"
+        assert calls == ["show me dogs"]
+    finally:
+        lsc.embed_query = _embed_query
+        lsc._caches.pop("test_async")
+        del os.environ["VOXELGPT_SEMANTIC_CACHE"]
@@ -0,0 +1,245 @@
+"""
+View creator tests.
+
+| Copyright 2017-2024, Voxel51, Inc.
+| `voxel51.com <https://voxel51.com/>`_
+|
+"""
+from concurrent.futures import ThreadPoolExecutor
+import os
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+import fiftyone as fo
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import links.view_creator as lvc
+from links.tracing import Trace
+
+
+## Maps steps to the stages they construct and how long that takes
+STAGES = {
+    "skip 1 sample": (lambda: fo.Skip(1), 0.2),
+    "limit to 5 samples": (lambda: fo.Limit(5), 0),
+    "take 3 samples": (lambda: fo.Take(3, seed=51), 0),
+}
+
+
+class _FakeStage(object):
+    def __init__(self, step):
+        self.step = step
+
+    def build(self):
+        return STAGES[self.step][0]()
+
+    def __repr__(self):
+        return self.step
+
+
+class _StubbedViewCreator(object):
+    ## Replaces delegation, construction, and validation with stubs that
+    ## record their calls
+    def __init__(self, executor=None, events=None):
+        self.executor = executor
+        self.events = events or {}
+        self.delegations = []
+        self.constructions = []
+        self._lock = threading.Lock()
+        self._originals = {}
+
+    def __enter__(self):
+        patches = {
+            "delegate_view_stage_creation": self._delegate,
+            "construct_stage": self._construct,
+            "validate_view_stage": lambda stage, sample_collection: stage,
+        }
+        if self.executor is not None:
+            patches["get_executor"] = lambda: self.executor
+
+        for name, func in patches.items():
+            self._originals[name] = getattr(lvc, name)
+            setattr(lvc, name, func)
+
+        return self
+
+    def __exit__(self, *args):
+        for name, func in self._originals.items():
+            setattr(lvc, name, func)
+
+    def _delegate(self, step):
+        with self._lock:
+            self.delegations.append(step)
+
+        return _get_assignee(step)
+
+    def _construct(self, step, assignee, sample_collection):
+        with self._lock:
+            self.constructions.append((step, assignee))
+
+        if step in self.events:
+            self.events[step].wait()
+
+        if step not in STAGES:
+            raise ValueError(f"Cannot construct '{step}'")
+
+        time.sleep(STAGES[step][1])
+        return _FakeStage(step)
+
+
+def _get_assignee(step):
+    return step.split()[0]
+
+
+def _make_plan(steps):
+    return SimpleNamespace(steps=steps)
+
+
+def _make_dataset():
+    dataset = fo.Dataset()
+    dataset.add_samples([fo.Sample(filepath=f"{i}.jpg") for i in range(10)])
+    return dataset
+
+
+def _get_stage_types(view):
+    return [type(stage) for stage in view._stages]
+
+
+def test_stages_are_added_in_plan_order():
+    dataset = _make_dataset()
+
+    ## The first step finishes last
+    with _StubbedViewCreator():
+        view, stage_reprs = lvc.create_view_from_plan(
+            dataset, _make_plan(["skip 1 sample", "limit to 5 samples"])
+        )
+
+    assert stage_reprs == ["skip 1 sample", "limit to 5 samples"]
+    assert _get_stage_types(view) == [fo.Skip, fo.Limit]
+    assert len(view) == 5
+
+    dataset.delete()
+
+
+def test_failed_steps_are_impossible():
+    dataset = _make_dataset()
+    steps = ["skip 1 sample", "explode", "limit to 5 samples"]
+
+    with _StubbedViewCreator():
+        built_stages, stage_reprs, impossible_stages = lvc._construct_stages(
+            dataset, steps
+        )
+        view, _ = lvc.create_view_from_plan(dataset, _make_plan(steps))
+
+    assert stage_reprs == ["skip 1 sample", "limit to 5 samples"]
+    assert [type(stage) for stage in built_stages] == [fo.Skip, fo.Limit]
+    assert impossible_stages == ["explode - Cannot construct 'explode'"]
+    assert _get_stage_types(view) == [fo.Skip, fo.Limit]
+
+    dataset.delete()
+
+
+def test_no_steps_are_skipped():
+    dataset = _make_dataset()
+    steps = [
+        "No stage can sort by weather",
+        "skip 1 sample",
+        "limit to 5 samples",
+    ]
+
+    with _StubbedViewCreator() as stubs:
+        view, stage_reprs = lvc.create_view_from_plan(
+            dataset, _make_plan(steps)
+        )
+
+    ## Each remaining step is constructed with its own assignee
+    assert sorted(stubs.delegations) == sorted(steps[1:])
+    assert sorted(stubs.constructions) == [
+        ("limit to 5 samples", "limit"),
+        ("skip 1 sample", "skip"),
+    ]
+    assert stage_reprs == steps[1:]
+    assert _get_stage_types(view) == [fo.Skip, fo.Limit]
+
+    dataset.delete()
+
+
+def test_assignees_skip_delegation():
+    dataset = _make_dataset()
+    steps = ["skip 1 sample", "limit to 5 samples", "take 3 samples"]
+    trace = Trace()
+
+    with _StubbedViewCreator() as stubs:
+        view, stage_reprs = lvc.create_view_from_plan(
+            dataset,
+            _make_plan(steps),
+            assignees={"skip 1 sample": "skip", "take 3 samples": "take"},
+            trace=trace,
+        )
+
+    assert stubs.delegations == ["limit to 5 samples"]
+    assert sorted(stubs.constructions) == [
+        ("limit to 5 samples", "limit"),
+        ("skip 1 sample", "skip"),
+        ("take 3 samples", "take"),
+    ]
+    assert trace.counters == {
+        "view_stage_delegations": 1,
+        "view_stage_delegations_saved": 2,
+    }
+    assert stage_reprs == steps
+
+    dataset.delete()
+
+
+def test_speculative_stages_are_reused():
+    dataset = _make_dataset()
+    trace = Trace()
+
+    ## Speculative stages are built one at a time, and the first is held
+    ## until the plan has been revised, so the others are still queued
+    release = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=1)
+    stubs = _StubbedViewCreator(
+        executor=executor, events={"skip 1 sample": release}
+    )
+
+    with stubs:
+        speculative_stages = lvc.start_speculative_stages(
+            dataset,
+            _make_plan(["skip 1 sample", "limit to 5 samples", "explode"]),
+            trace=trace,
+        )
+        discarded = speculative_stages["explode"]
+
+        threading.Timer(0.2, release.set).start()
+        view, stage_reprs = lvc.create_view_from_plan(
+            dataset,
+            _make_plan(
+                ["skip 1 sample", "limit to 5 samples", "take 3 samples"]
+            ),
+            speculative_stages=speculative_stages,
+            trace=trace,
+        )
+
+    executor.shutdown()
+
+    ## Surviving steps are constructed once, and dropped steps not at all
+    assert discarded.cancelled()
+    assert sorted(step for step, _ in stubs.constructions) == [
+        "limit to 5 samples",
+        "skip 1 sample",
+        "take 3 samples",
+    ]
+    assert stage_reprs == [
+        "skip 1 sample",
+        "limit to 5 samples",
+        "take 3 samples",
+    ]
+    assert _get_stage_types(view) == [fo.Skip, fo.Limit, fo.Take]
+    assert trace.counters["speculative_stages_reused"] == 2
+    assert trace.counters["speculative_stages_discarded"] == 1
+    assert trace.counters["view_stage_delegations"] == 3
+
+    dataset.delete()
@@ -0,0 +1,119 @@
+"""
+VoxelGPT request flow tests.
+
+| Copyright 2017-2024, Voxel51, Inc.
+| `voxel51.com <https://voxel51.com/>`_
+|
+"""
+import os
+import sys
+
+import fiftyone as fo
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import voxelgpt
+from links.tracing import Trace
+
+
+DOCUMENTS = [("Use fo.load_dataset()", "https://docs.voxel51.com/a")]
+
+
+def _ask(query, intent, sample_collection=None, snapshots=None):
+    ## Routes `query` to `intent` and records the docs that are retrieved
+    retrieved = []
+    answered = []
+
+    def get_dataset_snapshot(sample_collection):
+        snapshots.append(sample_collection)
+
+    def _get_documents(query):
+        retrieved.append(query)
+        return DOCUMENTS
+
+    def run_docs_query(query, trace=None, documents=None):
+        answered.append(documents)
+        return "Load datasets with fo.load_dataset()"
+
+    async def agenerate_effective_query(chat_history):
+        return query
+
+    async def aclassify_query_intent(query):
+        return intent
+
+    patches = {
+        "_get_documents": _get_documents,
+        "run_docs_query": run_docs_query,
+        "agenerate_effective_query": agenerate_effective_query,
+        "aclassify_query_intent": aclassify_query_intent,
+    }
+    if snapshots is not None:
+        patches["get_dataset_snapshot"] = get_dataset_snapshot
+
+    originals = {name: getattr(voxelgpt, name) for name in patches}
+    for name, func in patches.items():
+        setattr(voxelgpt, name, func)
+
+    trace = Trace()
+    try:
+        list(
+            voxelgpt.ask_voxelgpt_generator(
+                query,
+                sample_collection=sample_collection,
+                dialect="raw",
+                allow_streaming=False,
+                trace=trace,
+            )
+        )
+    finally:
+        for name, func in originals.items():
+            setattr(voxelgpt, name, func)
+
+    return retrieved, answered, trace.counters
+
+
+def test_has_docs_keyword():
+    assert voxelgpt._has_docs_keyword("How do I load a dataset?")
+    assert voxelgpt._has_docs_keyword("Search the FiftyOne docs")
+    assert voxelgpt._has_docs_keyword("how can I export my dataset?")
+    assert not voxelgpt._has_docs_keyword("show me 10 random samples")
+    assert not voxelgpt._has_docs_keyword("find somehow similar images")
+    assert not voxelgpt._has_docs_keyword("how many dogs are in my dataset?")
+
+
+def test_docs_queries_reuse_prefetched_documents():
+    retrieved, answered, counters = _ask(
+        "how do I load a dataset?", "documentation"
+    )
+
+    assert retrieved == ["how do I load a dataset?"]
+    assert answered == [DOCUMENTS]
+    assert counters == {"docs_prefetch_hits": 1}
+
+
+def test_view_queries_do_not_prefetch_documents():
+    for query in (
+        "show me 10 random samples",
+        "how many dogs are in my dataset?",
+    ):
+        retrieved, answered, counters = _ask(query, "dataset")
+
+        assert retrieved == []
+        assert answered == []
+        assert "docs_prefetch_misses" not in counters
+
+
+def test_non_dataset_queries_do_not_build_snapshots():
+    dataset = fo.Dataset()
+    snapshots = []
+
+    _ask(
+        "how do I load a dataset?",
+        "documentation",
+        sample_collection=dataset,
+        snapshots=snapshots,
+    )
+    _ask("hello", "other", sample_collection=dataset, snapshots=snapshots)
+
+    assert snapshots == []
+
+    dataset.delete()
@@ -6,55 +6,65 @@ VoxelGPT entrypoints.
 |
 """
 
+import logging
 import os
 import re
 import sys
 
 import fiftyone as fo
 
+from links.concurrency import TaskGroup, iterate_async_generator, run_sync
+from links.tracing import Trace
 from links.utils import PROMPTS_DIR, get_prompt_from
-from links.effective_query_generator import generate_effective_query
-from links.query_intent_classifier import classify_query_intent
+from links.effective_query_generator import agenerate_effective_query
+from links.query_intent_classifier import aclassify_query_intent
+from links.query_router import aroute_query, fused_routing_enabled
 from links.introspection import (
     run_introspection_query,
-    stream_introspection_query,
+    astream_introspection_query,
 )
 from links.docs_qa_with_sources import (
+    _get_documents,
     run_docs_query,
-    stream_docs_query,
+    astream_docs_query,
     run_docs_computation_query,
-    stream_docs_computation_query,
+    astream_docs_computation_query,
 )
 from links.general_qa import (
     run_computer_vision_query,
-    stream_computer_vision_query,
+    astream_computer_vision_query,
 )
 from links.workspace_inspection import run_workspace_inspection_query
+from links.dataset_snapshot import get_dataset_snapshot
 from links.data_inspection import (
     run_basic_data_inspection_query,
     _run_default_inspection_for_plan,
 )
-from links.view_creator import create_view_from_plan
+from links.view_creator import (
+    create_view_from_plan,
+    speculative_view_creation_enabled,
+    start_speculative_stages,
+)
 from links.view_creation_classifier import (
-    should_create_view,
-    should_add_to_view,
+    ashould_create_view,
+    ashould_add_to_view,
 )
 from links.view_creation_planner import (
-    create_view_creation_plan,
-    revise_view_creation_plan,
+    acreate_view_creation_plan,
+    arevise_view_creation_plan,
 )
-from links.view_stage_delegator import delegate_view_stage_creation
-from links.view_setting_classifier import should_set_view
+from links.view_stage_delegator import adelegate_view_stage_creation
+from links.view_setting_classifier import ashould_set_view
 from links.aggregator import (
-    delegate_aggregation,
+    adelegate_aggregation,
     construct_aggregation,
-    stream_aggregation_analysis,
+    astream_aggregation_analysis,
     run_aggregation_analysis,
 )
-from links.aggregation_classifier import should_aggregate
+from links.aggregation_classifier import ashould_aggregate
 from links.computation import (
-    should_run_computation,
-    delegate_computation,
+    ashould_run_computation,
+    adelegate_computation,
     run_computation,
     computation_is_possible,
     computation_failure_message,
@@ -64,6 +74,8 @@ from links.computation import (
 )
 
 
+logger = logging.getLogger(__name__)
+
 _SUPPORTED_DIALECTS = ("string", "markdown", "raw")
 
 
@@ -200,10 +212,58 @@ def ask_voxelgpt_generator(
     dialect="string",
     allow_streaming=True,
     chat_history=None,
+    trace=None,
 ):
     """Generator that emits responses from VoxelGPT with respect to the given
     query.
 
+    This is a synchronous wrapper around :func:`ask_voxelgpt_agenerator`. See
+    that function for a description of the emitted content.
+
+    If you provide a chat history, your query and VoxelGPT's responses will be
+    added to it.
+
+    Args:
+        query: a prompt string
+        sample_collection (None): a
+            :class:`fiftyone.core.collections.SampleCollection` to query
+        ctx (None): an :class:`fiftyone.operators.executor.ExecutionContext`
+            to query
+        dialect ("string"): the response format to return. Supported values are
+            ``("string", "markdown", "raw")``
+        allow_streaming (True): whether to allow streaming responses
+        chat_history (None): an optional chat history list
+        trace (None): an optional :class:`links.tracing.Trace` in which to
+            record instrumentation about the request
+    """
+    yield from iterate_async_generator(
+        ask_voxelgpt_agenerator(
+            query,
+            sample_collection=sample_collection,
+            ctx=ctx,
+            dialect=dialect,
+            allow_streaming=allow_streaming,
+            chat_history=chat_history,
+            trace=trace,
+        )
+    )
+
+
+async def ask_voxelgpt_agenerator(
+    query,
+    sample_collection=None,
+    ctx=None,
+    dialect="string",
+    allow_streaming=True,
+    chat_history=None,
+    trace=None,
+):
+    """Async generator that emits responses from VoxelGPT with respect to the
+    given query.
+
+    Streaming responses are generated natively on the event loop, so a single
+    loop can serve many concurrent conversations.
+
     The generator may emit the following types of content:
 
     -   Messages in the format::
@@ -260,8 +320,37 @@ def ask_voxelgpt_generator(
             ``("string", "markdown", "raw")``
         allow_streaming (True): whether to allow streaming responses
         chat_history (None): an optional chat history list
+        trace (None): an optional :class:`links.tracing.Trace` in which to
+            record instrumentation about the request
     """
+    if trace is None:
+        trace = Trace()
+
+    try:
+        async for response in _ask_voxelgpt_agenerator(
+            query,
+            sample_collection=sample_collection,
+            ctx=ctx,
+            dialect=dialect,
+            allow_streaming=allow_streaming,
+            chat_history=chat_history,
+            trace=trace,
+        ):
+            yield response
+    finally:
+        trace.finish()
+        logger.debug("VoxelGPT request trace: %s", trace.summary())
+
 
+async def _ask_voxelgpt_agenerator(
+    query,
+    sample_collection=None,
+    ctx=None,
+    dialect="string",
+    allow_streaming=True,
+    chat_history=None,
+    trace=None,
+):
     if dialect not in _SUPPORTED_DIALECTS:
         raise ValueError(
             f"Unsupported dialect '{dialect}'. Supported: {_SUPPORTED_DIALECTS}"
@@ -285,7 +374,9 @@ def ask_voxelgpt_generator(
         if msg is not None:
             return _emit_message(msg, str_msg, overwrite=overwrite)
 
-    dataset, current_view = _get_dataset_and_view(sample_collection, ctx)
+    dataset, current_view = await run_sync(
+        _get_dataset_and_view, sample_collection, ctx
+    )
     view_message = None
 
     if query.strip().lower() == "help":
@@ -305,20 +396,51 @@ def ask_voxelgpt_generator(
     view_kw_flag = _has_view_keyword(query)
     dataset_kw_flag = _has_dataset_keyword(query)
 
-    ## Generate a new query that incorporates the chat history
-    if chat_history and not approved_flag:
-        query = generate_effective_query(chat_history)
-
-    ## Intent classification
-    if not approved_flag:
-        intent = classify_query_intent(query)
+    tasks = TaskGroup()
+
+    ## Docs retrieval doesn't depend on routing, so for queries that look like
+    ## docs questions, speculatively start it while the query is routed
+    docs_query = None
+    if not approved_flag and _has_docs_keyword(query):
+        docs_query = query
+        tasks.submit("docs", _get_documents, query)
+
+    route = None
+    if not approved_flag and fused_routing_enabled():
+        ## Make all routing decisions in a single call
+        route = await aroute_query(chat_history)
+        query = route.effective_query
+        intent = route.intent
     else:
-        intent = "computation"
+        ## Generate a new query that incorporates the chat history
+        if chat_history and not approved_flag:
+            query = await agenerate_effective_query(chat_history)
+
+        ## Intent classification
+        if not approved_flag:
+            intent = await aclassify_query_intent(query)
+        else:
+            intent = "computation"
+
+    documents = None
+    if "docs" in tasks:
+        if intent == "documentation" and _same_query(query, docs_query):
+            try:
+                documents = await tasks.aresult("docs")
+                trace.increment("docs_prefetch_hits")
+            except Exception as e:
+                logger.debug("Failed to prefetch docs: %s", e)
+        else:
+            tasks.cancel("docs")
+            trace.increment("docs_prefetch_misses")
 
     if intent == "documentation":
+        yield _respond("Searching the docs...", add_to_history=False)
         if allow_streaming:
             message = ""
-            for content in stream_docs_query(query):
+            async for content in astream_docs_query(
+                query, trace=trace, documents=documents
+            ):
                 if isinstance(content, dict):
                     message = content
                 else:
@@ -328,12 +450,15 @@ def ask_voxelgpt_generator(
             yield _emit_streaming_content("", last=True)
             yield _respond(_format_docs_message(message), overwrite=True)
         else:
-            yield _respond(_format_docs_message(run_docs_query(query)))
+            message = await run_sync(
+                run_docs_query, query, trace=trace, documents=documents
+            )
+            yield _respond(_format_docs_message(message))
         return
     elif intent == "introspection":
         if allow_streaming:
             message = ""
-            for content in stream_introspection_query(query):
+            async for content in astream_introspection_query(query):
                 if isinstance(content, dict):
                     message = content
                 else:
@@ -343,24 +468,23 @@ def ask_voxelgpt_generator(
             yield _emit_streaming_content("", last=True)
             yield _respond(message, overwrite=True)
         else:
-            yield _respond(run_introspection_query(query))
+            yield _respond(await run_sync(run_introspection_query, query))
         return
     elif intent == "general":
         if allow_streaming:
             message = ""
-            for content in stream_computer_vision_query(query):
+            async for content in astream_computer_vision_query(query):
                 message += content
                 yield _emit_streaming_content(content)
 
             yield _emit_streaming_content("", last=True)
             yield _respond(message, overwrite=True)
         else:
-            yield _respond(run_computer_vision_query(query))
+            yield _respond(await run_sync(run_computer_vision_query, query))
         return
     elif intent == "workspace":
-        yield _respond(
-            _format_docs_message(run_workspace_inspection_query(query))
-        )
+        message = await run_sync(run_workspace_inspection_query, query)
+        yield _respond(_format_docs_message(message))
         return
     elif intent == "other":
         yield _respond(_clarify_message())
@@ -373,7 +497,26 @@ def ask_voxelgpt_generator(
         )
         return
 
-    if approved_flag or should_run_computation(query):
+    ## Links share a snapshot of the dataset's schema and runs, so start
+    ## building it while the query is classified. Only dataset queries get
+    ## here, since the other intents don't use the snapshot
+    snapshot_view = current_view if current_view is not None else dataset
+    tasks.submit("snapshot", get_dataset_snapshot, snapshot_view)
+
+    if route is not None:
+        run_computation_flag = route.run_computation
+    elif approved_flag:
+        run_computation_flag = True
+    else:
+        ## Classify view creation and aggregation while checking for
+        ## computation, since they don't depend on each other
+        tasks.submit_async("create_view", ashould_create_view(query))
+        tasks.submit_async("aggregate", ashould_aggregate(query))
+        run_computation_flag = await ashould_run_computation(query)
+
+    if run_computation_flag:
+        tasks.cancel()
+
         if approved_flag:
             yield _respond("Computing...", add_to_history=False)
             query, computation_assignee = _recover_computation_query(
@@ -385,18 +528,24 @@ def ask_voxelgpt_generator(
                     "I'm sorry, I don't have permission to run computations on this dataset. Please try another query."
                 )
                 return
-            computation_assignee = delegate_computation(query)
+            computation_assignee = await adelegate_computation(query)
             if computation_assignee == "other":
                 if allow_streaming:
                     message = ""
-                    for content in stream_docs_computation_query(query):
+                    async for content in astream_docs_computation_query(
+                        query, trace=trace
+                    ):
                         message += content
                         yield _emit_streaming_content(content)
 
                     yield _emit_streaming_content("", last=True)
                     yield _respond(message, overwrite=True)
                 else:
-                    yield _respond(run_docs_computation_query(query))
+                    yield _respond(
+                        await run_sync(
+                            run_docs_computation_query, query, trace=trace
+                        )
+                    )
                 return
             if not computation_is_possible(computation_assignee):
                 yield _respond(
@@ -404,34 +553,49 @@ def ask_voxelgpt_generator(
                 )
                 return
 
-            if computation_already_done(dataset, computation_assignee):
+            if await run_sync(
+                computation_already_done, dataset, computation_assignee
+            ):
                 yield _respond(
                     "It looks like you already have this information. Let me know if you need anything else!"
                 )
                 return
 
-            if dataset.count() > get_compute_approval_threshold():
+            num_samples = await run_sync(dataset.count)
+            if num_samples > get_compute_approval_threshold():
                 yield _respond(
                     _get_compute_approval_message(computation_assignee)
                 )
                 return
 
-        response = run_computation(dataset, computation_assignee, query)
+        response = await run_sync(
+            run_computation, dataset, computation_assignee, query
+        )
         yield _respond(response)
         return
 
-    create_view_flag = should_create_view(query)
-    aggregate_flag = should_aggregate(query)
+    if route is not None:
+        create_view_flag = route.create_view
+        aggregate_flag = route.aggregate
+    else:
+        create_view_flag = await tasks.aresult("create_view")
+        aggregate_flag = await tasks.aresult("aggregate")
 
     ## If no view creation and no aggregation, run basic data inspection agent
     if not create_view_flag and not aggregate_flag:
         query_view = current_view if current_view is not None else dataset
-        yield _respond(run_basic_data_inspection_query(query, query_view))
+        yield _respond(
+            await run_sync(run_basic_data_inspection_query, query, query_view)
+        )
         return
 
+    ## Decide whether to set the view while the view is being created
+    if route is None:
+        tasks.submit_async("set_view", ashould_set_view(query))
+
     ### VIEW CREATION
     if create_view_flag:
-        if current_view is not None and should_add_to_view(
+        if current_view is not None and await ashould_add_to_view(
             query,
             current_view,
             view_kw_flag=view_kw_flag,
@@ -444,22 +608,48 @@ def ask_voxelgpt_generator(
             starting_str = "dataset"
 
         yield _respond("Creating a plan...", add_to_history=False)
-        view_creation_plan = create_view_creation_plan(query)
+        view_creation_plan = await acreate_view_creation_plan(query)
         yield _respond(
             _view_creation_plan_message(view_creation_plan),
             add_to_history=False,
         )
+        ## Delegations are memoized per step for the rest of the request
+        view_creation_assignees = {}
+        for step in view_creation_plan.steps:
+            if step in view_creation_assignees:
+                trace.increment("view_stage_delegations_saved")
+            else:
+                view_creation_assignees[
+                    step
+                ] = await adelegate_view_stage_creation(step)
+                trace.increment("view_stage_delegations")
+
         view_creation_actors = [
-            delegate_view_stage_creation(step)
-            for step in view_creation_plan.steps
+            view_creation_assignees[step] for step in view_creation_plan.steps
         ]
         yield _respond("Inspecting the data schema...", add_to_history=False)
-        inspection_results = _run_default_inspection_for_plan(
-            starting_view, view_creation_actors, view_creation_plan
+        inspection_results = await run_sync(
+            _run_default_inspection_for_plan,
+            starting_view,
+            view_creation_actors,
+            view_creation_plan,
         )
         yield _respond("Crafting a revised plan...", add_to_history=False)
-        revised_view_creation_plan = revise_view_creation_plan(
-            query, inspection_results, view_creation_plan
+
+        ## Optionally construct the initial plan's stages while revising it
+        speculative_stages = None
+        if speculative_view_creation_enabled():
+            speculative_stages = start_speculative_stages(
+                starting_view,
+                view_creation_plan,
+                assignees=view_creation_assignees,
+                trace=trace,
+            )
+
+        revised_view_creation_plan = await arevise_view_creation_plan(
+            query,
+            inspection_results,
+            view_creation_plan,
         )
 
         if _view_creation_plan_changed(
@@ -475,11 +665,17 @@ def ask_voxelgpt_generator(
                 add_to_history=False,
             )
 
-        view, stage_reprs = create_view_from_plan(
-            starting_view, revised_view_creation_plan
+        view, stage_reprs = await run_sync(
+            create_view_from_plan,
+            starting_view,
+            revised_view_creation_plan,
+            assignees=view_creation_assignees,
+            speculative_stages=speculative_stages,
+            trace=trace,
         )
 
         if view is None:
+            tasks.cancel()
             yield _respond(_invalid_view_message())
             return
 
@@ -493,7 +689,12 @@ def ask_voxelgpt_generator(
     else:
         view = dataset
 
-    if should_set_view(query):
+    if route is not None:
+        set_view_flag = route.set_view
+    else:
+        set_view_flag = await tasks.aresult("set_view")
+
+    if set_view_flag:
         yield _emit_view(view.view())
 
     ### AGGREGATION ###
@@ -505,12 +706,16 @@ def ask_voxelgpt_generator(
         return
 
     if aggregate_flag:
-        aggregation_assignee = delegate_aggregation(query)
+        aggregation_assignee = await adelegate_aggregation(query)
 
         view_message_str = view_message["string"] if view_message else ""
 
-        aggregation = construct_aggregation(
-            aggregation_assignee, query, view_message_str, view
+        aggregation = await run_sync(
+            construct_aggregation,
+            aggregation_assignee,
+            query,
+            view_message_str,
+            view,
         )
         if aggregation is None:
             yield _respond(
@@ -531,14 +736,14 @@ def ask_voxelgpt_generator(
                 )
             )
 
-        aggregation_results = aggregation.apply(view)
+        aggregation_results = await run_sync(aggregation.apply, view)
         if aggregation_results is None:
             yield _respond("I'm sorry, I couldn't perform the aggregation")
             return
 
         if allow_streaming:
             message = ""
-            for content in stream_aggregation_analysis(
+            async for content in astream_aggregation_analysis(
                 query, view, aggregation, aggregation_results
             ):
                 message += content
@@ -548,8 +753,12 @@ def ask_voxelgpt_generator(
             yield _respond(message, overwrite=True)
         else:
             yield _respond(
-                run_aggregation_analysis(
-                    query, view, aggregation, aggregation_results
+                await run_sync(
+                    run_aggregation_analysis,
+                    query,
+                    view,
+                    aggregation,
+                    aggregation_results,
                 )
             )
 
@@ -565,6 +774,24 @@ def _has_view_keyword(query):
     return any(word in query.lower() for word in view_keywords)
 
 
+_DOCS_KEYWORDS = re.compile(
+    r"\b(docs|documentation|fiftyone|how (do|does|can|to|should))\b"
+)
+
+
+def _has_docs_keyword(query):
+    ## Match whole words, so that "show" doesn't match "how". A bare "how" is
+    ## not enough, since it also starts questions like "how many dogs..."
+    return _DOCS_KEYWORDS.search(query.lower()) is not None
+
+
+def _same_query(query1, query2):
+    if query1 is None or query2 is None:
+        return False
+
+    return query1.strip().lower() == query2.strip().lower()
+
+
 def _has_dataset_keyword(query):
     dataset_keywords = ("dataset",)
     return any(word in query.lower() for word in dataset_keywords)